@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Benchmark parsing and expansion on a thread pool.
+
+Runs :func:`sjkabc.parallel.parse_files` and
+:func:`sjkabc.parallel.expand_tunes` with an increasing number of threads
+and prints the speedup over a single thread. Run it on both a free-threaded
+(for example ``python3.13t``) and a regular build of Python::
+
+    python benchmarks/thread_scaling.py [number of files] [tunes per file]
+
+"""
+import os
+import sys
+import tempfile
+import time
+
+from sjkabc import Parser
+from sjkabc.parallel import expand_tunes, free_threaded, parse_files
+
+
+def timed(fn):
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def main(num_files=64, tunes_per_file=200):
+    here = os.path.dirname(os.path.abspath(__file__))
+    with open(os.path.join(here, '..', 'test.abc')) as f:
+        abc = f.read() * (tunes_per_file // 2)
+
+    print('Python {}, free-threaded: {}'.format(
+        sys.version.split()[0], free_threaded()))
+
+    with tempfile.TemporaryDirectory() as d:
+        filenames = []
+        for i in range(num_files):
+            filenames.append(os.path.join(d, '{}.abc'.format(i)))
+            with open(filenames[-1], 'w') as f:
+                f.write(abc)
+
+        print('{:>8} {:>10} {:>8} {:>10} {:>8}'.format(
+            'threads', 'parse (s)', 'speedup', 'expand (s)', 'speedup'))
+        base = None
+        for workers in (1, 2, 4, 8):
+            tunes = []
+            parse = timed(lambda: tunes.extend(parse_files(filenames,
+                                                           workers)))
+            expand = timed(lambda: list(expand_tunes(tunes, workers)))
+            base = base or (parse, expand)
+            print('{:>8} {:>10.3f} {:>7.2f}x {:>10.3f} {:>7.2f}x'.format(
+                workers, parse, base[0] / parse, expand, base[1] / expand))
+
+    # Serial reference without any pool.
+    tunes = Parser(abc * num_files).tunes
+    serial = timed(lambda: [t.expanded_abc for t in tunes])
+    print('serial expand without pool: {:.3f} s'.format(serial))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -1,3 +1,7 @@
-from sjkabc.sjkabc import Tune, Parser, parse_file, parse_dir
+from sjkabc.sjkabc import (Tune, Parser, StringPool, TuneCollection,
+                           ExpansionError, ExpansionLimits, parse_file,
+                           parse_dir)
+from sjkabc.corpus import Corpus
+from sjkabc.writer import TunebookWriter, write_tunebook, write_tunebooks
 
 __version__ = '1.4.2'
@@ -0,0 +1,324 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+sjkabc.bloom
+
+This module provides Bloom filters of the melodies of ABC files, for
+skipping whole files when searching an archive on disk.
+
+Every file gets a sidecar next to it, ``reels.abc.bloom`` for
+``reels.abc``, holding a Bloom filter of the n-grams of the
+:attr:`~sjkabc.Tune.expanded_abc` of its tunes. A query can only be found
+in a file if all of its n-grams are in the file's filter, so most files are
+ruled out by a few bit lookups and only the rest are parsed. Filters have
+no false negatives; `error_rate` sets how often a file that can't match is
+parsed anyway.
+
+Example::
+
+    >>> for tune in search_dir('/data/music/abc/', 'dBAF ABde'):
+    ...     print(tune.title[0])
+
+Sidecars are written the first time a file is searched, and rewritten when
+the file's size or modification time changes.
+
+:license: BSD, see LICENSE for more details.
+"""
+import hashlib
+import math
+import os
+import struct
+
+from sjkabc.search import MelodyPattern
+from sjkabc.similarity import ngrams
+from sjkabc.sjkabc import expand_abc, find_abc_files, parse_file
+
+
+#: Length of the n-grams put in filters.
+DEFAULT_NGRAM = 4
+
+#: Default false positive rate of filters.
+DEFAULT_ERROR_RATE = 0.01
+
+#: Suffix of sidecar files.
+SIDECAR_SUFFIX = '.bloom'
+
+# Magic, format version, n-gram length, number of hashes, number of bits,
+# size and modification time of the ABC file.
+_HEADER = struct.Struct('<4sBBHQQq')
+_MAGIC = b'SJKB'
+_VERSION = 1
+_MASK = (1 << 64) - 1
+
+
+class BloomFilter:
+
+    """
+    Set of strings with no false negatives and a bounded false positive
+    rate.
+
+    The filter is sized for `capacity` strings. Bit positions come from
+    two halves of a BLAKE2 digest, so filters are the same in every process
+    and can be stored on disk.
+
+    Example::
+
+        >>> f = BloomFilter(1000)
+        >>> f.add('dBAF')
+        >>> 'dBAF' in f
+        True
+
+    .. versionadded:: 1.5.0
+    """
+
+    def __init__(self, capacity, error_rate=DEFAULT_ERROR_RATE, hashes=None,
+                 bits=None):
+        """Initialise BloomFilter
+
+        :param int capacity: number of strings the filter is sized for
+        :param float error_rate: false positive rate at `capacity` strings
+        :param int hashes: number of bit positions per string, computed
+                           from `capacity` and `error_rate` by default
+        :param bytes bits: contents of an existing filter
+        :raises ValueError: if `error_rate` isn't between 0 and 1, or `bits`
+                            is empty
+
+        """
+        if not 0 < error_rate < 1:
+            raise ValueError('error_rate must be between 0 and 1')
+        if bits is not None and not bits:
+            raise ValueError('bits must not be empty')
+        capacity = max(1, capacity)
+        if bits is None:
+            size = math.ceil(-capacity * math.log(error_rate) /
+                             math.log(2) ** 2)
+            bits = bytearray(-(-size // 8))
+        #: Bit array of the filter.
+        self.bits = bytearray(bits)
+        #: Number of bits.
+        self.size = len(self.bits) * 8
+        #: Number of bit positions per string.
+        self.hashes = hashes or max(
+            1, round(self.size / capacity * math.log(2)))
+
+    def __len__(self):
+        return self.size
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(item.encode('utf-8'), digest_size=16)
+        value = int.from_bytes(digest.digest(), 'little')
+        first, second = value & _MASK, (value >> 64) | 1
+        size = self.size
+        return [(first + i * second) % size for i in range(self.hashes)]
+
+    def add(self, item):
+        """Add a string to the filter
+
+        :param str item: string to add
+
+        """
+        bits = self.bits
+        for position in self._positions(item):
+            bits[position >> 3] |= 1 << (position & 7)
+
+    def update(self, items):
+        """Add every string of `items` to the filter
+
+        :param items: iterable of strings
+
+        """
+        for item in items:
+            self.add(item)
+
+    def __contains__(self, item):
+        bits = self.bits
+        return all(bits[position >> 3] & (1 << (position & 7))
+                   for position in self._positions(item))
+
+
+def tune_filter(tunes, n=DEFAULT_NGRAM, error_rate=DEFAULT_ERROR_RATE):
+    """Build a Bloom filter of the n-grams of the expanded ABC of `tunes`
+
+    :param tunes: iterable of :class:`~sjkabc.Tune` objects
+    :param int n: length of the n-grams
+    :param float error_rate: false positive rate of the filter
+    :returns: the filter
+    :rtype: :class:`BloomFilter`
+
+    .. versionadded:: 1.5.0
+    """
+    grams = set()
+    for tune in tunes:
+        grams.update(ngrams(tune.expanded_abc, n))
+    bloom = BloomFilter(len(grams), error_rate)
+    bloom.update(grams)
+    return bloom
+
+
+def sidecar_name(filename):
+    """Get the name of the sidecar of an ABC file
+
+    :param str filename: name of the ABC file
+    :rtype: str
+
+    .. versionadded:: 1.5.0
+    """
+    return filename + SIDECAR_SUFFIX
+
+
+def write_filter(filename, n=DEFAULT_NGRAM, error_rate=DEFAULT_ERROR_RATE):
+    """Parse an ABC file and write the Bloom filter of its tunes
+
+    The parsed tunes are returned, so a file can be searched and indexed in
+    one pass.
+
+    :param str filename: name of the ABC file
+    :param int n: length of the n-grams
+    :param float error_rate: false positive rate of the filter
+    :returns: list of the tunes of the file
+    :rtype: list
+    :raises OSError: if the file can't be read or the sidecar written
+
+    .. seealso:: :func:`sidecar_name`, :func:`load_filter`
+    .. versionadded:: 1.5.0
+    """
+    stat = os.stat(filename)
+    tunes = list(parse_file(filename))
+    _write_sidecar(filename, stat, tune_filter(tunes, n, error_rate), n)
+    return tunes
+
+
+def _write_sidecar(filename, stat, bloom, n):
+    with open(sidecar_name(filename), 'wb') as f:
+        f.write(_HEADER.pack(_MAGIC, _VERSION, n, bloom.hashes, bloom.size,
+                             stat.st_size, stat.st_mtime_ns))
+        f.write(bloom.bits)
+
+
+def load_filter(filename):
+    """Read the Bloom filter of an ABC file from its sidecar
+
+    :param str filename: name of the ABC file
+    :returns: the filter and its n-gram length, or None if the sidecar is
+              missing, unreadable or older than the file
+    :rtype: tuple
+
+    .. versionadded:: 1.5.0
+    """
+    try:
+        stat = os.stat(filename)
+        with open(sidecar_name(filename), 'rb') as f:
+            header = f.read(_HEADER.size)
+            if len(header) < _HEADER.size:
+                return None
+            magic, version, n, hashes, size, file_size, mtime = \
+                _HEADER.unpack(header)
+            if magic != _MAGIC or version != _VERSION or \
+                    (file_size, mtime) != (stat.st_size, stat.st_mtime_ns):
+                return None
+            bits = f.read()
+    except OSError:
+        return None
+    if not size or not hashes or len(bits) * 8 != size:
+        return None
+    return BloomFilter(1, hashes=hashes, bits=bits), n
+
+
+def _query_grams(query):
+    """Get the text every match of `query` contains"""
+    if isinstance(query, MelodyPattern):
+        return query.literal
+    return expand_abc(query)
+
+
+def may_contain(bloom, n, text):
+    """Check if a filter may hold every n-gram of `text`
+
+    Text shorter than `n` can't be ruled out.
+
+    :param bloom: :class:`BloomFilter` of n-grams
+    :param int n: length of the n-grams of the filter
+    :param str text: expanded ABC to look for
+    :rtype: bool
+
+    .. versionadded:: 1.5.0
+    """
+    return all(gram in bloom for gram in ngrams(text, n))
+
+
+def search_files(filenames, query, build=True, n=DEFAULT_NGRAM,
+                 error_rate=DEFAULT_ERROR_RATE, stats=None):
+    """Find the tunes of ABC files matching a query
+
+    Files whose filter rules out the query aren't parsed. Files without an
+    up to date sidecar are parsed and searched, and get a sidecar written
+    if `build` is True. Files whose sidecar can't be written, for example
+    in a read-only archive, are searched all the same.
+
+    :param filenames: iterable of ABC file names
+    :param query: abc to search for in the expanded ABC of the tunes, or a
+                  :class:`~sjkabc.search.MelodyPattern`
+    :param bool build: write missing and stale sidecars
+    :param int n: length of the n-grams of new filters
+    :param float error_rate: false positive rate of new filters
+    :param dict stats: if given, the number of files ``'skipped'`` and
+                       ``'parsed'``, and of sidecars that couldn't be
+                       written (``'unwritable'``) are added to it
+    :returns: matching tunes, as they are found
+    :rtype: :class:`~sjkabc.Tune`
+
+    .. versionadded:: 1.5.0
+    """
+    if isinstance(query, MelodyPattern):
+        matches = query.matches
+    else:
+        expanded = expand_abc(query)
+
+        def matches(tune):
+            return expanded in tune.expanded_abc
+    text = _query_grams(query)
+
+    if stats is not None:
+        stats.setdefault('skipped', 0)
+        stats.setdefault('parsed', 0)
+        stats.setdefault('unwritable', 0)
+
+    for filename in filenames:
+        loaded = load_filter(filename)
+        if loaded is not None:
+            if not may_contain(loaded[0], loaded[1], text):
+                if stats is not None:
+                    stats['skipped'] += 1
+                continue
+            tunes = parse_file(filename)
+        elif build:
+            stat = os.stat(filename)
+            tunes = list(parse_file(filename))
+            try:
+                _write_sidecar(filename, stat,
+                               tune_filter(tunes, n, error_rate), n)
+            except OSError:
+                if stats is not None:
+                    stats['unwritable'] += 1
+        else:
+            tunes = parse_file(filename)
+
+        if stats is not None:
+            stats['parsed'] += 1
+        for tune in tunes:
+            if matches(tune):
+                yield tune
+
+
+def search_dir(dir, query, **kwargs):
+    """Find the tunes of every ABC file in `dir` matching a query
+
+    :param str dir: directory of abc files
+    :param query: abc or :class:`~sjkabc.search.MelodyPattern` to search for
+    :param kwargs: passed on to :func:`search_files`
+    :returns: matching tunes, as they are found
+    :rtype: :class:`~sjkabc.Tune`
+
+    .. versionadded:: 1.5.0
+    """
+    return search_files(find_abc_files(dir), query, **kwargs)
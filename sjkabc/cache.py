@@ -0,0 +1,267 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+sjkabc.cache
+
+This module provides caching of search results.
+
+Queries are normalised with :func:`~sjkabc.sjkabc.expand_abc` before they
+are looked up, so ``'D2 FA|'`` and ``'DD FA'`` share an entry, both being
+``'ddfa'``, and entries are tied to the version of the corpus they were
+computed from, so they are dropped as soon as the corpus changes.
+
+:license: BSD, see LICENSE for more details.
+"""
+import collections
+import threading
+import time
+
+from sjkabc.search import Haystack
+from sjkabc.sjkabc import expand_abc
+
+
+def normalise_query(query):
+    """Normalise a melodic query
+
+    Example::
+
+        >>> normalise_query('|: D2 FA :|')
+        'ddfaddfa'
+
+    :param str query: abc to search for
+    :returns: expanded query
+    :rtype: str
+
+    """
+    return expand_abc(query)
+
+
+def _snapshot(corpus):
+    """Get the version and tunes of `corpus` at one moment
+
+    .. seealso:: :meth:`sjkabc.Corpus.snapshot`
+    """
+    snapshot = getattr(corpus, 'snapshot', None)
+    if snapshot is not None:
+        return snapshot()
+    return corpus.version, list(corpus)
+
+
+class QueryCache:
+
+    """
+    Bounded cache of query results.
+
+    Least recently used entries are evicted once the cache holds `maxsize`
+    entries, and entries older than `ttl` seconds are treated as missing.
+    Every entry belongs to a version, a number that increases when the
+    data queried changes; looking up a newer version than the cache has
+    seen drops every older entry.
+
+    Example::
+
+        >>> cache = QueryCache(maxsize=500, ttl=3600)
+        >>> cache.lookup('dfa', corpus.version, lambda: run_query('dfa'))
+
+    .. versionadded:: 1.5.0
+    """
+
+    def __init__(self, maxsize=1024, ttl=None, clock=time.monotonic):
+        """Initialise QueryCache
+
+        :param int maxsize: largest number of entries
+        :param float ttl: seconds entries stay valid, or None for no limit
+        :param clock: function returning the current time in seconds
+
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        #: Version of the entries in the cache.
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        #: Entries dropped to stay within `maxsize`.
+        self.evictions = 0
+        #: Entries dropped because of their age or version.
+        self.expirations = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    @property
+    def hit_rate(self):
+        """Fraction of lookups answered from the cache
+
+        :rtype: float
+
+        """
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self):
+        """Get the cache metrics
+
+        :returns: size, hits, misses, evictions, expirations and hit rate
+        :rtype: dict
+
+        """
+        return {
+            'size': len(self), 'hits': self.hits, 'misses': self.misses,
+            'evictions': self.evictions, 'expirations': self.expirations,
+            'hit_rate': self.hit_rate,
+        }
+
+    def clear(self):
+        """Drop every entry"""
+        with self._lock:
+            self._entries.clear()
+
+    def get(self, key, version=None):
+        """Get a cached value
+
+        :param key: key of the entry
+        :param version: version the value must belong to
+        :returns: the cached value
+        :raises KeyError: if there is no valid entry, or `version` is older
+                          than the entries
+
+        """
+        with self._lock:
+            self._set_version(version)
+            # Entries of a newer version don't answer an older query.
+            entry = self._entries.get(key) \
+                if version == self.version else None
+            if entry is not None and self.ttl is not None and \
+                    self.clock() - entry[1] > self.ttl:
+                del self._entries[key]
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                raise KeyError(key)
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value, version=None):
+        """Store a value
+
+        :param key: key of the entry
+        :param value: value to store
+        :param version: version the value belongs to
+
+        """
+        with self._lock:
+            self._set_version(version)
+            if version != self.version:
+                # Computed from an older corpus than the cache has seen.
+                return
+            self._entries[key] = (value, self.clock())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def lookup(self, key, version, compute):
+        """Get a cached value, computing and storing it if it's missing
+
+        :param key: key of the entry
+        :param version: version the value must belong to
+        :param compute: function computing the value
+        :returns: the cached or computed value
+
+        """
+        try:
+            return self.get(key, version)
+        except KeyError:
+            pass
+        value = compute()
+        self.put(key, value, version)
+        return value
+
+    def _set_version(self, version):
+        if version == self.version:
+            return
+        if self.version is None or version is None or version > self.version:
+            self.expirations += len(self._entries)
+            self._entries.clear()
+            self.version = version
+
+
+class CachedSearch:
+
+    """
+    Substring search of a corpus with cached results.
+
+    The corpus is any iterable of tunes with a `version` number that
+    increases when tunes are added or changed, such as
+    :class:`~sjkabc.Corpus`. The :class:`~sjkabc.search.Haystack` of the
+    corpus is built on the first query of every version, from a snapshot
+    taken with the corpus' `snapshot()` method if it has one, so the
+    version and the tunes always match.
+
+    Example::
+
+        >>> search = CachedSearch(Corpus('/data/music/abc/'), ttl=600)
+        >>> search.search('D2 FA')
+        [<sjkabc.sjkabc.Tune object at 0x...>, ...]
+        >>> search.cache.hit_rate
+        0.93
+
+    .. seealso:: :meth:`sjkabc.search.Haystack.search`
+    .. versionadded:: 1.5.0
+    """
+
+    def __init__(self, corpus, maxsize=1024, ttl=None, workers=None):
+        """Initialise CachedSearch
+
+        :param corpus: iterable of tunes with a `version` attribute
+        :param int maxsize: largest number of cached queries
+        :param float ttl: seconds results stay valid, or None for no limit
+        :param int workers: number of threads scanning the haystack
+
+        """
+        self.corpus = corpus
+        self.workers = workers
+        #: :class:`QueryCache` of results.
+        self.cache = QueryCache(maxsize, ttl)
+        self._haystack = (None, None)
+        self._lock = threading.Lock()
+
+    def haystack(self):
+        """Get the haystack of the current version of the corpus
+
+        :rtype: :class:`~sjkabc.search.Haystack`
+
+        """
+        return self._current()[1]
+
+    def _current(self):
+        with self._lock:
+            version, haystack = self._haystack
+            if haystack is None or version != self.corpus.version:
+                version, tunes = _snapshot(self.corpus)
+                haystack = Haystack(tunes)
+                self._haystack = (version, haystack)
+            return version, haystack
+
+    def search(self, query):
+        """Get the tunes whose expanded ABC contains `query`
+
+        :param str query: abc to search for
+        :returns: list of matching :class:`~sjkabc.Tune` objects
+        :rtype: list
+
+        """
+        key = normalise_query(query)
+        version, haystack = self._current()
+        found = self.cache.lookup(
+            key, version,
+            lambda: tuple(haystack.search(key, self.workers)))
+        return list(found)
@@ -0,0 +1,213 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+sjkabc.corpus
+
+This module provides a directory of ABC files that is kept up to date
+incrementally.
+
+:license: BSD, see LICENSE for more details.
+"""
+import collections
+import lzma
+import os
+import threading
+import zipfile
+
+from sjkabc.sjkabc import StringPool, is_abc_file, parse_file
+
+
+#: What is known about a file in the :attr:`Corpus.manifest`.
+FileInfo = collections.namedtuple('FileInfo', 'size mtime inode')
+
+#: Paths added, changed and removed by :meth:`Corpus.refresh`, and a
+#: mapping of path to the error raised by files that couldn't be read.
+Changes = collections.namedtuple('Changes', 'added changed removed errors')
+
+#: Errors of a single unreadable or corrupt file.
+_FILE_ERRORS = (OSError, EOFError, ValueError, zipfile.BadZipFile,
+                lzma.LZMAError)
+
+
+class Corpus:
+
+    """
+    Parsed tunes of every ABC file in a directory tree.
+
+    The corpus keeps a manifest of the size, modification time and inode of
+    every file it has parsed. :meth:`refresh` rescans the tree with
+    :func:`os.scandir` and only parses files that were added or changed
+    since the last refresh, dropping the tunes of removed files. Symbolic
+    links to directories aren't followed, like :func:`os.walk`.
+
+    Files that can't be read, such as corrupt archives, are reported in
+    :attr:`Changes.errors` and hold no tunes until they change again.
+
+    Example::
+
+        >>> corpus = Corpus('/data/music/abc/')
+        >>> len(corpus)
+        1204
+        >>> corpus.refresh()
+        Changes(added=[], changed=['/data/music/abc/reels.abc'], removed=[],
+                errors={})
+
+    .. seealso:: :func:`~sjkabc.parse_dir`
+    .. versionadded:: 1.5.0
+    """
+
+    def __init__(self, dir, refresh=True):
+        """Initialise Corpus
+
+        :param str dir: directory of abc files
+        :param bool refresh: parse the directory right away
+
+        """
+        self.dir = dir
+        #: Mapping of path to :class:`FileInfo`.
+        self.manifest = {}
+        #: Mapping of path to list of :class:`~sjkabc.Tune` objects.
+        self.files = {}
+        #: Incremented every time the refresh changes the corpus.
+        self.version = 0
+        #: :class:`~sjkabc.StringPool` shared by the header values of every
+        #: tune in the corpus. Only fields with few distinct values are
+        #: pooled, see :const:`~sjkabc.sjkabc.INTERNED_KEYS`. Values are
+        #: never dropped, so the pool holds every distinct value seen since
+        #: the corpus was created.
+        self.strings = StringPool()
+        self._lock = threading.RLock()
+
+        if refresh:
+            self.refresh()
+
+    def __len__(self):
+        with self._lock:
+            return sum(len(tunes) for tunes in self.files.values())
+
+    def __iter__(self):
+        with self._lock:
+            files = list(self.files.values())
+        for tunes in files:
+            yield from tunes
+
+    @property
+    def tunes(self):
+        """Every tune in the corpus
+
+        :returns: list of tunes
+        :rtype: list
+
+        """
+        return list(self)
+
+    def snapshot(self):
+        """Get the version and the tunes of the corpus at one moment
+
+        Both are read under the corpus lock, so the tunes are exactly those
+        of the version, even while another thread refreshes the corpus.
+
+        :returns: version number and list of tunes
+        :rtype: tuple
+
+        .. versionadded:: 1.5.0
+        """
+        with self._lock:
+            return self.version, [tune for tunes in self.files.values()
+                                  for tune in tunes]
+
+    def scan(self):
+        """Scan the directory tree
+
+        :returns: mapping of path to :class:`FileInfo` for every ABC file
+        :rtype: dict
+
+        """
+        found = {}
+        stack = [self.dir]
+        while stack:
+            try:
+                entries = os.scandir(stack.pop())
+            except OSError:
+                continue
+            with entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif is_abc_file(entry.name) and entry.is_file():
+                        try:
+                            st = entry.stat()
+                        except OSError:
+                            continue
+                        found[entry.path] = FileInfo(
+                            st.st_size, st.st_mtime_ns, entry.inode())
+        return found
+
+    def refresh(self):
+        """Parse added and changed files, and forget removed ones
+
+        :returns: the paths that were added, changed and removed, and the
+                  errors of files that couldn't be read
+        :rtype: :class:`Changes`
+
+        """
+        found = self.scan()
+
+        with self._lock:
+            added = [p for p in found if p not in self.manifest]
+            changed = [p for p in found if p in self.manifest
+                       and found[p] != self.manifest[p]]
+            removed = [p for p in self.manifest if p not in found]
+
+        parsed = {}
+        errors = {}
+        for path in added + changed:
+            try:
+                parsed[path] = list(parse_file(path, self.strings))
+            except FileNotFoundError:
+                removed.append(path)
+            except _FILE_ERRORS as e:
+                # Remembered in the manifest, so the file isn't read again
+                # until it changes.
+                errors[path] = e
+                parsed[path] = []
+
+        with self._lock:
+            for path in removed:
+                self.manifest.pop(path, None)
+                self.files.pop(path, None)
+            for path, tunes in parsed.items():
+                self.manifest[path] = found[path]
+                self.files[path] = tunes
+            if added or changed or removed:
+                self.version += 1
+
+        return Changes(
+            [p for p in added if p in parsed and p not in errors],
+            [p for p in changed if p in parsed and p not in errors],
+            removed,
+            errors)
+
+    def watch(self, interval=5.0, callback=None, stop=None):
+        """Refresh the corpus every `interval` seconds
+
+        This blocks until `stop` is set, so it's usually run in a thread of
+        its own. The CPU spent is bounded by the rescan of the directory
+        tree once per interval, plus parsing of files that changed.
+
+        Example::
+
+            >>> stop = threading.Event()
+            >>> threading.Thread(target=corpus.watch,
+            ...                  kwargs={'stop': stop}).start()
+
+        :param float interval: seconds to sleep between refreshes
+        :param callback: called with :class:`Changes` when files changed
+        :param stop: :class:`threading.Event` ending the loop when set
+
+        """
+        stop = stop or threading.Event()
+        while not stop.wait(interval):
+            changes = self.refresh()
+            if callback and any(changes):
+                callback(changes)
@@ -0,0 +1,236 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+sjkabc.features
+
+This module turns tunes into fixed-length feature vectors, for a cheap
+first look at which tunes of a corpus are alike.
+
+Every vector is made of four blocks, each adding up to 1:
+
+* the pitch-class histogram, weighted by note length and counted from the
+  tonic of the tune's key, so tunes compare the same in any key,
+* the histogram of melodic intervals between consecutive notes, from an
+  octave down to an octave up,
+* the rhythm profile, a histogram of note lengths in grid steps,
+* the mode of the tune's key.
+
+Vectors are L2 normalised, so their dot product is their cosine
+similarity. :class:`FeatureIndex` keeps the vectors of a corpus in one
+contiguous matrix and answers nearest neighbour queries with a single
+matrix product when NumPy is installed.
+
+:license: BSD, see LICENSE for more details.
+"""
+import heapq
+import math
+from array import array
+
+from sjkabc.grid import REST, PitchGrid, pitch_class, split_key
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover
+    numpy = None
+
+
+#: Modes of the mode block, in order.
+MODES = ('maj', 'min', 'dor', 'mix', 'phr', 'lyd', 'loc')
+
+_MODE_ALIASES = {'': 'maj', 'm': 'min', 'ion': 'maj', 'aeo': 'min'}
+
+#: Largest interval of the interval histogram, in semitones.
+MAX_INTERVAL = 12
+
+#: Upper bounds, in grid steps, of the bins of the rhythm profile.
+RHYTHM_BINS = (1, 2, 3, 4, 6, 8, 12, 16)
+
+#: Length of the feature vectors.
+FEATURE_SIZE = 12 + (2 * MAX_INTERVAL + 1) + len(RHYTHM_BINS) + 1 + len(MODES)
+
+
+def parse_mode(key):
+    """Get the tonic and mode of a K: field
+
+    Example::
+
+        >>> parse_mode('F#m')
+        (6, 'min')
+
+    :param str key: value of the K: field
+    :returns: tonic pitch class (0 being C) and one of :const:`MODES`; C
+              major if `key` isn't recognised
+    :rtype: tuple
+
+    """
+    split = split_key(key)
+    if split is None:
+        return 0, 'maj'
+    tonic, mode = split
+    mode = _MODE_ALIASES.get(mode, mode)
+    return pitch_class(tonic), mode if mode in MODES else 'maj'
+
+
+def _normalise(values):
+    total = sum(values)
+    return [v / total for v in values] if total else values
+
+
+def features(tune):
+    """Compute the feature vector of a tune
+
+    :param tune: :class:`~sjkabc.Tune` object
+    :returns: ``array('f')`` of :const:`FEATURE_SIZE` values
+    :rtype: array
+
+    """
+    tonic, mode = parse_mode(tune.key[0] if tune.key else None)
+    grid = PitchGrid.from_tune(tune)
+    pitches = grid.pitches
+
+    classes = [0] * 12
+    for pitch in pitches:
+        if pitch != REST:
+            classes[(pitch - tonic) % 12] += 1
+
+    intervals = [0] * (2 * MAX_INTERVAL + 1)
+    rhythm = [0] * (len(RHYTHM_BINS) + 1)
+    onsets = grid.onsets
+    last = None
+    for i, start in enumerate(onsets):
+        end = onsets[i + 1] if i + 1 < len(onsets) else len(pitches)
+        length = end - start
+        rhythm[next((b for b, bound in enumerate(RHYTHM_BINS)
+                     if length <= bound), len(RHYTHM_BINS))] += 1
+
+        pitch = pitches[start]
+        if pitch == REST:
+            continue
+        if last is not None:
+            step = max(-MAX_INTERVAL, min(MAX_INTERVAL, pitch - last))
+            intervals[step + MAX_INTERVAL] += 1
+        last = pitch
+
+    modes = [1.0 if m == mode else 0.0 for m in MODES]
+
+    vector = (_normalise(classes) + _normalise(intervals) +
+              _normalise(rhythm) + modes)
+    norm = math.sqrt(sum(v * v for v in vector))
+    return array('f', (v / norm for v in vector))
+
+
+class FeatureIndex:
+
+    """
+    Feature vectors of a corpus, for nearest neighbour queries.
+
+    The vectors are stored row by row in one contiguous matrix: a float32
+    NumPy array, or an ``array('f')`` without NumPy.
+
+    Example::
+
+        >>> index = FeatureIndex(parse_dir('/data/music/abc/'))
+        >>> for score, tune in index.similar(tune, k=5):
+        ...     print('{:.2f} {}'.format(score, tune.title[0]))
+
+    .. seealso:: :class:`sjkabc.similarity.SimilarityIndex`
+    .. versionadded:: 1.5.0
+    """
+
+    def __init__(self, tunes, use_numpy=True):
+        """Initialise FeatureIndex
+
+        :param tunes: iterable of :class:`~sjkabc.Tune` objects
+        :param bool use_numpy: store and query with NumPy if it's installed
+
+        """
+        self.tunes = list(tunes)
+        self.numpy = numpy if use_numpy else None
+
+        vectors = array('f')
+        for tune in self.tunes:
+            vectors.extend(features(tune))
+        if self.numpy is not None:
+            #: Matrix of one feature vector per tune.
+            self.matrix = self.numpy.frombuffer(
+                vectors, dtype=self.numpy.float32).reshape(
+                    len(self.tunes), FEATURE_SIZE)
+        else:
+            self.matrix = vectors
+
+    def __len__(self):
+        return len(self.tunes)
+
+    def vector(self, i):
+        """Get the feature vector of tune `i`
+
+        :param int i: index of the tune
+        :rtype: array
+
+        """
+        row = self.matrix[i] if self.numpy is not None else \
+            self.matrix[i * FEATURE_SIZE:(i + 1) * FEATURE_SIZE]
+        return array('f', row)
+
+    def nearest(self, vectors, k=10):
+        """Find the nearest tunes of several feature vectors at once
+
+        :param vectors: sequence of feature vectors
+        :param int k: number of tunes per vector
+        :returns: list of (score, index) tuples, best first, per vector
+        :rtype: list
+
+        """
+        if not len(self.tunes) or not len(vectors):
+            return [[] for v in vectors]
+        k = min(k, len(self.tunes))
+        if self.numpy is not None:
+            return self._nearest_numpy(vectors, k)
+        return [self._nearest(v, k) for v in vectors]
+
+    def _nearest_numpy(self, vectors, k):
+        np = self.numpy
+        queries = np.asarray(vectors, dtype=np.float32).reshape(
+            -1, FEATURE_SIZE)
+        scores = queries @ self.matrix.T
+        best = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        results = []
+        for row, candidates in zip(scores, best):
+            order = candidates[np.argsort(-row[candidates], kind='stable')]
+            results.append([(float(row[i]), int(i)) for i in order])
+        return results
+
+    def _nearest(self, vector, k):
+        matrix = self.matrix
+        scores = []
+        for i in range(len(self.tunes)):
+            offset = i * FEATURE_SIZE
+            scores.append(sum(v * matrix[offset + j]
+                              for j, v in enumerate(vector)))
+        best = heapq.nlargest(k, range(len(scores)), key=scores.__getitem__)
+        return [(scores[i], i) for i in best]
+
+    def query(self, tune, k=10):
+        """Find the tunes nearest to a tune
+
+        :param tune: :class:`~sjkabc.Tune`, not necessarily in the index
+        :param int k: number of tunes
+        :returns: list of (score, tune) tuples, best match first
+        :rtype: list
+
+        """
+        return [(score, self.tunes[i])
+                for score, i in self.nearest([features(tune)], k)[0]]
+
+    def similar(self, tune, k=10):
+        """Find the tunes nearest to a tune of the index, except itself
+
+        :param tune: :class:`~sjkabc.Tune` in the index
+        :param int k: number of tunes
+        :returns: list of (score, tune) tuples, best match first
+        :rtype: list
+
+        """
+        i = self.tunes.index(tune)
+        found = self.nearest([self.vector(i)], k + 1)[0]
+        return [(score, self.tunes[j]) for score, j in found if j != i][:k]
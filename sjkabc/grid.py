@@ -0,0 +1,388 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+sjkabc.grid
+
+This module renders tune bodies onto a fixed rhythmic grid for comparing
+tunes as arrays.
+
+Unlike :func:`~sjkabc.sjkabc.expand_abc`, which keeps one letter per note
+regardless of its length, the grid holds one pitch per time step. Note
+lengths, including fractions such as ``/2`` and ``3/2``, broken rhythms
+(``>`` and ``<``), tuplets, the unit note length (L:) and the key signature
+(K:) are all taken into account, so grids of tunes in the same metre line
+up beat by beat.
+
+Pitches are MIDI note numbers, with middle C (``C``) being 60, and rests are
+:const:`REST`. Grids are stored as ``array('b')``; NumPy is used for
+comparisons when it is installed.
+
+:license: BSD, see LICENSE for more details.
+"""
+import re
+from array import array
+from fractions import Fraction
+
+from sjkabc.sjkabc import expand_parts, strip_decorations, strip_gracenotes
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover
+    numpy = None
+
+
+#: Grid value of rests.
+REST = -1
+
+#: Default length of a grid step, as a fraction of a whole note.
+DEFAULT_STEP = Fraction(1, 16)
+
+#: Pitch class of every note letter, 0 being C.
+PITCH_CLASSES = dict(C=0, D=2, E=4, F=5, G=7, A=9, B=11)
+#: Semitones added by every ABC accidental.
+ACCIDENTALS = {'^^': 2, '^': 1, '=': 0, '_': -1, '__': -2}
+# Semitones added by the accidentals of note names, as in F# and Bb.
+_NAME_ACCIDENTALS = {'#': 1, 'b': -1}
+
+#: Number of sharps (negative for flats) of major keys.
+_KEY_SHARPS = {
+    'C': 0, 'G': 1, 'D': 2, 'A': 3, 'E': 4, 'B': 5, 'F#': 6, 'C#': 7,
+    'F': -1, 'Bb': -2, 'Eb': -3, 'Ab': -4, 'Db': -5, 'Gb': -6, 'Cb': -7,
+}
+#: Sharps added to the major key signature by each mode.
+_MODE_SHARPS = {
+    'maj': 0, 'ion': 0, 'mix': -1, 'dor': -2, 'm': -3, 'min': -3,
+    'aeo': -3, 'phr': -4, 'loc': -5, 'lyd': 1,
+}
+_SHARP_ORDER = 'FCGDAEB'
+
+#: Multiplier of tuplet note lengths, (3 meaning three notes in the time
+#: of two and so on.
+_TUPLETS = {2: Fraction(3, 2), 3: Fraction(2, 3), 4: Fraction(3, 4),
+            6: Fraction(2, 6), 8: Fraction(3, 8)}
+
+_BROKEN = {'>': Fraction(3, 2), '>>': Fraction(7, 4), '>>>': Fraction(15, 8),
+           '<': Fraction(1, 2), '<<': Fraction(1, 4), '<<<': Fraction(1, 8)}
+
+_TOKEN = re.compile(r"""
+    (?P<bar>\|)
+  | \((?P<tuplet>\d)
+  | (?P<broken>>{1,3}|<{1,3})
+  | (?P<acc>\^\^|\^|__|_|=)?
+    (?P<note>[A-Ga-gzx])
+    (?P<octave>[,']*)
+    (?P<num>\d*)(?P<slashes>/*)(?P<den>\d*)
+""", re.VERBOSE)
+
+_INLINE_FIELD = re.compile(r'\[[A-Za-z]:[^\]]*\]')
+_GUITAR_CHORD = re.compile(r'"[^"]*"')
+_CHORD = re.compile(r'\[([^\]|\d][^\]]*)\]')
+_CHORD_NOTE = re.compile(r"(\^\^|\^|__|_|=)?[A-Ga-g][,']*\d*/*\d*")
+
+
+_KEY = re.compile(r'\s*([A-G])([#b]?)\s*([A-Za-z]*)')
+
+
+def pitch_class(name):
+    """Get the pitch class of a note name
+
+    Example::
+
+        >>> pitch_class('Bb')
+        10
+
+    :param str name: note letter, optionally followed by # or b
+    :returns: pitch class, 0 being C
+    :rtype: int
+
+    """
+    return (PITCH_CLASSES[name[0]] + _NAME_ACCIDENTALS.get(name[1:], 0)) % 12
+
+
+def split_key(key):
+    """Get the tonic and mode of a K: field
+
+    Modes are lower case and cut to three letters, except ``'m'`` for
+    minor; major keys have the mode ``''``.
+
+    Example::
+
+        >>> split_key('F# Mixolydian')
+        ('F#', 'mix')
+
+    :param str key: value of the K: field, for example 'Gm'
+    :returns: tonic name and mode, or None if `key` has no tonic
+    :rtype: tuple
+
+    """
+    m = _KEY.match(key or '')
+    if not m:
+        return None
+    mode = m.group(3).lower()
+    return m.group(1) + m.group(2), mode if mode == 'm' else mode[:3]
+
+
+def parse_key(key):
+    """Get the key signature of a K: field
+
+    Example::
+
+        >>> parse_key('Ador')
+        {'F': 1}
+
+    :param str key: value of the K: field, for example 'Gm'
+    :returns: mapping of note letter to accidental, in semitones
+    :rtype: dict
+
+    """
+    split = split_key(key)
+    if split is None:
+        return {}
+
+    tonic, mode = split
+    sharps = _KEY_SHARPS.get(tonic, 0) + _MODE_SHARPS.get(mode, 0)
+    sharps = max(-7, min(7, sharps))
+
+    if sharps >= 0:
+        return {letter: 1 for letter in _SHARP_ORDER[:sharps]}
+    return {letter: -1 for letter in _SHARP_ORDER[::-1][:-sharps]}
+
+
+def parse_fraction(value, default=None):
+    """Parse a fraction such as the L: or M: field
+
+    ``C`` and ``C|`` are read as 4/4 and 2/2.
+
+    :param str value: fraction to parse, for example '1/8'
+    :param default: returned if `value` isn't a fraction
+    :returns: parsed fraction
+    :rtype: :class:`fractions.Fraction`
+
+    """
+    value = (value or '').strip()
+    value = {'C': '4/4', 'C|': '2/2'}.get(value, value)
+    m = re.match(r'(\d+)/(\d+)', value)
+    if not m or not int(m.group(2)):
+        return default
+    return Fraction(int(m.group(1)), int(m.group(2)))
+
+
+def default_note_length(metre):
+    """Get the unit note length implied by a metre
+
+    :param str metre: value of the M: field
+    :returns: 1/16 for metres below 3/4, 1/8 otherwise
+    :rtype: :class:`fractions.Fraction`
+
+    """
+    m = parse_fraction(metre)
+    if m is not None and m < Fraction(3, 4):
+        return Fraction(1, 16)
+    return Fraction(1, 8)
+
+
+def _length(num, slashes, den):
+    """Get the length multiplier of a note, like 3/2 or // (1/4)"""
+    length = Fraction(int(num) if num else 1)
+    if den:
+        length /= int(den)
+    elif slashes:
+        length /= 2 ** len(slashes)
+    return length
+
+
+def _clean(abc):
+    """Strip everything but notes, rests, bars and rhythm markers"""
+    abc = _INLINE_FIELD.sub('', abc)
+    abc = _GUITAR_CHORD.sub('', abc)
+    abc = strip_decorations(strip_gracenotes(abc))
+    abc = abc.replace('[|', '|').replace('[1', '|1').replace('[2', '|2')
+
+    def first_note(m):
+        note = _CHORD_NOTE.search(m.group(1))
+        return note.group(0) if note else ''
+
+    return expand_parts(_CHORD.sub(first_note, abc))
+
+
+class PitchGrid:
+
+    """
+    Tune body rendered onto a fixed rhythmic grid.
+
+    Example::
+
+        >>> grid = PitchGrid.from_tune(tune)
+        >>> list(grid.bar(0))
+        [67, 67, 71, 71, 74, 74, 71, 71, ...]
+
+    .. seealso:: :func:`similarity`, :func:`bar_similarity`
+    .. versionadded:: 1.5.0
+    """
+
+    def __init__(self, pitches, bars=None, step=DEFAULT_STEP, onsets=None):
+        """Initialise PitchGrid
+
+        :param pitches: ``array('b')`` with one pitch per step
+        :param list bars: grid positions where bars start
+        :param step: length of a step as a fraction of a whole note
+        :param list onsets: grid positions where notes and rests start
+
+        """
+        self.pitches = pitches
+        self.bars = bars if bars is not None else [0]
+        self.step = step
+        self.onsets = onsets if onsets is not None else []
+
+    def __len__(self):
+        return len(self.pitches)
+
+    def bar(self, i):
+        """Get the pitches of bar `i`
+
+        :param int i: bar number, counted from 0
+        :returns: pitches of the bar
+        :rtype: array
+
+        """
+        end = self.bars[i + 1] if i + 1 < len(self.bars) else len(self)
+        return self.pitches[self.bars[i]:end]
+
+    @classmethod
+    def from_tune(cls, tune, step=DEFAULT_STEP):
+        """Render a :class:`~sjkabc.Tune`
+
+        The key, unit note length and metre are taken from the tune's K:,
+        L: and M: fields.
+
+        :param tune: tune to render
+        :param step: length of a step as a fraction of a whole note
+        :returns: the rendered tune
+        :rtype: :class:`PitchGrid`
+
+        """
+        metre = tune.metre[0] if tune.metre else None
+        note_length = parse_fraction(
+            tune.note_length[0] if tune.note_length else None,
+            default_note_length(metre))
+        return render(''.join(tune.abc),
+                      key=tune.key[0] if tune.key else None,
+                      note_length=note_length, step=step)
+
+
+def render(abc, key=None, note_length=Fraction(1, 8), step=DEFAULT_STEP):
+    """Render a tune body onto a grid
+
+    Repeats are expanded first. Only the first note of chords is used, and
+    grace notes, decorations and guitar chords are ignored.
+
+    :param str abc: tune body
+    :param str key: value of the K: field
+    :param note_length: unit note length (L:) as a fraction
+    :param step: length of a step as a fraction of a whole note
+    :returns: the rendered tune
+    :rtype: :class:`PitchGrid`
+
+    """
+    signature = parse_key(key)
+    notes = []          # [pitch, length] pairs
+    bars = [0]
+    carried = {}        # accidentals in effect until the end of the bar
+    tuplet, tuplet_left = 1, 0
+    broken = None
+
+    for m in _TOKEN.finditer(_clean(abc)):
+        if m.group('bar'):
+            carried = {}
+            bars.append(len(notes))
+        elif m.group('tuplet'):
+            p = int(m.group('tuplet'))
+            tuplet, tuplet_left = _TUPLETS.get(p, 1), p
+        elif m.group('broken'):
+            if notes:
+                broken = m.group('broken')
+                notes[-1][1] *= _BROKEN[broken]
+        else:
+            length = note_length * _length(
+                m.group('num'), m.group('slashes'), m.group('den'))
+            if tuplet_left:
+                length *= tuplet
+                tuplet_left -= 1
+            if broken:
+                length *= 2 - _BROKEN[broken]
+                broken = None
+            notes.append([_pitch(m, signature, carried), length])
+
+    pitches = array('b')
+    positions = []
+    time = Fraction(0)
+    for pitch, length in notes:
+        positions.append(len(pitches))
+        end = round((time + length) / step)
+        pitches.extend([pitch] * (end - len(pitches)))
+        time += length
+    positions.append(len(pitches))
+
+    bar_starts = sorted({positions[i] for i in bars})
+    if len(bar_starts) > 1 and bar_starts[-1] == len(pitches):
+        bar_starts.pop()
+
+    onsets = sorted({p for p in positions[:-1] if p < len(pitches)})
+    return PitchGrid(pitches, bar_starts, step, onsets)
+
+
+def _pitch(m, signature, carried):
+    """Get the MIDI pitch of a note token"""
+    letter = m.group('note')
+    if letter in 'zx':
+        return REST
+
+    upper = letter.upper()
+    pitch = 60 + PITCH_CLASSES[upper] + (12 if letter.islower() else 0)
+    octave = m.group('octave')
+    pitch += 12 * octave.count("'") - 12 * octave.count(',')
+
+    note = (upper, pitch)
+    if m.group('acc'):
+        carried[note] = ACCIDENTALS[m.group('acc')]
+    pitch += carried.get(note, signature.get(upper, 0))
+
+    return max(0, min(127, pitch))
+
+
+def similarity(a, b):
+    """Fraction of grid steps where two tunes have the same pitch
+
+    The shorter grid is compared against the start of the longer one.
+
+    :param a: :class:`PitchGrid`
+    :param b: :class:`PitchGrid`
+    :returns: similarity from 0.0 to 1.0
+    :rtype: float
+
+    """
+    return _equal_fraction(a.pitches, b.pitches)
+
+
+def bar_similarity(a, b):
+    """Compare two tunes bar by bar
+
+    :param a: :class:`PitchGrid`
+    :param b: :class:`PitchGrid`
+    :returns: similarity of every bar the tunes have in common
+    :rtype: list
+
+    """
+    return [_equal_fraction(a.bar(i), b.bar(i))
+            for i in range(min(len(a.bars), len(b.bars)))]
+
+
+def _equal_fraction(a, b):
+    n = min(len(a), len(b))
+    if not n:
+        return 0.0
+    if numpy is not None:
+        x = numpy.frombuffer(a, dtype=numpy.int8, count=n)
+        y = numpy.frombuffer(b, dtype=numpy.int8, count=n)
+        return float(numpy.count_nonzero(x == y)) / n
+    return sum(1 for x, y in zip(a, b) if x == y) / n
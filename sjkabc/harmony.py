@@ -0,0 +1,233 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+sjkabc.harmony
+
+This module provides an index of the chord progressions of tunes.
+
+Chords are collected from the tune bodies with
+:func:`~sjkabc.sjkabc.split_chords` and normalised to scale degrees of the
+tune's key, written as roman numerals: ``I`` for the tonic major chord,
+``ii`` for a minor chord on the second degree, ``bVII`` for a major chord a
+whole tone below the tonic and so on. Diminished chords end with ``o`` and
+augmented chords with ``+``. Sevenths and other extensions are ignored, so
+``G7`` in the key of C is ``V``.
+
+:license: BSD, see LICENSE for more details.
+"""
+import collections
+import re
+
+from sjkabc.grid import (ACCIDENTALS, PITCH_CLASSES, parse_key, pitch_class,
+                         split_key)
+
+_NUMERALS = ('I', 'bII', 'II', 'bIII', 'III', 'IV', '#IV', 'V', 'bVI', 'VI',
+             'bVII', 'VII')
+
+_GUITAR_CHORD = re.compile(r'\s*([A-G])([#b]?)(maj|min|dim|aug|m|o|\+)?')
+_NOTE = re.compile(r"(\^\^|\^|__|_|=)?([A-Ga-g])")
+_QUERY_SEPARATOR = re.compile('[\\s,–—-]+')
+
+#: Intervals above the root of the recognised chords of notes.
+_TRIADS = (((4, 7), ''), ((3, 7), 'm'), ((3, 6), 'dim'), ((4, 8), 'aug'))
+
+_QUALITIES = {None: '', 'maj': '', 'min': 'm', 'm': 'm', 'dim': 'dim',
+              'o': 'dim', 'aug': 'aug', '+': 'aug'}
+
+
+def parse_chord(chord, key=None):
+    """Get the root and quality of a chord
+
+    Guitar chords are read by name. Chords of notes, such as ``'[GBd]'``,
+    are recognised if they hold a major, minor, diminished or augmented
+    triad, with the key signature of `key` applied to their notes.
+
+    Example::
+
+        >>> parse_chord('F#m7')
+        (6, 'm')
+        >>> parse_chord('[FAd]', key='D')
+        (2, '')
+
+    :param str chord: chord as returned by :func:`~sjkabc.split_chords`
+    :param str key: value of the K: field
+    :returns: root pitch class (0 being C) and quality, one of '', 'm',
+              'dim' and 'aug', or None if `chord` isn't a chord
+    :rtype: tuple
+
+    """
+    if chord.startswith('['):
+        return _parse_notes(chord[1:-1], key)
+
+    m = _GUITAR_CHORD.match(chord)
+    if not m:
+        # Annotations such as "^fine" and "<(" aren't chords.
+        return None
+    return pitch_class(m.group(1) + m.group(2)), _QUALITIES[m.group(3)]
+
+
+def _parse_notes(notes, key):
+    signature = parse_key(key)
+    pitches = set()
+    for m in _NOTE.finditer(notes):
+        letter = m.group(2).upper()
+        if m.group(1):
+            shift = ACCIDENTALS[m.group(1)]
+        else:
+            shift = signature.get(letter, 0)
+        pitches.add((PITCH_CLASSES[letter] + shift) % 12)
+
+    for root in sorted(pitches):
+        for intervals, quality in _TRIADS:
+            if all((root + i) % 12 in pitches for i in intervals):
+                return root, quality
+    return None
+
+
+def degree(chord, key=None):
+    """Get the scale degree of a chord in a key
+
+    Example::
+
+        >>> degree('Em', key='G')
+        'vi'
+        >>> degree('F', key='Gmix')
+        'bVII'
+
+    :param str chord: chord as returned by :func:`~sjkabc.split_chords`
+    :param str key: value of the K: field, C if not given
+    :returns: roman numeral, or None if `chord` isn't a chord
+    :rtype: str
+
+    """
+    parsed = parse_chord(chord, key)
+    if parsed is None:
+        return None
+    root, quality = parsed
+
+    split = split_key(key)
+    tonic = pitch_class(split[0]) if split else 0
+    numeral = _NUMERALS[(root - tonic) % 12]
+    if quality in ('m', 'dim'):
+        numeral = numeral.lower()
+    return numeral + {'dim': 'o', 'aug': '+'}.get(quality, '')
+
+
+def progression(tune):
+    """Get the chord progression of every part of a tune
+
+    Repeated chords are only listed once, so ``"G" abc | "G" def`` is just
+    ``['I']``.
+
+    :param tune: :class:`~sjkabc.Tune` object
+    :returns: list of parts, each a list of roman numerals
+    :rtype: list
+
+    """
+    key = tune.key[0] if tune.key else None
+    parts = []
+    for part in tune.chords:
+        degrees = []
+        for bar in part:
+            for chord in bar:
+                d = degree(chord, key)
+                if d is not None and (not degrees or degrees[-1] != d):
+                    degrees.append(d)
+        parts.append(degrees)
+    return parts
+
+
+def parse_progression(query):
+    """Split a progression such as ``'I-IV-V'`` into roman numerals
+
+    :param query: progression as a string, or a sequence of numerals
+    :returns: tuple of numerals
+    :rtype: tuple
+
+    """
+    if isinstance(query, str):
+        query = _QUERY_SEPARATOR.split(query.strip())
+    return tuple(q for q in query if q)
+
+
+class ChordIndex:
+
+    """
+    Index of the chord n-grams of tunes.
+
+    Every run of up to `n` chords of every part is indexed, so progressions
+    up to `n` chords long are answered straight from the index. Longer ones
+    are narrowed down by their n-grams and checked against the stored
+    progressions.
+
+    Example::
+
+        >>> index = ChordIndex(tunes)
+        >>> index.search('I-IV-V', part=0)
+        [<sjkabc.sjkabc.Tune object at 0x...>, ...]
+
+    .. seealso:: :func:`progression`
+    .. versionadded:: 1.5.0
+    """
+
+    def __init__(self, tunes, n=3):
+        """Initialise ChordIndex
+
+        :param tunes: iterable of :class:`~sjkabc.Tune` objects
+        :param int n: longest n-gram to index
+
+        """
+        self.tunes = list(tunes)
+        self.n = n
+        #: Progression of every tune, see :func:`progression`.
+        self.progressions = [progression(tune) for tune in self.tunes]
+        #: Mapping of n-gram to set of (tune index, part index) pairs.
+        self.postings = collections.defaultdict(set)
+
+        for i, parts in enumerate(self.progressions):
+            for p, degrees in enumerate(parts):
+                for size in range(1, n + 1):
+                    for start in range(len(degrees) - size + 1):
+                        gram = tuple(degrees[start:start + size])
+                        self.postings[gram].add((i, p))
+
+    def __len__(self):
+        return len(self.tunes)
+
+    def query(self, query, part=None):
+        """Find tunes containing a progression
+
+        :param query: progression, see :func:`parse_progression`
+        :param int part: only search this part, 0 being the A part
+        :returns: indexes of matching tunes, in order
+        :rtype: list
+
+        """
+        query = parse_progression(query)
+        if not query:
+            return []
+
+        grams = [query[i:i + self.n]
+                 for i in range(max(1, len(query) - self.n + 1))]
+        hits = set.intersection(*(self.postings.get(g, set()) for g in grams))
+        if len(query) > self.n:
+            hits = {(i, p) for i, p in hits
+                    if _contains(self.progressions[i][p], query)}
+        return sorted({i for i, p in hits if part is None or p == part})
+
+    def search(self, query, part=None):
+        """Get the tunes containing a progression
+
+        :param query: progression, see :func:`parse_progression`
+        :param int part: only search this part, 0 being the A part
+        :returns: list of :class:`~sjkabc.Tune` objects
+        :rtype: list
+
+        """
+        return [self.tunes[i] for i in self.query(query, part)]
+
+
+def _contains(degrees, query):
+    size = len(query)
+    return any(tuple(degrees[i:i + size]) == query
+               for i in range(len(degrees) - size + 1))
@@ -0,0 +1,319 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+sjkabc.headers
+
+This module parses the numeric header fields of tunes, the tempo (Q:),
+metre (M:) and unit note length (L:), and indexes them for range queries.
+
+Fields are kept as written on :class:`~sjkabc.Tune`, such as ``'1/4=120'``
+and ``'C|'``. The functions below turn them into numbers; each distinct
+value is parsed once and remembered, since a corpus only holds a handful
+of them. :class:`HeaderIndex` keeps the parsed values of a corpus in
+sorted arrays, so range and equality queries are binary searches.
+
+Example::
+
+    >>> index = HeaderIndex(parse_dir('/data/music/abc/'))
+    >>> jigs = index.search(beats=6, tempo=(100, 120))
+
+:license: BSD, see LICENSE for more details.
+"""
+import bisect
+import collections
+import functools
+import re
+from fractions import Fraction
+
+from sjkabc.grid import default_note_length, parse_fraction
+
+
+class Metre(collections.namedtuple('Metre', 'numerator denominator')):
+
+    """
+    Parsed M: field.
+
+    Additive metres such as ``2+3+2/8`` are summed up, and ``C`` and ``C|``
+    are read as 4/4 and 2/2.
+
+    .. versionadded:: 1.5.0
+    """
+
+    __slots__ = ()
+
+    @property
+    def value(self):
+        """Length of a bar as a fraction of a whole note"""
+        return Fraction(self.numerator, self.denominator)
+
+    @property
+    def compound(self):
+        """True for compound metres, whose beats divide into three
+
+        6/8 has two beats of three eighth notes, 9/8 three and 12/8 four.
+        3/4 and 3/8 are simple metres of three beats.
+
+        """
+        return self.numerator % 3 == 0 and self.numerator > 3
+
+
+class Tempo(collections.namedtuple('Tempo', 'beat bpm')):
+
+    """
+    Parsed Q: field.
+
+    `beat` is the length of a beat as a fraction of a whole note, or None
+    for the old ``Q:120`` form counting unit note lengths, and `bpm` is the
+    number of beats per minute.
+
+    .. versionadded:: 1.5.0
+    """
+
+    __slots__ = ()
+
+
+_METRE = re.compile(r'\s*(\d+(?:\s*\+\s*\d+)*)\s*/\s*(\d+)')
+_BEATS = re.compile(r'((?:\d+/\d+\s*)+)=\s*(\d+(?:\.\d+)?)')
+_BARE_TEMPO = re.compile(r'\s*(\d+(?:\.\d+)?)\s*$')
+_QUOTED = re.compile(r'"[^"]*"')
+
+
+@functools.lru_cache(maxsize=1024)
+def parse_metre(value):
+    """Parse a M: field
+
+    Example::
+
+        >>> parse_metre('6/8')
+        Metre(numerator=6, denominator=8)
+        >>> parse_metre('C|')
+        Metre(numerator=2, denominator=2)
+
+    :param str value: value of the M: field
+    :returns: the metre, or None for free metre and unreadable values
+    :rtype: :class:`Metre`
+
+    .. versionadded:: 1.5.0
+    """
+    value = (value or '').strip()
+    value = {'C': '4/4', 'C|': '2/2'}.get(value, value)
+    m = _METRE.match(value)
+    if not m or not int(m.group(2)):
+        return None
+    numerator = sum(int(n) for n in m.group(1).split('+'))
+    return Metre(numerator, int(m.group(2)))
+
+
+@functools.lru_cache(maxsize=1024)
+def parse_tempo(value):
+    """Parse a Q: field
+
+    Text in quotes, such as ``"Allegro"``, is ignored. Beats made of
+    several lengths, as in ``1/4 3/8=40``, are added up.
+
+    Example::
+
+        >>> parse_tempo('"Lively" 3/8=120')
+        Tempo(beat=Fraction(3, 8), bpm=120)
+
+    :param str value: value of the Q: field
+    :returns: the tempo, or None if `value` holds no tempo
+    :rtype: :class:`Tempo`
+
+    .. versionadded:: 1.5.0
+    """
+    value = _QUOTED.sub(' ', value or '')
+    m = _BEATS.search(value)
+    if m:
+        beat = sum(Fraction(f) for f in m.group(1).split())
+        return Tempo(beat, _number(m.group(2)))
+    m = _BARE_TEMPO.match(value)
+    if m:
+        return Tempo(None, _number(m.group(1)))
+    return None
+
+
+def _number(value):
+    number = float(value)
+    return int(number) if number.is_integer() else number
+
+
+@functools.lru_cache(maxsize=1024)
+def parse_note_length(value, metre=None):
+    """Parse a L: field
+
+    :param str value: value of the L: field, or None
+    :param str metre: value of the M: field, used when `value` is missing
+    :returns: unit note length as a fraction of a whole note
+    :rtype: :class:`fractions.Fraction`
+
+    .. seealso:: :func:`~sjkabc.grid.default_note_length`
+    .. versionadded:: 1.5.0
+    """
+    return parse_fraction(value, default_note_length(metre))
+
+
+def _first(values):
+    return values[0] if values else None
+
+
+def header_values(tune):
+    """Get the parsed tempo, metre and unit note length of a tune
+
+    Only the first value of every field is used. The tempo is given in
+    quarter notes per minute, so tunes with different beats compare.
+    `compound` tells if the metre is compound, see :attr:`Metre.compound`.
+
+    Example::
+
+        >>> header_values(tune)
+        {'tempo': 120, 'metre': Fraction(3, 4), 'beats': 3, 'beat_unit': 4,
+         'compound': False, 'note_length': Fraction(1, 8)}
+
+    :param tune: :class:`~sjkabc.Tune` object
+    :returns: mapping of :const:`INDEXED_FIELDS` to values, None for fields
+              the tune lacks
+    :rtype: dict
+
+    .. versionadded:: 1.5.0
+    """
+    return dict(zip(INDEXED_FIELDS, _parse_headers(
+        _first(tune.tempo), _first(tune.metre), _first(tune.note_length))))
+
+
+@functools.lru_cache(maxsize=4096)
+def _parse_headers(raw_tempo, raw_metre, raw_note_length):
+    metre = parse_metre(raw_metre)
+    note_length = parse_note_length(raw_note_length, raw_metre)
+    tempo = parse_tempo(raw_tempo)
+
+    bpm = None
+    if tempo is not None:
+        beat = tempo.beat if tempo.beat is not None else note_length
+        bpm = tempo.bpm * beat * 4
+        bpm = int(bpm) if bpm == int(bpm) else float(bpm)
+
+    if metre is None:
+        return bpm, None, None, None, None, note_length
+    return (bpm, metre.value, metre.numerator, metre.denominator,
+            metre.compound, note_length)
+
+
+#: Fields of :class:`HeaderIndex`, see :func:`header_values`.
+INDEXED_FIELDS = ('tempo', 'metre', 'beats', 'beat_unit', 'compound',
+                  'note_length')
+
+
+class HeaderIndex:
+
+    """
+    Sorted arrays of the parsed header fields of a corpus.
+
+    Every field of :const:`INDEXED_FIELDS` is stored as a sorted list of
+    values alongside the indexes of the tunes holding them, so range and
+    equality queries cost a binary search plus the size of the answer.
+    Tunes without a value for a field are left out of that field.
+
+    Example::
+
+        >>> index = HeaderIndex(tunes)
+        >>> index.range('tempo', 100, 120)
+        [3, 17, 42]
+        >>> index.equal('beats', 6)
+        [1, 17]
+        >>> index.equal('compound', True)
+        [1, 8, 17]
+
+    .. seealso:: :func:`header_values`
+    .. versionadded:: 1.5.0
+    """
+
+    def __init__(self, tunes):
+        """Initialise HeaderIndex
+
+        :param tunes: iterable of :class:`~sjkabc.Tune` objects
+
+        """
+        self.tunes = list(tunes)
+        #: Parsed values of every tune, see :func:`header_values`.
+        self.values = [header_values(tune) for tune in self.tunes]
+        self._keys = {}
+        self._order = {}
+        for field in INDEXED_FIELDS:
+            pairs = sorted((values[field], i)
+                           for i, values in enumerate(self.values)
+                           if values[field] is not None)
+            self._keys[field] = [value for value, i in pairs]
+            self._order[field] = [i for value, i in pairs]
+
+    def __len__(self):
+        return len(self.tunes)
+
+    def _check(self, field):
+        if field not in self._keys:
+            raise KeyError('Unknown field {!r}, expected one of {}'.format(
+                field, ', '.join(INDEXED_FIELDS)))
+
+    def range(self, field, low=None, high=None):
+        """Find tunes whose field is between `low` and `high`, inclusive
+
+        :param str field: one of :const:`INDEXED_FIELDS`
+        :param low: smallest value, or None for no lower bound
+        :param high: largest value, or None for no upper bound
+        :returns: indexes of matching tunes, in order
+        :rtype: list
+        :raises KeyError: if `field` isn't indexed
+
+        """
+        self._check(field)
+        keys = self._keys[field]
+        start = 0 if low is None else bisect.bisect_left(keys, low)
+        end = len(keys) if high is None else bisect.bisect_right(keys, high)
+        return sorted(self._order[field][start:end])
+
+    def equal(self, field, value):
+        """Find tunes whose field equals `value`
+
+        :param str field: one of :const:`INDEXED_FIELDS`
+        :param value: value to look for
+        :returns: indexes of matching tunes, in order
+        :rtype: list
+        :raises KeyError: if `field` isn't indexed
+
+        """
+        return self.range(field, value, value)
+
+    def query(self, **conditions):
+        """Find tunes matching every condition
+
+        Conditions are given as ``field=value`` for equality or
+        ``field=(low, high)`` for ranges, with None for an open bound.
+
+        Example::
+
+            >>> index.query(beats=6, tempo=(None, 100))
+
+        :returns: indexes of matching tunes, in order
+        :rtype: list
+        :raises KeyError: if a field isn't indexed
+
+        """
+        result = None
+        for field, condition in conditions.items():
+            if isinstance(condition, tuple):
+                found = self.range(field, *condition)
+            else:
+                found = self.equal(field, condition)
+            result = set(found) if result is None else result & set(found)
+        if result is None:
+            return list(range(len(self.tunes)))
+        return sorted(result)
+
+    def search(self, **conditions):
+        """Get the tunes matching every condition, see :meth:`query`
+
+        :returns: list of :class:`~sjkabc.Tune` objects
+        :rtype: list
+
+        """
+        return [self.tunes[i] for i in self.query(**conditions)]
@@ -0,0 +1,233 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+sjkabc.parallel
+
+This module provides parallel parsing and expansion of tunes.
+
+:func:`expand_all` expands tunes on a process pool, which speeds up
+expansion on every Python build. The thread pool functions avoid pickling
+tunes altogether. They scale with the number of threads on free-threaded
+Python builds (3.13t and later); on builds with the GIL they still overlap
+file reading and decompression, but parsing and expansion run one thread at
+a time.
+
+:license: BSD, see LICENSE for more details.
+"""
+import collections
+import functools
+import itertools
+import os
+import sys
+import sysconfig
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from sjkabc.sjkabc import (ExpansionError, expand_abc, imap_bounded,
+                           parse_file)
+
+
+def free_threaded():
+    """Check if Python is running without the GIL
+
+    :returns: True on free-threaded builds with the GIL disabled
+    :rtype: bool
+
+    .. versionadded:: 1.5.0
+    """
+    if not sysconfig.get_config_var('Py_GIL_DISABLED'):
+        return False
+    is_gil_enabled = getattr(sys, '_is_gil_enabled', None)
+    return is_gil_enabled is None or not is_gil_enabled()
+
+
+def default_workers():
+    """Get the default number of worker threads
+
+    :returns: number of CPUs on free-threaded builds, 4 otherwise
+    :rtype: int
+
+    """
+    if free_threaded():
+        return os.cpu_count() or 1
+    return min(4, os.cpu_count() or 1)
+
+
+def _parse_file(filename):
+    return list(parse_file(filename))
+
+
+def parse_files(filenames, workers=None):
+    """Parse files on a thread pool
+
+    Tunes are returned in the order of `filenames`, and in file order
+    within each file, like :func:`~sjkabc.parse_file` gives them.
+
+    Example::
+
+        >>> for tune in parse_files(glob.glob('tunes/*.abc'), workers=8):
+        ...     print(tune.title[0])
+
+    :param filenames: iterable of file names
+    :param int workers: number of threads, see :func:`default_workers`
+    :returns: :class:`~sjkabc.Tune` object for every found tune
+    :rtype: :class:`~sjkabc.Tune`
+
+    .. versionadded:: 1.5.0
+    """
+    workers = workers or default_workers()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for tunes in imap_bounded(pool, _parse_file, filenames, workers * 2):
+            yield from tunes
+
+
+def _expand(tunes, limits=None):
+    """Expand `tunes`, returning them and the ones that failed"""
+    if limits is None:
+        for tune in tunes:
+            tune.expanded_abc
+        return tunes, {}
+    todo = [t for t in tunes if not t._expanded_abc]
+    bodies = [''.join(t.abc) for t in todo]
+    return tunes, _store_expanded(todo, _expand_bodies(bodies, limits))
+
+
+def expand_tunes(tunes, workers=None, chunk_size=64, limits=None,
+                 on_error=None):
+    """Compute the expanded ABC of tunes on a thread pool
+
+    The expanded ABC is cached on each tune, see
+    :attr:`~sjkabc.Tune.expanded_abc`.
+
+    If `limits` are given, tunes whose expansion reaches them are left out
+    of the results and passed to `on_error` along with the
+    :exc:`~sjkabc.sjkabc.ExpansionError`.
+
+    :param tunes: iterable of :class:`~sjkabc.Tune` objects
+    :param int workers: number of threads, see :func:`default_workers`
+    :param int chunk_size: number of tunes handed to a thread at a time
+    :param limits: :class:`~sjkabc.sjkabc.ExpansionLimits` for every tune
+    :param on_error: called with every tune that was left out, and the error
+    :returns: the tunes, in input order
+    :rtype: :class:`~sjkabc.Tune`
+
+    .. versionadded:: 1.5.0
+    """
+    workers = workers or default_workers()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for chunk, failed in imap_bounded(
+                pool, functools.partial(_expand, limits=limits),
+                _chunks(tunes, chunk_size), workers * 2):
+            yield from _report_errors(chunk, failed, on_error)
+
+
+def _chunks(iterable, size):
+    """Split `iterable` into lists of `size` items"""
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _expand_bodies(bodies, limits=None):
+    if limits is None:
+        return [expand_abc(body) for body in bodies]
+    results = []
+    for body in bodies:
+        try:
+            results.append(expand_abc(body, *limits))
+        except ExpansionError as e:
+            results.append(ExpansionError(str(e)))
+    return results
+
+
+def _store_expanded(chunk, results):
+    """Cache the results on the tunes, returning the ones that failed"""
+    failed = {}
+    for tune, expanded in zip(chunk, results):
+        if isinstance(expanded, ExpansionError):
+            failed[id(tune)] = expanded
+        else:
+            tune._expanded_abc = expanded
+    return failed
+
+
+def _report_errors(chunk, failed, on_error):
+    """Yield the tunes of `chunk` that were expanded"""
+    for tune in chunk:
+        error = failed.get(id(tune))
+        if error is None:
+            yield tune
+        elif on_error is not None:
+            on_error(tune, error)
+
+
+def expand_all(tunes, workers=None, chunk_size=256, min_parallel=None,
+               limits=None, on_error=None):
+    """Compute the expanded ABC of tunes on a process pool
+
+    Only the tune bodies are sent to the worker processes, and the results
+    are stored in the expanded ABC cache of every tune, see
+    :attr:`~sjkabc.Tune.expanded_abc`. Tunes that are already expanded are
+    skipped.
+
+    `tunes` may be an endless stream: at most two chunks per worker are
+    in flight at a time. Inputs with fewer than `min_parallel` tunes are
+    expanded in this process instead, as starting a pool would cost more
+    than it saves.
+
+    If `limits` are given, tunes whose expansion reaches them are left out
+    of the results and passed to `on_error` along with the
+    :exc:`~sjkabc.sjkabc.ExpansionError`, so one malformed tune can't stall
+    a worker.
+
+    Example::
+
+        >>> for tune in expand_all(load_tunes(), workers=8):
+        ...     index(tune.expanded_abc)
+
+    :param tunes: iterable of :class:`~sjkabc.Tune` objects
+    :param int workers: number of processes, defaults to the number of CPUs
+    :param int chunk_size: number of tunes sent to a process at a time
+    :param int min_parallel: smallest input to use processes for, defaults
+                             to two chunks
+    :param limits: :class:`~sjkabc.sjkabc.ExpansionLimits` for every tune
+    :param on_error: called with every tune that was left out, and the error
+    :returns: the tunes, in input order
+    :rtype: :class:`~sjkabc.Tune`
+
+    .. seealso:: :func:`expand_tunes`
+    .. versionadded:: 1.5.0
+    """
+    workers = workers or os.cpu_count() or 1
+    if min_parallel is None:
+        min_parallel = chunk_size * 2
+
+    tunes = iter(tunes)
+    head = list(itertools.islice(tunes, min_parallel))
+    if len(head) < min_parallel or workers < 2:
+        for chunk in _chunks(itertools.chain(head, tunes), chunk_size):
+            yield from _report_errors(*_expand(chunk, limits), on_error)
+        return
+
+    chunks = _chunks(itertools.chain(head, tunes), chunk_size)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        def submit(chunk):
+            todo = [t for t in chunk if not t._expanded_abc]
+            future = pool.submit(_expand_bodies,
+                                 [''.join(t.abc) for t in todo], limits)
+            return chunk, todo, future
+
+        pending = collections.deque()
+        for chunk in chunks:
+            pending.append(submit(chunk))
+            if len(pending) >= workers * 2:
+                chunk, todo, future = pending.popleft()
+                failed = _store_expanded(todo, future.result())
+                yield from _report_errors(chunk, failed, on_error)
+        for chunk, todo, future in pending:
+            failed = _store_expanded(todo, future.result())
+            yield from _report_errors(chunk, failed, on_error)
@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+sjkabc.profiling
+
+This module provides optional instrumentation of the parsing and expansion
+functions.
+
+While a :class:`Profiler` is active, :func:`~sjkabc.parse_file`,
+:meth:`~sjkabc.Parser.parse` and every stage of
+:func:`~sjkabc.sjkabc.expand_abc` record wall time, call counts and sizes in
+and out. When no profiler is active the instrumented functions only pay for
+a single function call checking that.
+
+The active profiler is kept in a :class:`contextvars.ContextVar`, so
+profilers entered in different threads don't see each other.
+
+:license: BSD, see LICENSE for more details.
+"""
+import contextvars
+import threading
+import time
+
+
+# Stack of the profilers entered in the current context, innermost last.
+_active = contextvars.ContextVar('active_profilers', default=())
+
+
+def active_profiler():
+    """Get the currently active profiler
+
+    :returns: active profiler, or None if profiling is disabled
+    :rtype: :class:`Profiler`
+
+    """
+    profilers = _active.get()
+    return profilers[-1] if profilers else None
+
+
+class Profiler:
+
+    """
+    Per-stage counters for parsing and expansion.
+
+    Use the profiler as a context manager to enable it. Profilers may be
+    nested; the innermost one receives the measurements. A profiler is only
+    active in the thread or context that entered it, and the same profiler
+    may be entered in several threads at once.
+
+    Example::
+
+        >>> with Profiler() as prof:
+        ...     tunes = [t.expanded_abc for t in parse_dir('tunes/')]
+        >>> prof.as_dict()['expand_abc.expand_parts']
+        {'calls': 2, 'seconds': 0.0004, 'bytes_in': 610, 'bytes_out': 842,
+         'items': 0}
+
+    Sizes of strings are measured as their length.
+
+    .. versionadded:: 1.5.0
+    """
+
+    #: Counters kept for every stage.
+    FIELDS = ('calls', 'seconds', 'bytes_in', 'bytes_out', 'items')
+
+    def __init__(self):
+        """Initialise Profiler"""
+        self.stages = {}
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        _active.set(_active.get() + (self,))
+        return self
+
+    def __exit__(self, *exc):
+        _active.set(_active.get()[:-1])
+
+    def record(self, stage, seconds, bytes_in=0, bytes_out=0, items=0):
+        """Record one call of `stage`
+
+        :param str stage: name of stage, for example 'Parser.parse'
+        :param float seconds: wall time spent in the stage
+        :param int bytes_in: size of the stage input
+        :param int bytes_out: size of the stage output
+        :param int items: number of items (files, tunes) produced
+
+        """
+        with self._lock:
+            counters = self.stages.get(stage)
+            if counters is None:
+                counters = self.stages[stage] = dict.fromkeys(self.FIELDS, 0)
+            counters['calls'] += 1
+            counters['seconds'] += seconds
+            counters['bytes_in'] += bytes_in
+            counters['bytes_out'] += bytes_out
+            counters['items'] += items
+
+    def reset(self):
+        """Clear all counters"""
+        with self._lock:
+            self.stages = {}
+
+    def as_dict(self):
+        """Export counters
+
+        :returns: mapping of stage name to a dict of counters
+        :rtype: dict
+
+        """
+        with self._lock:
+            return {stage: dict(counters)
+                    for stage, counters in self.stages.items()}
+
+
+class Progress:
+
+    """
+    Throughput tracker for :func:`~sjkabc.parse_dir` progress callbacks.
+
+    The callback is called with a `dict` holding the number of files and
+    tunes processed so far, the elapsed time, and files/sec and tunes/sec.
+
+    .. versionadded:: 1.5.0
+    """
+
+    def __init__(self, callback):
+        """Initialise Progress
+
+        :param callback: callable receiving a progress `dict`
+
+        """
+        self.callback = callback
+        self.files = 0
+        self.tunes = 0
+        self.start = time.perf_counter()
+
+    def update(self, files=0, tunes=0):
+        """Add to the counts and report progress
+
+        :param int files: number of files finished
+        :param int tunes: number of tunes finished
+
+        """
+        self.files += files
+        self.tunes += tunes
+        elapsed = time.perf_counter() - self.start
+        self.callback({
+            'files': self.files,
+            'tunes': self.tunes,
+            'elapsed': elapsed,
+            'files_per_sec': self.files / elapsed if elapsed else 0.0,
+            'tunes_per_sec': self.tunes / elapsed if elapsed else 0.0,
+        })
@@ -0,0 +1,343 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+sjkabc.search
+
+This module provides fast searching of the expanded ABC of many tunes, and
+a small melodic pattern language.
+
+:license: BSD, see LICENSE for more details.
+"""
+import bisect
+import re
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+
+from sjkabc.sjkabc import EXPAND_STAGES, strip_bar_dividers
+
+
+class Haystack:
+
+    """
+    Expanded ABC of a corpus packed into one buffer for substring search.
+
+    The expanded ABC of every tune is encoded and joined with a
+    :attr:`SEPARATOR` that never occurs in expanded ABC (it has no
+    whitespace), so one call to :meth:`bytes.find` scans many tunes. Hits
+    are mapped back to tunes by a binary search over the start offsets.
+
+    Example::
+
+        >>> haystack = Haystack(parse_dir('/data/music/abc/'))
+        >>> [t.title[0] for t in haystack.search('dgdc')]
+        ['In Memory Of Coleman']
+
+    .. versionadded:: 1.5.0
+    """
+
+    #: Separator between the expanded ABC of consecutive tunes.
+    SEPARATOR = b'\n'
+
+    def __init__(self, tunes):
+        """Initialise Haystack
+
+        The expanded ABC of every tune is computed if it hasn't been already.
+
+        :param tunes: iterable of :class:`~sjkabc.Tune` objects
+
+        """
+        self.tunes = list(tunes)
+        chunks = [t.expanded_abc.encode('utf-8') for t in self.tunes]
+
+        #: Offset of the expanded ABC of every tune in :attr:`buffer`, with
+        #: the end of the buffer appended.
+        self.starts = array('Q')
+        pos = 0
+        for chunk in chunks:
+            self.starts.append(pos)
+            pos += len(chunk) + len(self.SEPARATOR)
+        self.starts.append(pos)
+
+        chunks.append(b'')
+        self.buffer = self.SEPARATOR.join(chunks)
+
+    def __len__(self):
+        return len(self.tunes)
+
+    def find(self, query, workers=None):
+        """Find the tunes whose expanded ABC contains `query`
+
+        :param str query: string to search for
+        :param int workers: number of threads scanning parts of the buffer
+        :returns: indexes of matching tunes, in order
+        :rtype: list
+
+        """
+        needle = query.encode('utf-8')
+        if self.SEPARATOR in needle:
+            return []
+        return self._scan(self._find_range, needle, workers)
+
+    def finditer(self, pattern, workers=None):
+        """Find the tunes whose expanded ABC matches regular expression
+
+        Patterns are compiled with :data:`re.MULTILINE`, so ``^`` and ``$``
+        match at the start and end of every tune. Matches spanning two tunes
+        are ignored.
+
+        :param pattern: regular expression, as a string or compiled
+        :param int workers: number of threads scanning parts of the buffer
+        :returns: indexes of matching tunes, in order
+        :rtype: list
+
+        """
+        if isinstance(pattern, str):
+            pattern = re.compile(pattern.encode('utf-8'), re.MULTILINE)
+        else:
+            source = pattern.pattern
+            if isinstance(source, str):
+                source = source.encode('utf-8')
+            pattern = re.compile(
+                source, (pattern.flags & ~re.UNICODE) | re.MULTILINE)
+        return self._scan(self._regex_range, pattern, workers)
+
+    def search(self, query, workers=None):
+        """Get the tunes whose expanded ABC contains `query`
+
+        :param str query: string to search for
+        :param int workers: number of threads scanning parts of the buffer
+        :returns: matching tunes
+        :rtype: list
+
+        """
+        return [self.tunes[i] for i in self.find(query, workers)]
+
+    def _scan(self, scan_range, needle, workers):
+        """Run `scan_range` over the buffer, optionally on several threads
+
+        Threads only run concurrently on free-threaded Python builds, as the
+        string searches hold the GIL.
+
+        """
+        count = len(self.tunes)
+        if not workers or workers < 2 or count < workers:
+            return scan_range(needle, 0, count)
+
+        step = -(-count // workers)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            parts = pool.map(lambda first: scan_range(
+                needle, first, min(first + step, count)),
+                range(0, count, step))
+            return [i for part in parts for i in part]
+
+    def _find_range(self, needle, first, last):
+        """Find `needle` in the tunes first up to, not including, last"""
+        hits = []
+        buf, starts = self.buffer, self.starts
+        pos, end = starts[first], starts[last]
+        while pos < end:
+            pos = buf.find(needle, pos, end)
+            if pos == -1:
+                return hits
+            i = bisect.bisect_right(starts, pos, first, last) - 1
+            hits.append(i)
+            pos = starts[i + 1]
+        return hits
+
+    def _regex_range(self, pattern, first, last):
+        """Find regex matches in the tunes first up to, not including, last"""
+        hits = []
+        starts = self.starts
+        pos, end = starts[first], starts[last]
+        while pos < end:
+            m = pattern.search(self.buffer, pos, end)
+            if m is None:
+                return hits
+            i = bisect.bisect_right(starts, m.start(), first, last) - 1
+            if m.end() < starts[i + 1]:
+                hits.append(i)
+                pos = starts[i + 1]
+            else:
+                pos = m.start() + 1
+        return hits
+
+
+#: :const:`~sjkabc.sjkabc.EXPAND_STAGES` without removal of bar lines.
+_BARRED_STAGES = tuple(f for f in EXPAND_STAGES if f is not strip_bar_dividers)
+
+_NOTES = 'abcdefgz'
+
+
+def expand_with_bars(abc):
+    """Expand ABC like :func:`~sjkabc.sjkabc.expand_abc`, keeping bar lines
+
+    Example::
+
+        >>> expand_with_bars('|:G2 AB|c4:|')
+        'ggab|cccc|ggab|cccc|'
+
+    :param str abc: string of abc to expand
+    :returns: expanded abc with bar lines
+    :rtype: str
+
+    """
+    for f in _BARRED_STAGES:
+        abc = f(abc)
+    return abc.lower()
+
+
+class MelodyPattern:
+
+    """
+    Compiled melodic query.
+
+    The pattern language matches the notes of expanded ABC:
+
+    ``a`` to ``g``, ``z``
+        the note itself (or a rest)
+    ``?``
+        any one note
+    ``*``
+        any run of notes within a bar
+    ``[ceg]``
+        any of the listed notes, ``[^ceg]`` any note but those
+
+    Whitespace and bar lines in the pattern are ignored. Patterns are
+    compiled once into a regular expression, and the longest run of plain
+    notes is used to reject tunes before the expression is run.
+
+    Example::
+
+        >>> pattern = MelodyPattern('d?f[ac]')
+        >>> for tune in pattern.search(parse_dir('/data/music/abc/')):
+        ...     print(tune.title[0])
+
+    .. versionadded:: 1.5.0
+    """
+
+    def __init__(self, pattern):
+        """Compile `pattern`
+
+        :param str pattern: query in the pattern language
+        :raises ValueError: if the pattern is invalid
+
+        """
+        self.pattern = pattern
+        elements = self._parse(pattern)
+        if not elements:
+            raise ValueError('Empty melody pattern')
+
+        #: True if the pattern must be matched against bar lines.
+        self.needs_bars = '*' in elements
+        #: Longest run of plain notes, used to reject tunes quickly.
+        self.literal = max(
+            (''.join(run) for run in self._literal_runs(elements)),
+            key=len, default='')
+
+        if self.needs_bars:
+            # Notes may be separated by bar lines, except within a *.
+            parts = []
+            for i, element in enumerate(elements):
+                if i and '*' not in (element, elements[i - 1]):
+                    parts.append(r'\|?')
+                parts.append('[a-gz]*?' if element == '*' else element)
+            source = ''.join(parts)
+        else:
+            source = ''.join(elements)
+        #: Compiled regular expression.
+        self.regex = re.compile(source)
+
+    def __repr__(self):
+        return 'MelodyPattern({!r})'.format(self.pattern)
+
+    @staticmethod
+    def _parse(pattern):
+        """Turn `pattern` into a list of regular expression elements"""
+        elements = []
+        i = 0
+        while i < len(pattern):
+            c = pattern[i].lower()
+            i += 1
+            if c.isspace() or c == '|':
+                continue
+            elif c in _NOTES:
+                elements.append(c)
+            elif c == '?':
+                elements.append('[a-gz]')
+            elif c == '*':
+                if not elements or elements[-1] != '*':
+                    elements.append('*')
+            elif c == '[':
+                end = pattern.find(']', i)
+                if end == -1:
+                    raise ValueError('Unterminated [ in melody pattern')
+                notes = pattern[i:end].lower()
+                i = end + 1
+                negate = notes.startswith('^')
+                notes = notes.lstrip('^')
+                if not notes or any(n not in _NOTES for n in notes):
+                    raise ValueError(
+                        'Invalid note class in melody pattern: '
+                        '[{}]'.format(pattern[i - len(notes) - 1:end]))
+                if negate:
+                    elements.append('(?![{}])[a-gz]'.format(notes))
+                else:
+                    elements.append('[{}]'.format(notes))
+            else:
+                raise ValueError(
+                    'Invalid character in melody pattern: {!r}'.format(c))
+        return elements
+
+    @staticmethod
+    def _literal_runs(elements):
+        run = []
+        for element in elements:
+            if len(element) == 1 and element in _NOTES:
+                run.append(element)
+            else:
+                yield run
+                run = []
+        yield run
+
+    def matches(self, tune):
+        """Check if `tune` matches the pattern
+
+        :param tune: :class:`~sjkabc.Tune` to check
+        :rtype: bool
+
+        """
+        expanded = tune.expanded_abc
+        if self.literal not in expanded:
+            return False
+        if self.needs_bars:
+            expanded = expand_with_bars(''.join(tune.abc))
+        return self.regex.search(expanded) is not None
+
+    def search(self, tunes):
+        """Find the tunes matching the pattern
+
+        :param tunes: iterable of :class:`~sjkabc.Tune` objects
+        :returns: matching tunes, as they are found
+        :rtype: :class:`~sjkabc.Tune`
+
+        """
+        for tune in tunes:
+            if self.matches(tune):
+                yield tune
+
+    def find(self, haystack, workers=None):
+        """Find the tunes of a :class:`Haystack` matching the pattern
+
+        Patterns using ``*`` need bar lines, which the haystack doesn't
+        have, so those are matched tune by tune.
+
+        :param haystack: :class:`Haystack` to search
+        :param int workers: number of threads scanning the haystack
+        :returns: indexes of matching tunes, in order
+        :rtype: list
+
+        """
+        if self.needs_bars:
+            return [i for i, tune in enumerate(haystack.tunes)
+                    if self.matches(tune)]
+        return haystack.finditer(self.regex, workers)
@@ -0,0 +1,294 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+sjkabc.shard
+
+This module provides splitting and merging of tunebooks into shards of
+even size, for balanced parallel processing.
+
+Tunes are copied as they are, split at X: lines without being parsed, and
+packed into shards in order: large tunebooks are spread over several
+shards and small files share one. A manifest records where every tune of
+every shard came from, and :func:`unshard` uses it to put the tunes back
+into their source files.
+
+Example::
+
+    >>> manifest = shard_dir('/data/music/abc/', '/data/shards/',
+    ...                      shard_bytes=1 << 20)
+    >>> for tunes in parse_files(shard_filenames(manifest)):
+    ...     index(tunes)
+
+:license: BSD, see LICENSE for more details.
+"""
+import json
+import os
+
+from sjkabc.sjkabc import find_abc_files, read_abc_file, tune_starts
+
+
+#: Default largest size of a shard, in bytes.
+DEFAULT_SHARD_BYTES = 1 << 22
+
+#: Name of the manifest written next to the shards.
+MANIFEST = 'manifest.json'
+
+
+class _Shard:
+
+    """Shard being written"""
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.file = open(filename, 'wb')
+        self.bytes = 0
+        self.tunes = []
+
+    def write(self, data, source, member, x):
+        self.file.write(data)
+        self.tunes.append({'source': source, 'member': member, 'x': x,
+                           'offset': self.bytes, 'length': len(data)})
+        self.bytes += len(data)
+
+    def close(self):
+        self.file.close()
+        return {'file': os.path.basename(self.filename),
+                'bytes': self.bytes, 'tunes': self.tunes}
+
+
+def _split_tunes(abc):
+    """Yield the X: number and text of every tune in `abc`"""
+    starts = tune_starts(abc)
+    for start, end in zip(starts, starts[1:] + [len(abc)]):
+        text = abc[start:end]
+        if not text.endswith(('\n', '\r')):
+            text += '\n'
+        x = text[2:].splitlines()[0].strip()
+        yield x, text
+
+
+def shard_files(filenames, out_dir, shard_bytes=DEFAULT_SHARD_BYTES,
+                shard_tunes=None, encoding='utf-8'):
+    """Split and merge ABC files into shards
+
+    A shard is closed when the next tune would make it larger than
+    `shard_bytes`, or when it holds `shard_tunes` tunes. Tunes are never
+    split, so a single tune larger than `shard_bytes` gets a shard of its
+    own. Text before the first X: line of a file is left out.
+
+    The shards are written to `out_dir` as ``shard-00000.abc`` and so on,
+    along with the :const:`MANIFEST`, see :func:`load_manifest`.
+
+    :param filenames: iterable of ABC file names
+    :param str out_dir: directory to write the shards to
+    :param int shard_bytes: largest size of a shard
+    :param int shard_tunes: largest number of tunes in a shard
+    :param str encoding: encoding of the shards
+    :returns: the manifest
+    :rtype: dict
+
+    .. seealso:: :func:`~sjkabc.sjkabc.read_abc_file`
+    .. versionadded:: 1.5.0
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    shards = []
+    current = None
+
+    try:
+        for filename in filenames:
+            for member, abc in read_abc_file(filename):
+                for x, text in _split_tunes(abc):
+                    data = text.encode(encoding)
+                    if current is not None and current.tunes and (
+                            current.bytes + len(data) > shard_bytes or
+                            (shard_tunes and
+                             len(current.tunes) >= shard_tunes)):
+                        shards.append(current.close())
+                        current = None
+                    if current is None:
+                        current = _Shard(os.path.join(
+                            out_dir, 'shard-{:05d}.abc'.format(len(shards))))
+                    current.write(data, filename, member, x)
+    finally:
+        if current is not None:
+            shards.append(current.close())
+
+    manifest = {'encoding': encoding, 'shards': shards}
+    with open(os.path.join(out_dir, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=1)
+    manifest['dir'] = out_dir
+    return manifest
+
+
+def shard_dir(dir, out_dir, **kwargs):
+    """Split and merge every ABC file in `dir` into shards
+
+    Files are taken in sorted order, so the same tree gives the same
+    shards.
+
+    :param str dir: directory of abc files
+    :param str out_dir: directory to write the shards to
+    :param kwargs: passed on to :func:`shard_files`
+    :returns: the manifest
+    :rtype: dict
+
+    .. versionadded:: 1.5.0
+    """
+    return shard_files(find_abc_files(dir), out_dir, **kwargs)
+
+
+def load_manifest(out_dir):
+    """Read the manifest of a directory of shards
+
+    The manifest is a dict with the `encoding` of the shards and a list of
+    `shards`. Each shard has its `file` name, its size in `bytes`, and a
+    list of `tunes` with the `source` file, zip archive `member` (None for
+    other files) and `x` number of every tune, and its `offset` and
+    `length` in bytes within the shard.
+
+    :param str out_dir: directory the shards were written to
+    :returns: the manifest
+    :rtype: dict
+
+    .. versionadded:: 1.5.0
+    """
+    with open(os.path.join(out_dir, MANIFEST)) as f:
+        manifest = json.load(f)
+    manifest['dir'] = out_dir
+    return manifest
+
+
+def shard_filenames(manifest):
+    """Get the paths of the shards of a manifest
+
+    :param dict manifest: manifest as returned by :func:`load_manifest`
+    :returns: list of paths
+    :rtype: list
+
+    .. versionadded:: 1.5.0
+    """
+    return [os.path.join(manifest['dir'], shard['file'])
+            for shard in manifest['shards']]
+
+
+def read_tune(manifest, shard, i):
+    """Read the text of one tune of a shard
+
+    :param dict manifest: manifest as returned by :func:`load_manifest`
+    :param int shard: index of the shard
+    :param int i: index of the tune within the shard
+    :returns: the tune, as in its source file
+    :rtype: str
+
+    .. versionadded:: 1.5.0
+    """
+    info = manifest['shards'][shard]
+    tune = info['tunes'][i]
+    with open(os.path.join(manifest['dir'], info['file']), 'rb') as f:
+        f.seek(tune['offset'])
+        return f.read(tune['length']).decode(manifest['encoding'])
+
+
+def unshard(manifest, out_dir):
+    """Write the tunes of shards back to one file per source file
+
+    Tunes are grouped by the source file recorded in the manifest, in their
+    original order, and written to `out_dir` under the source file's name
+    relative to the common directory of all sources. Compressed sources are
+    written uncompressed, and the members of a zip archive are written to a
+    directory named after the archive.
+
+    Nothing is written if two sources would end up in the same place, such
+    as ``reels.abc`` and ``reels.abc.gz``, or ``book.zip`` and a directory
+    ``book``.
+
+    :param dict manifest: manifest as returned by :func:`load_manifest`
+    :param str out_dir: directory to write the files to
+    :returns: list of the files written
+    :rtype: list
+    :raises ValueError: if the files of two sources would collide
+
+    .. versionadded:: 1.5.0
+    """
+    sources = {}
+    for info in manifest['shards']:
+        path = os.path.join(manifest['dir'], info['file'])
+        for tune in info['tunes']:
+            key = (tune['source'], tune.get('member'))
+            sources.setdefault(key, []).append(
+                (path, tune['offset'], tune['length']))
+    if not sources:
+        return []
+    names = _unshard_names(sources)
+
+    written = []
+    shard_path, shard = None, None
+    try:
+        for key, pieces in sources.items():
+            target = os.path.join(out_dir, names[key])
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+
+            with open(target, 'wb') as out:
+                for path, offset, length in pieces:
+                    if path != shard_path:
+                        if shard is not None:
+                            shard.close()
+                        shard_path, shard = path, open(path, 'rb')
+                    shard.seek(offset)
+                    out.write(shard.read(length))
+            written.append(target)
+    finally:
+        if shard is not None:
+            shard.close()
+    return written
+
+
+def _unshard_names(sources):
+    """Get the name every (source, member) pair is written to by unshard
+
+    :param sources: iterable of (source, member) pairs
+    :returns: mapping of every pair to its name relative to the output
+    :rtype: dict
+    :raises ValueError: if two pairs would be written to the same file, or
+                        a file would be written into the directory of a
+                        zip archive it isn't a member of
+
+    """
+    common = os.path.commonpath([os.path.dirname(os.path.abspath(s))
+                                 for s, member in sources])
+    names = {}
+    archives = {}   # directory of the members of every zip archive
+    for source, member in sources:
+        name = os.path.relpath(os.path.abspath(source), common)
+        for ext in ('.gz', '.bz2', '.xz', '.zip'):
+            if name.endswith(ext):
+                name = name[:-len(ext)]
+        if member is not None:
+            # Keep members inside the archive's directory.
+            archives[name] = source
+            name = os.path.join(name, *(
+                part for part in member.split('/')
+                if part not in ('', '.', '..')))
+        elif not name.endswith('.abc'):
+            name += '.abc'
+        names[source, member] = name
+
+    taken = {}
+    for key, name in names.items():
+        other = taken.setdefault(name, key)
+        if other != key:
+            raise _collision(other, key, name)
+        if name in archives:
+            raise _collision((archives[name], None), key, name)
+        parent = os.path.dirname(name)
+        while parent:
+            if archives.get(parent, key[0]) != key[0]:
+                raise _collision((archives[parent], None), key, parent)
+            parent = os.path.dirname(parent)
+    return names
+
+
+def _collision(a, b, name):
+    a, b = ('{}:{}'.format(*key) if key[1] else key[0] for key in (a, b))
+    return ValueError('{} and {} would both be written to {}'.format(
+        a, b, name))
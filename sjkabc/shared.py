@@ -0,0 +1,261 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+sjkabc.shared
+
+This module provides a parsed and expanded corpus stored in a
+:mod:`multiprocessing.shared_memory` segment, so that several worker
+processes can use one copy of it.
+
+The segment holds a small header, an array of offsets and the UTF-8 encoded
+header fields, body and expanded ABC of every tune::
+
+    header | offsets (3 * count + 1 uint64) | data
+
+:license: BSD, see LICENSE for more details.
+"""
+import collections.abc
+import struct
+from multiprocessing import resource_tracker, shared_memory
+
+from sjkabc.sjkabc import HEADER_KEYS, Tune
+
+
+MAGIC = b'SJKS'
+VERSION = 1
+
+_HEADER = struct.Struct('<4sBxxxQ')
+_OFFSET = struct.Struct('<Q')
+#: Separates header fields, and body lines, in the segment.
+_SEP = '\x00'
+
+_FIELD_IDS = {field: key for key, field in HEADER_KEYS.items()}
+
+
+class SharedTune:
+
+    """
+    Read-only view of a tune in a :class:`SharedCorpus`.
+
+    Header fields, :attr:`abc` and :attr:`expanded_abc` behave like their
+    :class:`~sjkabc.Tune` counterparts, but are decoded from shared memory
+    when first accessed. Use :meth:`to_tune` to get a regular, modifiable
+    :class:`~sjkabc.Tune`.
+
+    .. versionadded:: 1.5.0
+    """
+
+    def __init__(self, corpus, index):
+        """Initialise SharedTune
+
+        :param corpus: :class:`SharedCorpus` holding the tune
+        :param int index: position of the tune in the corpus
+
+        """
+        self._corpus = corpus
+        self._index = index
+        self._fields = None
+
+    def __getattr__(self, name):
+        if name not in _FIELD_IDS:
+            raise AttributeError(name)
+        if self._fields is None:
+            fields = {field: [] for field in _FIELD_IDS}
+            header = self._corpus._text(self._index * 3)
+            if header:
+                for line in header.split(_SEP):
+                    fields[HEADER_KEYS[line[0]]].append(line[1:])
+            self._fields = fields
+        return self._fields[name]
+
+    def __str__(self):
+        return self.title[0]
+
+    @property
+    def abc(self):
+        """Tune body"""
+        body = self._corpus._text(self._index * 3 + 1)
+        return body.split(_SEP) if body else []
+
+    @property
+    def expanded_abc(self):
+        """Expanded ABC suitable for searching
+
+        :returns: expanded abc
+        :rtype: str
+
+        """
+        return self._corpus._text(self._index * 3 + 2)
+
+    @property
+    def expanded_bytes(self):
+        """Expanded ABC as a zero-copy view of the shared memory
+
+        The view must be released before the corpus is closed.
+
+        :returns: UTF-8 encoded expanded abc
+        :rtype: memoryview
+
+        """
+        return self._corpus._slice(self._index * 3 + 2)
+
+    def to_tune(self):
+        """Copy the tune out of shared memory
+
+        :returns: a regular tune
+        :rtype: :class:`~sjkabc.Tune`
+
+        """
+        tune = Tune()
+        for field in _FIELD_IDS:
+            setattr(tune, field, list(getattr(self, field)))
+        tune.abc = self.abc
+        tune._expanded_abc = self.expanded_abc
+        return tune
+
+    def format_abc(self):
+        """Format ABC tune
+
+        .. seealso:: :meth:`sjkabc.Tune.format_abc`
+        """
+        return self.to_tune().format_abc()
+
+
+class SharedCorpus(collections.abc.Sequence):
+
+    """
+    Corpus of tunes in shared memory.
+
+    Build the corpus once with :meth:`create`, and attach to it by name from
+    any number of worker processes. Attached corpora are read-only, and
+    indexing them returns :class:`SharedTune` views.
+
+    Example::
+
+        >>> corpus = SharedCorpus.create(parse_dir('/data/music/abc/'))
+        >>> # In a worker process:
+        >>> view = SharedCorpus(corpus.name)
+        >>> [t.title[0] for t in view if 'dgdc' in t.expanded_abc]
+
+    The process that created the corpus should call :meth:`unlink` when no
+    worker needs it any more.
+
+    .. versionadded:: 1.5.0
+    """
+
+    def __init__(self, name):
+        """Attach to an existing corpus
+
+        :param str name: name of the shared memory segment
+        :raises ValueError: if the segment doesn't hold a corpus
+
+        """
+        self._attach(_open_segment(name))
+
+    def _attach(self, shm):
+        self._shm = shm
+        self._buf = shm.buf.toreadonly()
+
+        magic, version, count = _HEADER.unpack_from(self._buf)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError('Shared memory segment is not a corpus')
+
+        start = _HEADER.size
+        end = start + (count * 3 + 1) * _OFFSET.size
+        self._count = count
+        self._offsets = self._buf[start:end].cast('Q')
+        self._data = self._buf[end:]
+
+    @classmethod
+    def create(cls, tunes, name=None):
+        """Build a corpus in a new shared memory segment
+
+        The expanded ABC of every tune is computed if it hasn't been already.
+
+        :param tunes: iterable of :class:`~sjkabc.Tune` objects
+        :param str name: name of the segment, random if None
+        :returns: the corpus
+        :rtype: :class:`SharedCorpus`
+
+        """
+        chunks = []
+        for tune in tunes:
+            chunks.append(_SEP.join(
+                key + value
+                for key, field in HEADER_KEYS.items()
+                for value in getattr(tune, field)).encode('utf-8'))
+            chunks.append(_SEP.join(tune.abc).encode('utf-8'))
+            chunks.append(tune.expanded_abc.encode('utf-8'))
+
+        offsets = [0]
+        for chunk in chunks:
+            offsets.append(offsets[-1] + len(chunk))
+
+        count = len(chunks) // 3
+        start = _HEADER.size + len(offsets) * _OFFSET.size
+        shm = shared_memory.SharedMemory(name=name, create=True,
+                                         size=max(start + offsets[-1], 1))
+        _HEADER.pack_into(shm.buf, 0, MAGIC, VERSION, count)
+        struct.pack_into('<{}Q'.format(len(offsets)), shm.buf,
+                         _HEADER.size, *offsets)
+        shm.buf[start:start + offsets[-1]] = b''.join(chunks)
+
+        corpus = cls.__new__(cls)
+        corpus._attach(shm)
+        return corpus
+
+    @property
+    def name(self):
+        """Name of the shared memory segment"""
+        return self._shm.name
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self._count))]
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError('SharedCorpus index out of range')
+        return SharedTune(self, index)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _slice(self, i):
+        return self._data[self._offsets[i]:self._offsets[i + 1]]
+
+    def _text(self, i):
+        return str(self._slice(i), 'utf-8')
+
+    def close(self):
+        """Detach from the shared memory segment"""
+        for view in ('_offsets', '_data', '_buf'):
+            if hasattr(self, view):
+                getattr(self, view).release()
+        self._shm.close()
+
+    def unlink(self):
+        """Destroy the shared memory segment"""
+        self._shm.unlink()
+
+
+def _open_segment(name):
+    """Open an existing segment without handing it to the resource tracker
+
+    Only the creating process should unlink the segment, but before Python
+    3.13 attaching also registered it for removal at exit.
+
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        shm = shared_memory.SharedMemory(name=name)
+        resource_tracker.unregister(shm._name, 'shared_memory')
+        return shm
@@ -0,0 +1,200 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+sjkabc.similarity
+
+This module provides ranked "tunes most like this one" retrieval over the
+expanded ABC of a corpus.
+
+Tunes are represented as TF-IDF weighted vectors of the note n-grams of
+their expanded ABC, and ranked by cosine similarity. NumPy is used for
+scoring when it is installed.
+
+:license: BSD, see LICENSE for more details.
+"""
+import collections
+import heapq
+import math
+from array import array
+
+from sjkabc.sjkabc import Tune, expand_abc
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover
+    numpy = None
+
+
+def ngrams(expanded, n=4):
+    """Count the n-grams of a string
+
+    Example::
+
+        >>> ngrams('abcab', 2)
+        Counter({'ab': 2, 'bc': 1, 'ca': 1})
+
+    :param str expanded: expanded abc
+    :param int n: n-gram length
+    :returns: number of occurrences of every n-gram
+    :rtype: :class:`collections.Counter`
+
+    """
+    return collections.Counter(
+        expanded[i:i + n] for i in range(len(expanded) - n + 1))
+
+
+class SimilarityIndex:
+
+    """
+    TF-IDF index of the note n-grams of a corpus.
+
+    Example::
+
+        >>> index = SimilarityIndex(parse_dir('/data/music/abc/'))
+        >>> for score, tune in index.similar(tune, k=5):
+        ...     print('{:.2f} {}'.format(score, tune.title[0]))
+
+    Queries are answered term at a time from inverted postings. Without
+    NumPy, terms are visited in order of their best possible contribution,
+    and once the remaining terms can't lift an unseen tune into the top `k`
+    only tunes already scored are updated (MaxScore pruning).
+
+    .. versionadded:: 1.5.0
+    """
+
+    def __init__(self, tunes, n=4, use_numpy=True):
+        """Initialise SimilarityIndex
+
+        :param tunes: iterable of :class:`~sjkabc.Tune` objects
+        :param int n: n-gram length
+        :param bool use_numpy: score with NumPy if it's installed
+
+        """
+        self.tunes = list(tunes)
+        self.n = n
+        self.numpy = numpy if use_numpy else None
+
+        counts = [ngrams(t.expanded_abc, n) for t in self.tunes]
+        df = collections.Counter()
+        for c in counts:
+            df.update(c.keys())
+
+        count = len(self.tunes)
+        #: Inverse document frequency of every n-gram.
+        self.idf = {term: math.log((1 + count) / (1 + f)) + 1
+                    for term, f in df.items()}
+
+        postings = collections.defaultdict(lambda: (array('I'), array('d')))
+        for doc, c in enumerate(counts):
+            vector = self._weigh(c)
+            for term, weight in vector.items():
+                ids, weights = postings[term]
+                ids.append(doc)
+                weights.append(weight)
+
+        #: Mapping of n-gram to arrays of tune indexes and weights.
+        self.postings = dict(postings)
+        #: Largest weight of every n-gram in any tune.
+        self.max_weight = {term: max(weights)
+                           for term, (ids, weights) in self.postings.items()}
+
+        if self.numpy:
+            self.postings = {
+                term: (self.numpy.frombuffer(ids, dtype=self.numpy.uint32),
+                       self.numpy.frombuffer(weights))
+                for term, (ids, weights) in self.postings.items()}
+
+    def __len__(self):
+        return len(self.tunes)
+
+    def _weigh(self, counts):
+        """Turn n-gram counts into a unit length TF-IDF vector
+
+        Unknown n-grams are left out.
+
+        """
+        vector = {term: (1 + math.log(tf)) * self.idf[term]
+                  for term, tf in counts.items() if term in self.idf}
+        norm = math.sqrt(sum(w * w for w in vector.values()))
+        if not norm:
+            return {}
+        return {term: w / norm for term, w in vector.items()}
+
+    def query(self, query, k=10, expanded=False):
+        """Find the `k` tunes most similar to `query`
+
+        :param query: :class:`~sjkabc.Tune`, or a string of ABC
+        :param int k: number of results
+        :param bool expanded: `query` is already expanded ABC
+        :returns: list of (score, tune) tuples, best match first
+        :rtype: list
+
+        """
+        return [(score, self.tunes[doc])
+                for score, doc in self._query(query, k, expanded)]
+
+    def similar(self, tune, k=10):
+        """Find the `k` tunes most similar to a tune of the index
+
+        The tune itself is left out of the results.
+
+        :param tune: :class:`~sjkabc.Tune` to find similar tunes for
+        :param int k: number of results
+        :returns: list of (score, tune) tuples, best match first
+        :rtype: list
+
+        """
+        return [(score, self.tunes[doc])
+                for score, doc in self._query(tune, k + 1)
+                if self.tunes[doc] is not tune][:k]
+
+    def _query(self, query, k, expanded=False):
+        if isinstance(query, Tune):
+            query = query.expanded_abc
+        elif not expanded:
+            query = expand_abc(query)
+
+        vector = self._weigh(ngrams(query, self.n))
+        if not vector or k < 1:
+            return []
+        if self.numpy:
+            return self._score_numpy(vector, k)
+        return self._score(vector, k)
+
+    def _score_numpy(self, vector, k):
+        np = self.numpy
+        scores = np.zeros(len(self.tunes))
+        for term, qw in vector.items():
+            ids, weights = self.postings[term]
+            scores[ids] += qw * weights
+
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return [(float(scores[doc]), int(doc))
+                for doc in top if scores[doc] > 0]
+
+    def _score(self, vector, k):
+        terms = sorted(((qw * self.max_weight[term], qw, term)
+                        for term, qw in vector.items()), reverse=True)
+        remaining = sum(bound for bound, qw, term in terms)
+
+        scores = {}
+        essential = True
+        for bound, qw, term in terms:
+            ids, weights = self.postings[term]
+            if essential:
+                for doc, weight in zip(ids, weights):
+                    scores[doc] = scores.get(doc, 0.0) + qw * weight
+            else:
+                for doc, weight in zip(ids, weights):
+                    if doc in scores:
+                        scores[doc] += qw * weight
+
+            remaining -= bound
+            if essential and len(scores) >= k:
+                kth = heapq.nlargest(k, scores.values())[-1]
+                essential = remaining >= kth
+
+        best = heapq.nlargest(k, scores.items(), key=lambda i: (i[1], -i[0]))
+        return [(score, doc) for doc, score in best]
@@ -13,8 +13,25 @@ This module provides functionality for parsing ABC music notation.
     Supported ABC notation header keys. This `dict` is used to populate the
     attributes of :class:`Tune`.
 """
+import bz2
+import collections
+import contextvars
+import functools
+import gzip
+import io
+import lzma
+import operator
 import os
+import re
+import sys
 import textwrap
+import threading
+import time
+import weakref
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+from sjkabc.profiling import Progress, active_profiler
 
 
 HEADER_KEYS = dict(
@@ -39,6 +56,34 @@ HEADER_KEYS = dict(
     Z='transcription'
 )
 
+#: Header keys whose values are interned by a :class:`StringPool`: metre,
+#: unit note length, rhythm, key, tempo, parts and composer, which take a
+#: handful of distinct values across a corpus. Other fields, such as titles
+#: and X: numbers, are mostly unique and would only grow the pool.
+INTERNED_KEYS = frozenset('MLRKQPC')
+_INTERNED_FIELDS = frozenset(HEADER_KEYS[key] for key in INTERNED_KEYS)
+
+#: Tune attributes compared by :attr:`Tune.dirty`.
+_SOURCE_FIELDS = ('abc',) + tuple(HEADER_KEYS.values())
+_get_source_fields = operator.attrgetter(*_SOURCE_FIELDS)
+
+
+def _hash_fields(tune):
+    """Hash the values of the :attr:`Tune.dirty` fields of `tune`"""
+    return hash(tuple(map(tuple, _get_source_fields(tune))))
+
+#: File name endings recognised by :func:`parse_dir`.
+ABC_EXTENSIONS = ('.abc', '.abc.gz', '.abc.bz2', '.abc.xz', '.zip')
+
+_OPENERS = {'.gz': gzip.open, '.bz2': bz2.open, '.xz': lzma.open}
+
+#: Order in which :meth:`Tune.format_abc` writes header fields.
+FORMAT_ORDER = (
+    'index', 'title', 'composer', 'origin', 'rhythm', 'book', 'discography',
+    'file', 'group', 'history', 'notes', 'source', 'transcription', 'parts',
+    'metre', 'note_length', 'tempo', 'key'
+)
+
 #: List of decoration symbols according to the ABC notation standard v2.1.
 DECORATIONS = [
     '!trill!', '!trill(!', '!trill)!', '!lowermordent!', '!uppermordent!',
@@ -56,6 +101,28 @@ DECORATIONS = [
 ]
 
 
+class ExpansionError(ValueError):
+
+    """
+    Raised when expanding a tune goes beyond the given limits.
+
+    .. seealso:: :func:`expand_abc`
+    .. versionadded:: 1.5.0
+    """
+
+    def __init__(self, message, partial=None):
+        super().__init__(message)
+        #: What was expanded before the limit was reached.
+        self.partial = partial
+
+
+#: Limits of :func:`expand_abc`, for the bulk expansion functions. Fields
+#: left as None aren't limited.
+ExpansionLimits = collections.namedtuple(
+    'ExpansionLimits', 'max_length max_repeats max_steps')
+ExpansionLimits.__new__.__defaults__ = (None, None, None)
+
+
 class Tune:
 
     """
@@ -80,6 +147,12 @@ class Tune:
         #: Tune body.
         self.abc = []
         self._expanded_abc = []
+        self._chords = None
+        # (buffer, offset, length) of the parsed text, and a hash of the
+        # values of every field when it was parsed, see source_abc and
+        # dirty.
+        self._source = None
+        self._fields = None
 
         for key in HEADER_KEYS:
             setattr(self, HEADER_KEYS[key], [])
@@ -102,10 +175,84 @@ class Tune:
 
         """
 
-        # If possible we should use a cached value.
-        if not self._expanded_abc:
-            self._expanded_abc = expand_abc(''.join(self.abc))
-        return self._expanded_abc
+        # If possible we should use a cached value. The attribute is read
+        # once so that concurrent callers never see a half-done check; at
+        # worst two threads both expand the tune and store equal strings.
+        expanded = self._expanded_abc
+        if not expanded:
+            chords = []
+            expanded = _expand(''.join(self.abc), chords)
+            self._chords = chords[0]
+            self._expanded_abc = expanded
+        return expanded
+
+    @property
+    def chords(self):
+        """
+        Chords of every bar, grouped by part
+
+        :returns: list of parts, each a list of bars, each a list of chords
+        :rtype: list
+
+        .. seealso:: :func:`split_chords`
+        .. versionadded:: 1.5.0
+        """
+        # Collected and cached along with expanded_abc when the tune is
+        # expanded first.
+        chords = self._chords
+        if chords is None:
+            chords = self._chords = split_chords(''.join(self.abc))[1]
+        return chords
+
+    @property
+    def dirty(self):
+        """
+        Check if the tune was modified since it was parsed
+
+        Only tunes parsed with `keep_source`, see :class:`Parser`, know
+        their original values. Other tunes are always dirty.
+
+        :returns: True if a field or the body was changed
+        :rtype: bool
+
+        .. versionadded:: 1.5.0
+        """
+        if self._fields is None:
+            return True
+        return _hash_fields(self) != self._fields
+
+    @property
+    def source_abc(self):
+        """
+        Text the tune was parsed from, if it's unmodified
+
+        The text runs from the X: line up to the next tune, and includes
+        comments and blank lines, so it's an exact copy of the input. Only
+        tunes parsed with `keep_source`, see :class:`Parser`, keep their
+        text, and tunes parsed with :meth:`Parser.feed` never do.
+
+        :returns: original text, or None if the tune is :attr:`dirty`
+        :rtype: str
+
+        .. seealso:: :meth:`format_abc`
+        .. versionadded:: 1.5.0
+        """
+        if self._source is None or self.dirty:
+            return None
+        buffer, offset, length = self._source
+        return buffer[offset:offset + length]
+
+    def _set_source(self, buffer, offset, length):
+        """Remember where in `buffer` the tune was parsed from"""
+        self._source = (buffer, offset, length)
+        self._fields = _hash_fields(self)
+
+    def __reduce__(self):
+        # Pickle in the compact wire format, keeping only the tune's own
+        # part of the buffer it was parsed from.
+        from sjkabc import wire
+        return (wire._load_tune, (wire.dumps([self], include_expanded=True),
+                                  self.source_abc))
 
     def __str__(self):
         return self.title[0]
@@ -136,10 +283,7 @@ class Tune:
 
         """
         ret = list()
-        for attr in ['index', 'title', 'composer', 'origin', 'rhythm', 'book',
-                     'discography', 'file', 'group', 'history', 'notes',
-                     'source', 'transcription', 'parts', 'metre',
-                     'note_length', 'tempo', 'key']:
+        for attr in FORMAT_ORDER:
             ret += [l for l in self._get_header_line(attr) if len(l) > 2]
 
         ret += [line for line in self.abc]
@@ -163,17 +307,49 @@ class Parser:
         >>> for tune in Parser(abc):
         ...     print('Parsed ', tune.title)
 
+    Input arriving in pieces, from a pipe or a socket, can be pushed to the
+    parser with :meth:`feed` and :meth:`close` instead.
+
     .. seealso:: :class:`Tune`
     """
 
-    def __init__(self, abc=None):
+    def __init__(self, abc=None, strings=None, callback=None,
+                 keep_source=False):
         """Initialise Parser
 
+        If `strings` is given, the values of the :const:`INTERNED_KEYS` are
+        interned in it so that identical values share one string object.
+        Pass the same :class:`StringPool` to several parsers to share values
+        across a corpus, or True to use a pool of this parser's own.
+
+        If `keep_source` is True, tunes parsed by :meth:`parse` remember
+        the text they were parsed from, see :attr:`Tune.source_abc` and
+        :attr:`Tune.dirty`. Every such tune holds a reference to the whole
+        text given to :meth:`parse`, which is kept in memory as long as one
+        of the tunes is.
+
         :param abc: string containing ABC to parse
+        :param strings: optional :class:`StringPool`
+        :param callback: called with every tune parsed by :meth:`feed`,
+                         instead of keeping them in `self.tunes`
+        :param bool keep_source: make tunes remember their text
+
+        .. versionchanged:: 1.5.0
+            Added the `strings`, `callback` and `keep_source` parameters.
 
         """
         self.tunes = []
         self.last_field = None
+        self.callback = callback
+        self.keep_source = keep_source
+        self._lock = threading.Lock()
+        # Unfinished line and parsing state of feed().
+        self._pending = ''
+        self._state = (False, None, None)
+        if strings is True:
+            strings = StringPool()
+        #: :class:`StringPool` used for header values, or None.
+        self.strings = strings
 
         if abc:
             self.parse(abc)
@@ -183,10 +359,11 @@ class Parser:
         return self
 
     def __next__(self):
-        if self.index == 0:
-            raise StopIteration
-        self.index = self.index - 1
-        return self.tunes[self.index]
+        with self._lock:
+            if self.index == 0:
+                raise StopIteration
+            self.index = self.index - 1
+            return self.tunes[self.index]
 
     def parse(self, abc):
         """Parse ABC notation.
@@ -196,19 +373,70 @@ class Parser:
         :param abc: string containing abc to parse
 
         """
-        in_header = False
-        current_tune = None
+        profiler = active_profiler()
+        if profiler is None:
+            self._parse(abc)
+            return
+
+        count = len(self.tunes)
+        start = time.perf_counter()
+        self._parse(abc)
+        profiler.record('Parser.parse', time.perf_counter() - start,
+                        bytes_in=len(abc), items=len(self.tunes) - count)
+
+    def _parse(self, abc):
+        """Parse ABC notation without instrumentation.
+
+        All parsing state is kept in local variables and the found tunes are
+        added to `self.tunes` in one go, so several threads may parse with
+        the same `Parser`.
+
+        :param abc: string containing abc to parse
+
+        """
+        tunes = []
+        in_header, current_tune, last_field = self._parse_lines(
+            abc.splitlines(), False, None, None, tunes.append)
+        if current_tune:
+            tunes.append(self._intern_fields(current_tune))
+
+        if self.keep_source:
+            # Every tune starts at an X: line, up to the start of the next.
+            starts = tune_starts(abc)
+            if len(starts) == len(tunes):
+                starts.append(len(abc))
+                for tune, start, end in zip(tunes, starts, starts[1:]):
+                    tune._set_source(abc, start, end - start)
+
+        with self._lock:
+            self.tunes.extend(tunes)
+            self.last_field = last_field
+
+    def _parse_lines(self, lines, in_header, current_tune, last_field, emit):
+        """Parse lines of ABC notation.
+
+        Every tune is passed to `emit` when the X: line of the next one is
+        found. The parsing state is passed in and returned, so that parsing
+        may continue with more lines later.
+
+        :param lines: iterable of lines without line breaks
+        :param bool in_header: True if the current tune's header isn't done
+        :param current_tune: :class:`Tune` being parsed, or None
+        :param str last_field: :class:`Tune` attribute of the last field
+        :param emit: callable taking a finished :class:`Tune`
+        :returns: in_header, current_tune and last_field after the lines
+        :rtype: tuple
 
-        for line in abc.splitlines():
+        """
+        for line in lines:
             if self._line_empty(line) or self._line_comment(line):
                 continue
 
             # At beginning of header
             if self._line_is_index(line):
                 if current_tune:
-                    # We have a parsed tune already, append it to list of
-                    # tunes.
-                    self.tunes.append(current_tune)
+                    # We have a parsed tune already, pass it on.
+                    emit(self._intern_fields(current_tune))
 
                 in_header = True
                 current_tune = Tune()
@@ -216,12 +444,13 @@ class Parser:
             if in_header:
                 (key, val) = line.split(':', 1)
                 if key in HEADER_KEYS:
-                    getattr(current_tune, HEADER_KEYS[key]).append(val.strip())
-                    self.last_field = HEADER_KEYS[key]
+                    getattr(current_tune, HEADER_KEYS[key]).append(
+                        val.strip())
+                    last_field = HEADER_KEYS[key]
 
                 # Continuation of info field.
-                if key == '+' and self.last_field:
-                    field = getattr(current_tune, self.last_field)
+                if key == '+' and last_field:
+                    field = getattr(current_tune, last_field)
                     field[-1] = field[-1] + ' ' + val.strip()
 
                 # Header ends at K:
@@ -232,9 +461,83 @@ class Parser:
                 if current_tune:
                     current_tune.abc.append(line)
 
+        return in_header, current_tune, last_field
+
+    def feed(self, chunk):
+        """Parse a chunk of ABC notation.
+
+        Chunks may start and end anywhere, even in the middle of a line; the
+        unfinished line is kept until the next chunk or :meth:`close`.
+        Every tune is passed to the `callback` given to :class:`Parser`, or
+        added to `self.tunes`, as soon as the X: line of the next tune is
+        read. Call :meth:`close` at the end of the input to get the last
+        tune.
+
+        Example::
+
+            >>> parser = Parser(callback=print_title)
+            >>> for chunk in iter(lambda: sock.recv(4096), b''):
+            ...     parser.feed(decoder.decode(chunk))
+            >>> parser.close()
+
+        Unlike :meth:`parse`, a parser may only be fed from one thread at a
+        time.
+
+        :param str chunk: part of the ABC input
+
+        .. seealso:: :meth:`close`
+        .. versionadded:: 1.5.0
+        """
+        data = self._pending + chunk
+        cut = max(data.rfind('\n'), data.rfind('\r')) + 1
+        self._pending = data[cut:]
+        if cut:
+            self._state = self._parse_lines(data[:cut].splitlines(),
+                                            *self._state, self._emit)
+
+    def close(self):
+        """Finish parsing input given to :meth:`feed`.
+
+        The unfinished last line is parsed, and the last tune is passed on
+        like the others. The parser may be fed again afterwards.
+
+        .. versionadded:: 1.5.0
+        """
+        lines, self._pending = self._pending.splitlines(), ''
+        in_header, current_tune, last_field = self._parse_lines(
+            lines, *self._state, self._emit)
+        self._state = (False, None, None)
+        if current_tune:
+            self._emit(self._intern_fields(current_tune))
+
+        with self._lock:
+            self.last_field = last_field
+            self.index = len(self.tunes)
+
+    def _intern_fields(self, tune):
+        """Intern the values of the :const:`INTERNED_KEYS` of a whole tune
+
+        Values are interned once the tune is complete, so only the final
+        value of a field continued on +: lines enters the pool.
+
+        :param tune: :class:`Tune` to intern the values of
+        :returns: `tune`
+
+        """
+        if self.strings is not None:
+            intern = self.strings.intern
+            for field in _INTERNED_FIELDS:
+                values = getattr(tune, field)
+                if values:
+                    values[:] = map(intern, values)
+        return tune
+
+    def _emit(self, tune):
+        if self.callback is not None:
+            self.callback(tune)
         else:
-            if current_tune:
-                self.tunes.append(current_tune)
+            with self._lock:
+                self.tunes.append(tune)
 
     def _line_is_key(self, line):
         """Check if line is a K: line
@@ -305,6 +608,201 @@ class Parser:
             return False
 
 
+class StringPool:
+
+    """
+    Pool of interned strings.
+
+    Header values such as ``4/4``, ``1/8`` or ``reel`` repeat across almost
+    every tune of a corpus. A :class:`Parser` given a `StringPool` stores one
+    shared string object per distinct value of the :const:`INTERNED_KEYS`,
+    which saves memory and lets filters compare values by identity::
+
+        >>> strings = StringPool()
+        >>> tunes = list(parse_dir('/data/music/abc/', strings=strings))
+        >>> reel = strings.intern('reel')
+        >>> reels = [t for t in tunes if t.rhythm and t.rhythm[0] is reel]
+        >>> strings.stats()
+        {'strings': 5120, 'hits': 811230, 'bytes_saved': 42178334}
+
+    The counters are approximate when a pool is shared between threads.
+
+    .. versionadded:: 1.5.0
+    """
+
+    def __init__(self):
+        """Initialise StringPool"""
+        self._strings = {}
+        #: Number of strings replaced by an already pooled one.
+        self.hits = 0
+        #: Memory used by the replaced strings, in bytes.
+        self.bytes_saved = 0
+
+    def __len__(self):
+        return len(self._strings)
+
+    def __contains__(self, string):
+        return string in self._strings
+
+    def intern(self, string):
+        """Get the pooled string equal to `string`
+
+        :param str string: string to intern
+        :returns: `string`, or an equal string already in the pool
+        :rtype: str
+
+        """
+        pooled = self._strings.setdefault(string, string)
+        if pooled is not string:
+            self.hits += 1
+            self.bytes_saved += sys.getsizeof(string)
+        return pooled
+
+    def stats(self):
+        """Get pool statistics
+
+        :returns: number of strings in the pool, number of hits and bytes
+                  saved
+        :rtype: dict
+
+        """
+        return {'strings': len(self._strings), 'hits': self.hits,
+                'bytes_saved': self.bytes_saved}
+
+
+class TuneCollection:
+
+    """
+    Lazy, reusable sequence of tunes.
+
+    Unlike :class:`Parser`, which builds every :class:`Tune` up front and
+    can only be iterated once, `TuneCollection` only records where each tune
+    starts and ends in the source string. :class:`Tune` objects are
+    materialised on access, which makes it cheap to page through very large
+    tunebooks. The collection supports :func:`len`, indexing, slicing and
+    repeated iteration in file order.
+
+    Example::
+
+        >>> tunes = TuneCollection(abc)
+        >>> len(tunes)
+        2
+        >>> [t.title[0] for t in tunes[0:2]]
+        ['In Memory Of Coleman', 'Apples In Winter']
+
+    Materialised tunes are cached for as long as they are referenced
+    elsewhere, so ``tunes[0] is tunes[0]`` holds while you keep a reference.
+
+    .. seealso:: :class:`Parser`, :func:`parse_file`
+    .. versionadded:: 1.5.0
+    """
+
+    def __init__(self, abc=''):
+        """Initialise TuneCollection
+
+        :param str abc: string containing ABC to index
+
+        """
+        self.abc = abc
+        self._cache = weakref.WeakValueDictionary()
+        self._lock = threading.Lock()
+
+        starts = tune_starts(abc)
+        #: List of (start, end) offsets into :attr:`abc`, one per tune.
+        self.spans = list(zip(starts, starts[1:] + [len(abc)]))
+
+    @classmethod
+    def from_file(cls, filename):
+        """Create a collection from the contents of `filename`
+
+        Compressed files and zip archives are read like
+        :func:`parse_file` does; the members of an archive are indexed as
+        one collection, in archive order.
+
+        :param filename: name of file to index
+        :returns: collection of the tunes in `filename`
+        :rtype: :class:`TuneCollection`
+
+        .. versionchanged:: 1.5.0
+           Compressed files and zip archives are supported.
+        """
+        return cls('\n'.join(abc for name, abc in read_abc_file(filename)))
+
+    def __len__(self):
+        return len(self.spans)
+
+    def __iter__(self):
+        for i in range(len(self.spans)):
+            yield self[i]
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('TuneCollection index out of range')
+
+        with self._lock:
+            tune = self._cache.get(index)
+        if tune is not None:
+            return tune
+
+        # Parse outside the lock so threads can materialise tunes in
+        # parallel, but let the first one stored win.
+        tune = self._materialise(index)
+        with self._lock:
+            return self._cache.setdefault(index, tune)
+
+    def source(self, index):
+        """Get the ABC source of a single tune
+
+        :param int index: position of the tune in the collection
+        :returns: the unparsed ABC of the tune
+        :rtype: str
+
+        """
+        start, end = self.spans[index]
+        return self.abc[start:end]
+
+    def _materialise(self, index):
+        """Parse the tune at `index` into a :class:`Tune`
+
+        :param int index: position of the tune in the collection
+        :returns: parsed tune
+        :rtype: :class:`Tune`
+
+        """
+        return Parser(self.source(index), keep_source=True).tunes[0]
+
+
+#: Line boundaries recognised by :meth:`str.splitlines`, which
+#: :class:`Parser` uses.
+_LINE_BREAKS = frozenset('\n\r\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029')
+
+
+def tune_starts(abc):
+    """Find where tunes start
+
+    Tunes start at X: lines, at the start of `abc` or after any of the line
+    boundaries :class:`Parser` splits lines at.
+
+    :param str abc: string containing ABC
+    :returns: offsets of the X: lines in `abc`
+    :rtype: list
+
+    .. versionadded:: 1.5.0
+    """
+    starts = []
+    pos = abc.find('X:')
+    while pos != -1:
+        if not pos or abc[pos - 1] in _LINE_BREAKS:
+            starts.append(pos)
+        pos = abc.find('X:', pos + 2)
+    return starts
+
+
 def get_id_from_field(field):
     """Get id char from field name
 
@@ -336,10 +834,84 @@ def get_field_from_id(id):
         raise KeyError('No such header key: {}'.format(id))
 
 
-def parse_file(filename):
+def read_abc_file(filename):
+    """Read ABC sources from a plain or compressed file
+
+    Files ending in .gz, .bz2 and .xz are decompressed while reading. Zip
+    archives yield the contents of every member whose name ends in .abc,
+    without extracting them to disk.
+
+    :param filename: Name of file to read, a string or path-like object
+    :returns: list of (member name, ABC string) tuples, one per archive
+              member, or a single tuple with no member name for other files
+    :rtype: list
+
+    .. seealso:: :const:`ABC_EXTENSIONS`, :func:`parse_file`
+    .. versionadded:: 1.5.0
+    """
+    filename = os.fspath(filename)
+    profiler = active_profiler()
+    start = time.perf_counter()
+
+    if filename.endswith('.zip'):
+        with zipfile.ZipFile(filename) as archive:
+            sources = []
+            for name in archive.namelist():
+                if not name.endswith('.abc'):
+                    continue
+                with archive.open(name) as member:
+                    sources.append((name, io.TextIOWrapper(member).read()))
+    else:
+        opener = _OPENERS.get(os.path.splitext(filename)[1], open)
+        with opener(filename, 'rt') as f:
+            sources = [(None, f.read())]
+
+    if profiler is not None:
+        profiler.record('parse_file.read', time.perf_counter() - start,
+                        bytes_out=sum(len(abc) for name, abc in sources),
+                        items=len(sources))
+
+    return sources
+
+
+def is_abc_file(filename):
+    """Check if `filename` has one of the :const:`ABC_EXTENSIONS`
+
+    :param filename: name of file to check, a string or path-like object
+    :returns: True if the file can be parsed by :func:`parse_file`
+    :rtype: bool
+
+    .. versionadded:: 1.5.0
+    """
+    return os.fspath(filename).endswith(ABC_EXTENSIONS)
+
+
+def find_abc_files(dir):
+    """Find every ABC file in `dir` and its subdirectories
+
+    Files with one of the :const:`ABC_EXTENSIONS` are yielded in sorted
+    order, directory by directory, so every walk of the same tree gives
+    the same order. Symbolic links to directories aren't followed.
+
+    :param dir: directory to search
+    :returns: path of every ABC file
+    :rtype: str
+
+    .. seealso:: :func:`is_abc_file`, :func:`parse_dir`
+    .. versionadded:: 1.5.0
+    """
+    for dirpath, dirnames, files in os.walk(dir):
+        dirnames.sort()
+        for f in sorted(files):
+            if is_abc_file(f):
+                yield os.path.join(dirpath, f)
+
+
+def parse_file(filename, strings=None, keep_source=False):
     """Run Parser on file contents
 
-    This function is iterable.
+    This function is iterable, and yields tunes in file order. Compressed
+    files and zip archives are supported, see :func:`read_abc_file`.
 
     :Example:
 
@@ -347,32 +919,109 @@ def parse_file(filename):
         ...    print(tune.title)
 
     :param filename: Name of file to parse
+    :param strings: optional :class:`StringPool` for header values
+    :param bool keep_source: make tunes remember their text, see
+                             :class:`Parser`
     :returns: :class:`Tune` object for every found tune.
     :rtype: :class:`Tune`
 
     .. seealso:: :func:`parse_dir`, :class:`Parser`, :class:`Tune`
+    .. versionchanged:: 1.5.0
+        Added the `strings` and `keep_source` parameters. Tunes are
+        yielded in file order instead of last to first.
     """
-    with open(filename, 'r') as f:
-        abc = f.read()
+    for name, abc in read_abc_file(filename):
+        yield from Parser(abc, strings, keep_source=keep_source).tunes
 
-    for tune in Parser(abc):
-        yield tune
 
+def parse_dir(dir, progress=None, workers=None, strings=None,
+              keep_source=False):
+    """Run :class:`Parser` on every ABC file in `dir`
 
-def parse_dir(dir):
-    """Run :class:`Parser` on every file with .abc extension in `dir`
+    Every file with one of the :const:`ABC_EXTENSIONS` is parsed, in the
+    order of :func:`find_abc_files`. If `workers` is given, files are read
+    and decompressed by a pool of that many threads ahead of the parser.
+
+    If `progress` is given it is called after every file with a `dict`
+    containing the number of files and tunes parsed so far, the elapsed
+    time, and the files/sec and tunes/sec rates.
 
     :param dir: Directory of abc files
+    :param progress: optional progress callback
+    :param int workers: number of threads reading files
+    :param strings: optional :class:`StringPool` for header values
+    :param bool keep_source: make tunes remember their text, see
+                             :class:`Parser`
     :returns: :class:`Tune` object for every found file
     :rtype: :class:`Tune`
 
-    .. seealso:: :func:`parse_file`, :class:`Parser`, :class:`Tune`
+    .. seealso:: :func:`parse_file`, :class:`Parser`, :class:`Tune`,
+                 :class:`sjkabc.profiling.Progress`
+    .. versionchanged:: 1.5.0
+        Added the `progress`, `workers`, `strings` and `keep_source`
+        parameters, and support for compressed files. Files are parsed in
+        sorted order, and their tunes yielded in file order.
 
     """
-    for dirpath, dirnames, filenames in os.walk(dir):
-        for filename in [f for f in filenames if f.endswith('.abc')]:
-            for tune in parse_file(os.path.join(dirpath, filename)):
-                yield tune
+    tracker = Progress(progress) if progress else None
+    filenames = find_abc_files(dir)
+
+    if workers:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for sources in imap_bounded(pool, read_abc_file, filenames,
+                                        workers * 2):
+                yield from _parse_sources(sources, tracker, strings,
+                                          keep_source)
+    else:
+        for filename in filenames:
+            yield from _parse_sources(read_abc_file(filename), tracker,
+                                      strings, keep_source)
+
+
+def _parse_sources(sources, tracker=None, strings=None, keep_source=False):
+    """Parse the ABC sources of one file
+
+    :param list sources: ABC sources as returned by :func:`read_abc_file`
+    :param tracker: optional :class:`sjkabc.profiling.Progress`
+    :param strings: optional :class:`StringPool` for header values
+    :param bool keep_source: make tunes remember their text
+    :returns: :class:`Tune` object for every found tune
+    :rtype: :class:`Tune`
+
+    """
+    count = 0
+    for name, abc in sources:
+        for tune in Parser(abc, strings, keep_source=keep_source).tunes:
+            count += 1
+            yield tune
+    if tracker:
+        tracker.update(files=1, tunes=count)
+
+
+def imap_bounded(pool, fn, iterable, window):
+    """Map `fn` over `iterable` on `pool`, keeping results in order
+
+    At most `window` calls are submitted ahead of the consumer, so long or
+    endless inputs are never read into memory all at once. Every call runs
+    in a copy of the caller's :mod:`contextvars` context, so the active
+    :class:`~sjkabc.profiling.Profiler` records the work of the pool.
+
+    :param pool: :class:`concurrent.futures.Executor` to run `fn` on
+    :param fn: function to call for every item
+    :param iterable: items to process
+    :param int window: maximum number of pending calls
+    :returns: result of `fn` for every item, in input order
+
+    .. versionadded:: 1.5.0
+    """
+    pending = collections.deque()
+    for item in iterable:
+        context = contextvars.copy_context()
+        pending.append(pool.submit(context.run, fn, item))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
 
 
 def strip_ornaments(abc):
@@ -597,45 +1246,71 @@ def strip_slurs(abc):
     return abc
 
 
-def expand_notes(abc):
+def expand_notes(abc, max_length=None):
     """
     Expand notes, so that E2 becomes EE et.c.
 
     :param str abc: abc to expand
+    :param int max_length: longest allowed result
     :returns: expanded abc
     :rtype: str
+    :raises ExpansionError: if the result would be longer than `max_length`
+
+    .. versionchanged:: 1.5.0
+        Added the `max_length` parameter.
     """
 
     ret = []
     prev = None
+    length = 0
     for c in abc:
         if c.isdigit() and (prev.isalpha() or prev in [',' '\'']):
             ret.append(prev * (int(c)-1))
+            length += int(c) - 1
         else:
             ret.append(c)
+            length += 1
+
+        if max_length is not None and length > max_length:
+            raise ExpansionError(
+                'Expanded notes longer than {}'.format(max_length),
+                ''.join(ret))
 
         prev = c
 
     return ''.join(ret)
 
 
-def expand_parts(abc):
+def expand_parts(abc, max_repeats=None, max_length=None, max_steps=None):
     """
     Expand repeats with support for (two) alternate endings.
 
+    Every repeat rescans and copies the abc, so the work done grows with
+    the number of repeats times the length of the abc. The optional limits
+    stop expansion of malformed or hostile input early.
+
     Example::
 
         >>> print(expand_parts('aaa|bbb|1ccc:|2ddd|]'))
         aaa|bbb|ccc|aaa|bbb|ddd|
 
     :param str abc: abc to expand
+    :param int max_repeats: largest number of repeats to expand
+    :param int max_length: longest allowed result
+    :param int max_steps: largest number of characters to scan
     :returns: expanded abc
     :rtype: str
+    :raises ExpansionError: if a limit is reached; its `partial` attribute
+                            holds the abc with the repeats expanded so far
 
+    .. versionchanged:: 1.5.0
+        Added the `max_repeats`, `max_length` and `max_steps` parameters.
     """
     parsed_abc = abc
     start = 0
     end = 0
+    repeats = 0
+    steps = 0
 
     parsed_abc = parsed_abc.replace('::', ':||:')
 
@@ -644,6 +1319,19 @@ def expand_parts(abc):
         if (end == -1):
             break
 
+        repeats += 1
+        steps += len(parsed_abc)
+        error = None
+        if max_repeats is not None and repeats > max_repeats:
+            error = 'More than {} repeats'.format(max_repeats)
+        elif max_steps is not None and steps > max_steps:
+            error = 'Expanding repeats took more than {} steps'.format(
+                max_steps)
+        elif max_length is not None and len(parsed_abc) > max_length:
+            error = 'Expanded parts longer than {}'.format(max_length)
+        if error:
+            raise ExpansionError(error, _clean_parts(parsed_abc))
+
         new_start = parsed_abc.rfind('|:', 0, end)
         if (new_start != -1):
             start = new_start+2
@@ -683,13 +1371,20 @@ def expand_parts(abc):
                                             ''.join(tmp), 1)
             start += len(tmp)
 
-    for rep in ['|:', ':', ']']:
-        parsed_abc = parsed_abc.replace(rep, '')
-    parsed_abc = parsed_abc.replace('||', '|')
-
+    parsed_abc = _clean_parts(parsed_abc)
+    if max_length is not None and len(parsed_abc) > max_length:
+        raise ExpansionError(
+            'Expanded parts longer than {}'.format(max_length), parsed_abc)
     return parsed_abc
 
 
+def _clean_parts(abc):
+    """Remove repeat signs left after expanding parts"""
+    for rep in ['|:', ':', ']']:
+        abc = abc.replace(rep, '')
+    return abc.replace('||', '|')
+
+
 def strip_chords(abc):
     """Strip chords and 'guitar chords' from string.
 
@@ -704,6 +1399,7 @@ def strip_chords(abc):
     :returns: abc with chords stripped
     :rtype: str
 
+    .. seealso:: :func:`split_chords`
     """
     ret = []
     in_chord = False
@@ -721,6 +1417,98 @@ def strip_chords(abc):
     return ''.join(ret)
 
 
+def split_chords(abc):
+    """Strip chords from string, collecting them bar by bar
+
+    This strips chords like :func:`strip_chords`, and in the same pass
+    collects the chords of every bar. Bars are grouped into parts,
+    which end at repeat signs, double bar lines and thin-thick bar lines.
+
+    Guitar chords are returned as written, chords of notes with their
+    brackets, for example ``'[GBd]'``. Inline fields such as ``[K:G]`` are
+    not chords.
+
+    Example::
+
+        >>> stripped, parts = split_chords('|:"G" ab "D" cd|"G" B2:|"Em" e4|')
+        >>> stripped
+        '|: ab  cd| B2:| e4|'
+        >>> parts
+        [[['G', 'D'], ['G']], [['Em']]]
+
+    :param str abc: abc to filter
+    :returns: abc with chords stripped, and a list of parts, each a list of
+              bars, each a list of chords
+    :rtype: tuple
+
+    .. seealso:: :func:`strip_chords`, :attr:`Tune.chords`
+    .. versionadded:: 1.5.0
+    """
+    ret = []
+    parts = []
+    part = []
+    bar = []
+    content = False     # the current bar has music in it
+    barline = ''        # bar line characters seen so far
+    in_chord = False
+    opener = None
+    chord = []
+
+    for c in abc:
+        if c == '[' or (c == '"' and not in_chord):
+            in_chord = True
+            opener = c
+            chord = []
+        elif c == ']' or (c == '"' and in_chord):
+            if in_chord:
+                text = ''.join(chord)
+                if opener == '"':
+                    bar.append(text)
+                elif text and text[1:2] != ':':
+                    bar.append('[{}]'.format(text))
+            elif barline:
+                # The ] of |] ends up here, as strip_chords drops it.
+                barline += c
+            in_chord = False
+        elif in_chord:
+            chord.append(c)
+        else:
+            ret.append(c)
+            after_colon = len(ret) > 1 and ret[-2] == ':'
+            if c == '|' or (c == ':' and (barline or after_colon
+                                          or not content)):
+                if not barline:
+                    if after_colon:
+                        barline = ':'
+                    if content or bar:
+                        part.append(bar)
+                        bar = []
+                        content = False
+                barline += c
+                continue
+            if barline:
+                if _ends_part(barline, c) and part:
+                    parts.append(part)
+                    part = []
+                barline = ''
+            if not c.isspace():
+                content = True
+
+    if content or bar:
+        part.append(bar)
+    if part:
+        parts.append(part)
+    return ''.join(ret), parts
+
+
+def _ends_part(barline, next_char):
+    """Check if `barline` ends a part of the tune"""
+    if next_char.isdigit() and barline.startswith(':'):
+        # :|2, the second ending follows the first
+        return False
+    return ':' in barline or '||' in barline or barline.endswith(']')
+
+
 def strip_extra_chars(abc):
     """Strip misc extra chars
 
@@ -734,34 +1522,136 @@ def strip_extra_chars(abc):
     return abc
 
 
-def expand_abc(abc):
+#: Functions run, in order, by :func:`expand_abc`.
+EXPAND_STAGES = (
+    strip_chords, strip_octave, strip_accidentals, strip_triplets,
+    strip_gracenotes, strip_decorations, strip_slurs, expand_notes,
+    expand_parts, strip_whitespace, strip_bar_dividers, strip_extra_chars
+)
+
+
+def expand_abc(abc, max_length=None, max_repeats=None, max_steps=None,
+               truncate=False):
     """
     Create searchable abc string
 
     This runs all the stripping and expanding functions on the input string,
     and also makes it lowercase.
 
+    Malformed or hostile abc, such as many unbalanced repeat signs, can make
+    expansion slow and its result huge. The optional limits bound the work:
+    `max_length` the length of the expanded abc (checked as it grows,
+    before whitespace and bar lines are removed), `max_repeats` the number
+    of repeats expanded, and `max_steps` the number of characters processed
+    by all stages together. As unbalanced repeats can double the abc every
+    time, `max_repeats` is best combined with one of the others. Reaching a
+    limit raises :exc:`ExpansionError`, or with `truncate` stops expanding
+    and returns what was expanded so far, cut to `max_length`.
+
     :param str abc: string of abc to expand
+    :param int max_length: longest allowed result
+    :param int max_repeats: largest number of repeats to expand
+    :param int max_steps: largest amount of work
+    :param bool truncate: return a partial result instead of raising
     :returns: string of expanded abc
     :rtype: str
+    :raises ExpansionError: if a limit is reached and `truncate` is False
 
     .. seealso:: :func:`strip_octave`, :func:`strip_accidentals`,
                  :func:`strip_triplets`, :func:`strip_chords`
                  :func:`strip_ornaments`, :func:`expand_notes`,
                  :func:`expand_parts`, :func:`strip_whitespace`
                  :func:`strip_bar_dividers`, :func:`strip_extra_chars`,
-                 :func:`strip_slurs`
+                 :func:`strip_slurs`, :const:`EXPAND_STAGES`,
+                 :class:`sjkabc.profiling.Profiler`, :class:`ExpansionLimits`
+    .. versionchanged:: 1.5.0
+        Added the `max_length`, `max_repeats`, `max_steps` and `truncate`
+        parameters. Chords are stripped first, before octaves, accidentals
+        and triplets, so a ``(`` followed by a chord and a digit, as in
+        ``a("G"2b``, now starts a tuplet and the digit is dropped, where it
+        used to be a note length.
 
     """
-    for f in [strip_octave, strip_accidentals, strip_triplets,
-              strip_chords, strip_gracenotes, strip_decorations,
-              strip_slurs, expand_notes, expand_parts,
-              strip_whitespace, strip_bar_dividers, strip_extra_chars]:
-        abc = f(abc)
+    if max_length is not None or max_repeats is not None or \
+            max_steps is not None:
+        return _expand_limited(abc, max_length, max_repeats, max_steps,
+                               truncate)
+
+    return _expand(abc)
+
+
+def _expand(abc, chords=None):
+    """Run :const:`EXPAND_STAGES`
+
+    If `chords` is a list, chords are stripped with :func:`split_chords`
+    and the chords it finds are appended to it, so a tune's chords are
+    collected by the same pass that expands it.
+
+    """
+    profiler = active_profiler()
+    for f in EXPAND_STAGES:
+        if profiler is not None:
+            start = time.perf_counter()
+        if f is strip_chords and chords is not None:
+            out, parts = split_chords(abc)
+            chords.append(parts)
+        else:
+            out = f(abc)
+        if profiler is not None:
+            profiler.record('expand_abc.' + f.__name__,
+                            time.perf_counter() - start,
+                            bytes_in=len(abc), bytes_out=len(out))
+        abc = out
 
     return abc.lower()
 
 
+_DIGITS = str.maketrans('', '', '0123456789')
+
+
+def _expand_limited(abc, max_length, max_repeats, max_steps, truncate):
+    """Run :const:`EXPAND_STAGES` within limits, see :func:`expand_abc`"""
+    steps = 0
+    for i, f in enumerate(EXPAND_STAGES):
+        steps += len(abc)
+        if max_steps is not None and steps > max_steps:
+            if not truncate:
+                raise ExpansionError(
+                    'Expansion took more than {} steps'.format(max_steps))
+            rest = EXPAND_STAGES[i:]
+            break
+        try:
+            if f is expand_notes:
+                abc = f(abc, max_length)
+            elif f is expand_parts:
+                abc = f(abc, max_repeats, max_length,
+                        None if max_steps is None else max_steps - steps)
+            else:
+                abc = f(abc)
+        except ExpansionError as e:
+            if not truncate:
+                raise
+            abc = e.partial
+            rest = EXPAND_STAGES[i + 1:]
+            break
+    else:
+        rest = ()
+
+    # Finish the stripping stages, but don't expand any further. Note
+    # lengths, endings and repeat signs are still removed, as the skipped
+    # stages would have.
+    for f in rest:
+        if f is expand_notes:
+            abc = abc.translate(_DIGITS)
+        elif f is expand_parts:
+            abc = _clean_parts(abc).translate(_DIGITS)
+        else:
+            abc = f(abc)
+
+    abc = abc.lower()
+    return abc if max_length is None else abc[:max_length]
+
+
 def wrap_line(string, id, max_length=78, prefix='+'):
     """
     Wrap header line.
@@ -774,9 +1664,34 @@ def wrap_line(string, id, max_length=78, prefix='+'):
     :rtype: str
 
     .. seealso:: :func:`get_id_from_field`
+    """
+    # Lines that fit and contain nothing TextWrapper would rewrite are
+    # returned as is.
+    if (string and len(string) + 2 <= max_length
+            and not string[-1].isspace()
+            and not _WRAP_WHITESPACE.search(string)):
+        return f'{id}:{string}'
+
+    return '\n'.join(_get_wrapper(id, max_length, prefix).wrap(string))
+
+
+#: Whitespace that :class:`textwrap.TextWrapper` replaces with spaces.
+_WRAP_WHITESPACE = re.compile('[\t\n\x0b\x0c\r]')
+
+
+@functools.lru_cache(maxsize=None)
+def _get_wrapper(id, max_length, prefix):
+    """Get a shared :class:`textwrap.TextWrapper` for header lines
+
+    :param str id: character id of header line
+    :param int max_length: maximum line length
+    :param str prefix: Line prefix for wrapped lines (first line exempted)
+    :returns: wrapper for the given configuration
+    :rtype: :class:`textwrap.TextWrapper`
+
     """
     w = textwrap.TextWrapper()
     w.initial_indent = f'{id}:'
     w.subsequent_indent = f'{prefix}:'
     w.width = max_length
-    return '\n'.join(w.wrap(string))
+    return w
@@ -0,0 +1,287 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+sjkabc.sqlite
+
+This module provides export of parsed tunes to an SQLite database.
+
+The database has a normalised schema:
+
+* ``tunes`` holds the source file, X: number, body and expanded ABC of every
+  tune,
+* ``headers`` holds every header field value, one row each,
+* ``titles`` is an FTS5 full-text table of the titles,
+* ``melodies`` is an FTS5 table of the expanded ABC using the trigram
+  tokenizer, for substring search with ``MATCH`` or ``LIKE``.
+
+Rows are written with batched :meth:`sqlite3.Cursor.executemany` calls in
+large transactions, and the indexes are only created once the load is
+finished.
+
+:license: BSD, see LICENSE for more details.
+"""
+import sqlite3
+
+from sjkabc.sjkabc import HEADER_KEYS, find_abc_files, parse_file
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tunes (
+    id INTEGER PRIMARY KEY,
+    file TEXT,
+    x TEXT,
+    abc TEXT NOT NULL,
+    expanded TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS headers (
+    tune_id INTEGER NOT NULL REFERENCES tunes(id) ON DELETE CASCADE,
+    field TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    value TEXT NOT NULL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS titles USING fts5(title);
+CREATE VIRTUAL TABLE IF NOT EXISTS melodies
+    USING fts5(expanded, tokenize='trigram');
+"""
+
+INDEXES = (
+    # Not unique: tunebooks often reuse an X: number within one file.
+    'CREATE INDEX IF NOT EXISTS tunes_file_x ON tunes(file, x)',
+    'CREATE INDEX IF NOT EXISTS headers_tune ON headers(tune_id)',
+    'CREATE INDEX IF NOT EXISTS headers_field_value ON headers(field, value)',
+)
+
+#: Pragmas used while loading; durability is restored by
+#: :meth:`SQLiteExporter.finish`.
+LOAD_PRAGMAS = {
+    'journal_mode': 'MEMORY',
+    'synchronous': 'OFF',
+    'temp_store': 'MEMORY',
+    'cache_size': '-262144',
+}
+
+
+class SQLiteExporter:
+
+    """
+    Bulk exporter of tunes to SQLite.
+
+    Example::
+
+        >>> with SQLiteExporter('tunes.db') as db:
+        ...     for filename in filenames:
+        ...         db.write(parse_file(filename), file=filename)
+        >>> # Later, replace the tunes of a changed file:
+        >>> with SQLiteExporter('tunes.db') as db:
+        ...     db.upsert(parse_file('reels.abc'), file='reels.abc')
+
+    Leaving the `with` block commits and calls :meth:`finish`.
+
+    .. seealso:: :func:`export_dir`
+    .. versionadded:: 1.5.0
+    """
+
+    def __init__(self, database, batch_size=5000,
+                 transaction_size=200000):
+        """Initialise SQLiteExporter
+
+        :param database: file name, or an open :class:`sqlite3.Connection`
+        :param int batch_size: tunes per executemany() batch
+        :param int transaction_size: tunes per transaction
+
+        """
+        if isinstance(database, sqlite3.Connection):
+            self.connection = database
+            self._owns_connection = False
+        else:
+            self.connection = sqlite3.connect(database)
+            self._owns_connection = True
+        # Transactions are managed here, see write() and finish().
+        self._isolation_level = self.connection.isolation_level
+        self.connection.isolation_level = None
+
+        self.batch_size = batch_size
+        self.transaction_size = transaction_size
+        #: Number of tunes written.
+        self.count = 0
+
+        self._pragmas = {}
+        for name, value in LOAD_PRAGMAS.items():
+            self._pragmas[name] = self._pragma(name)
+            self._pragma(name, value)
+
+        self.connection.executescript(SCHEMA)
+        self._next_id = self.connection.execute(
+            'SELECT COALESCE(MAX(id), 0) + 1 FROM tunes').fetchone()[0]
+        self._in_transaction = 0
+        self._rows = ([], [], [], [])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self.finish()
+        else:
+            if self.connection.in_transaction:
+                self.connection.execute('ROLLBACK')
+            self._restore_pragmas()
+        if self._owns_connection:
+            self.connection.close()
+        else:
+            self.connection.isolation_level = self._isolation_level
+
+    def _pragma(self, name, value=None):
+        if value is None:
+            return self.connection.execute(
+                'PRAGMA {}'.format(name)).fetchone()[0]
+        self.connection.execute('PRAGMA {} = {}'.format(name, value))
+
+    def write(self, tunes, file=None):
+        """Insert tunes
+
+        :param tunes: iterable of :class:`~sjkabc.Tune` objects
+        :param str file: name of the file the tunes were parsed from
+        :returns: number of tunes written
+        :rtype: int
+
+        """
+        before = self.count
+        tune_rows, header_rows, title_rows, melody_rows = self._rows
+
+        for tune in tunes:
+            if not self.connection.in_transaction:
+                self.connection.execute('BEGIN')
+
+            tune_id = self._next_id
+            self._next_id += 1
+            expanded = tune.expanded_abc
+
+            tune_rows.append((tune_id, file,
+                              tune.index[0] if tune.index else None,
+                              '\n'.join(tune.abc), expanded))
+            for key, field in HEADER_KEYS.items():
+                for position, value in enumerate(getattr(tune, field)):
+                    header_rows.append((tune_id, key, position, value))
+            title_rows.append((tune_id, '\n'.join(tune.title)))
+            melody_rows.append((tune_id, expanded))
+
+            self.count += 1
+            self._in_transaction += 1
+            if len(tune_rows) >= self.batch_size:
+                self._flush()
+            if self._in_transaction >= self.transaction_size:
+                self._commit()
+
+        return self.count - before
+
+    def upsert(self, tunes, file=None):
+        """Insert tunes, replacing tunes with the same file and X: number
+
+        Every tune of the file with the X: number of one of `tunes` is
+        replaced, so tunebooks reusing X: numbers are upserted as a whole.
+
+        :param tunes: iterable of :class:`~sjkabc.Tune` objects
+        :param str file: name of the file the tunes were parsed from
+        :returns: number of tunes written
+        :rtype: int
+
+        """
+        tunes = list(tunes)
+        self._flush()
+        if not self.connection.in_transaction:
+            self.connection.execute('BEGIN')
+        self._delete([(file, tune.index[0] if tune.index else None)
+                      for tune in tunes])
+        return self.write(tunes, file)
+
+    def delete_file(self, file):
+        """Delete every tune of `file`
+
+        :param str file: name of the file the tunes were parsed from
+
+        """
+        self._flush()
+        if not self.connection.in_transaction:
+            self.connection.execute('BEGIN')
+        ids = [(row[0],) for row in self.connection.execute(
+            'SELECT id FROM tunes WHERE file IS ?', (file,))]
+        self._delete_ids(ids)
+
+    def _delete(self, keys):
+        ids = []
+        for file, x in keys:
+            ids.extend((row[0],) for row in self.connection.execute(
+                'SELECT id FROM tunes WHERE file IS ? AND x IS ?', (file, x)))
+        self._delete_ids(ids)
+
+    def _delete_ids(self, ids):
+        c = self.connection
+        c.executemany('DELETE FROM headers WHERE tune_id = ?', ids)
+        c.executemany('DELETE FROM titles WHERE rowid = ?', ids)
+        c.executemany('DELETE FROM melodies WHERE rowid = ?', ids)
+        c.executemany('DELETE FROM tunes WHERE id = ?', ids)
+
+    def _flush(self):
+        """Write buffered rows"""
+        tune_rows, header_rows, title_rows, melody_rows = self._rows
+        if not tune_rows:
+            return
+        c = self.connection
+        c.executemany('INSERT INTO tunes VALUES (?, ?, ?, ?, ?)', tune_rows)
+        c.executemany('INSERT INTO headers VALUES (?, ?, ?, ?)', header_rows)
+        c.executemany('INSERT INTO titles(rowid, title) VALUES (?, ?)',
+                      title_rows)
+        c.executemany('INSERT INTO melodies(rowid, expanded) VALUES (?, ?)',
+                      melody_rows)
+        for rows in self._rows:
+            rows.clear()
+
+    def _commit(self):
+        self._flush()
+        if self.connection.in_transaction:
+            self.connection.execute('COMMIT')
+        self._in_transaction = 0
+
+    def finish(self):
+        """Commit, create indexes and restore the pragmas
+
+        The pragmas are restored even if creating the indexes fails.
+
+        """
+        c = self.connection
+        try:
+            self._commit()
+            c.execute('BEGIN')
+            for statement in INDEXES:
+                c.execute(statement)
+            c.execute("INSERT INTO titles(titles) VALUES ('optimize')")
+            c.execute("INSERT INTO melodies(melodies) VALUES ('optimize')")
+            c.execute('COMMIT')
+            c.execute('ANALYZE')
+        finally:
+            if c.in_transaction:
+                c.execute('ROLLBACK')
+            self._restore_pragmas()
+
+    def _restore_pragmas(self):
+        for name, value in self._pragmas.items():
+            self._pragma(name, value)
+
+
+def export_dir(dir, database, **kwargs):
+    """Export every ABC file in `dir` to an SQLite database
+
+    :param str dir: directory of abc files
+    :param database: file name, or an open :class:`sqlite3.Connection`
+    :param kwargs: passed on to :class:`SQLiteExporter`
+    :returns: number of tunes exported
+    :rtype: int
+
+    .. seealso:: :func:`~sjkabc.parse_dir`
+    .. versionadded:: 1.5.0
+    """
+    with SQLiteExporter(database, **kwargs) as db:
+        for filename in find_abc_files(dir):
+            db.write(parse_file(filename), file=filename)
+        return db.count
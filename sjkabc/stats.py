@@ -0,0 +1,309 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+sjkabc.stats
+
+This module provides corpus statistics computed in a single pass.
+
+Statistics are made of aggregates: objects that look at one tune at a time
+with ``add(tune)`` and can be combined with ``merge(other)``. Every file of
+a corpus is summarised by a fresh copy of the aggregates on a process pool,
+and the partial results are merged as they come in, so any set of
+aggregates is computed in one parallel scan.
+
+Example::
+
+    >>> stats = corpus_statistics('/data/music/abc/', workers=8)
+    >>> stats['key'].most_common(3)
+    [('G', 4120), ('D', 3982), ('Ador', 1107)]
+    >>> stats['length'].quantile(0.5)
+    143.2
+
+:license: BSD, see LICENSE for more details.
+"""
+import collections
+import copy
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from sjkabc.sjkabc import find_abc_files, parse_file
+
+
+class FieldCounter:
+
+    """
+    Histogram of the values of a header field.
+
+    Every value of the field is counted, so a tune with two C: lines counts
+    towards both composers.
+
+    .. versionadded:: 1.5.0
+    """
+
+    def __init__(self, field):
+        """Initialise FieldCounter
+
+        :param str field: :class:`~sjkabc.Tune` attribute, for example 'key'
+
+        """
+        self.field = field
+        #: :class:`collections.Counter` of field values.
+        self.counts = collections.Counter()
+
+    def add(self, tune):
+        self.counts.update(getattr(tune, self.field))
+
+    def merge(self, other):
+        self.counts.update(other.counts)
+
+    def most_common(self, n=None):
+        """Get the `n` most common values and their counts
+
+        :param int n: number of values, or None for all of them
+        :rtype: list
+
+        """
+        return self.counts.most_common(n)
+
+
+class NoteCounter:
+
+    """
+    Histogram of the notes of the expanded ABC of the tunes.
+
+    .. versionadded:: 1.5.0
+    """
+
+    def __init__(self):
+        """Initialise NoteCounter"""
+        #: :class:`collections.Counter` of note letters.
+        self.counts = collections.Counter()
+
+    def add(self, tune):
+        self.counts.update(tune.expanded_abc)
+
+    def merge(self, other):
+        self.counts.update(other.counts)
+
+    def most_common(self, n=None):
+        """Get the `n` most common notes and their counts
+
+        :param int n: number of notes, or None for all of them
+        :rtype: list
+
+        """
+        return self.counts.most_common(n)
+
+
+class QuantileSketch:
+
+    """
+    Mergeable sketch of the distribution of non-negative numbers.
+
+    Values are counted in buckets whose bounds grow geometrically, so any
+    quantile is estimated within `relative_accuracy` of the true value
+    while the sketch stays a few hundred buckets in size. Sketches with the
+    same accuracy merge by adding up their buckets.
+
+    Example::
+
+        >>> sketch = QuantileSketch()
+        >>> for x in range(1, 1001):
+        ...     sketch.add_value(x)
+        >>> round(sketch.quantile(0.9))  # within 1% of 900
+        907
+
+    .. versionadded:: 1.5.0
+    """
+
+    def __init__(self, relative_accuracy=0.01):
+        """Initialise QuantileSketch
+
+        :param float relative_accuracy: largest relative error of quantiles
+
+        """
+        if not 0 < relative_accuracy < 1:
+            raise ValueError('relative_accuracy must be between 0 and 1')
+        self.relative_accuracy = relative_accuracy
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self._gamma)
+        #: Mapping of bucket index to number of values.
+        self.buckets = collections.Counter()
+        #: Number of values that were zero.
+        self.zeros = 0
+        #: Number of values.
+        self.count = 0
+        #: Sum of the values.
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def add_value(self, value):
+        """Add a number to the sketch
+
+        :param value: non-negative number
+
+        """
+        if value < 0:
+            raise ValueError('QuantileSketch only holds non-negative values')
+        if value == 0:
+            self.zeros += 1
+        else:
+            self.buckets[math.ceil(math.log(value) / self._log_gamma)] += 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError('Cannot merge sketches of different accuracy')
+        self.buckets.update(other.buckets)
+        self.zeros += other.zeros
+        self.count += other.count
+        self.total += other.total
+        for value in (other.min, other.max):
+            if value is not None:
+                self.min = value if self.min is None else min(self.min, value)
+                self.max = value if self.max is None else max(self.max, value)
+
+    @property
+    def mean(self):
+        """Mean of the values, or None if the sketch is empty"""
+        return self.total / self.count if self.count else None
+
+    def quantile(self, q):
+        """Estimate a quantile
+
+        :param float q: quantile from 0.0 to 1.0, 0.5 being the median
+        :returns: estimated value, or None if the sketch is empty
+        :rtype: float
+
+        """
+        if not 0 <= q <= 1:
+            raise ValueError('Quantile must be between 0 and 1')
+        if not self.count:
+            return None
+
+        rank = q * (self.count - 1)
+        seen = self.zeros
+        if rank < seen:
+            return 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if rank < seen:
+                value = 2 * self._gamma ** index / (self._gamma + 1)
+                return min(self.max, max(self.min, value))
+        return self.max
+
+
+class BodyLength(QuantileSketch):
+
+    """
+    Distribution of the number of notes of the tunes.
+
+    The length of the :attr:`~sjkabc.Tune.expanded_abc` is counted, so
+    repeats are included.
+
+    .. versionadded:: 1.5.0
+    """
+
+    def add(self, tune):
+        self.add_value(len(tune.expanded_abc))
+
+
+def default_aggregates():
+    """Get the aggregates computed by default
+
+    :returns: key, metre, rhythm and composer histograms, the body length
+              distribution and note frequencies
+    :rtype: dict
+
+    .. versionadded:: 1.5.0
+    """
+    return {
+        'key': FieldCounter('key'),
+        'metre': FieldCounter('metre'),
+        'rhythm': FieldCounter('rhythm'),
+        'composer': FieldCounter('composer'),
+        'length': BodyLength(),
+        'notes': NoteCounter(),
+    }
+
+
+def collect(tunes, aggregates=None):
+    """Compute statistics of `tunes` in one pass
+
+    :param tunes: iterable of :class:`~sjkabc.Tune` objects
+    :param dict aggregates: mapping of name to empty aggregate, see
+                            :func:`default_aggregates`
+    :returns: mapping of name to filled-in aggregate
+    :rtype: dict
+
+    .. versionadded:: 1.5.0
+    """
+    partial = copy.deepcopy(aggregates or default_aggregates())
+    adders = [a.add for a in partial.values()]
+    for tune in tunes:
+        for add in adders:
+            add(tune)
+    return partial
+
+
+def merge(partials):
+    """Merge partial statistics
+
+    :param partials: iterable of mappings as returned by :func:`collect`
+    :returns: mapping of name to merged aggregate, or None if `partials` is
+              empty
+    :rtype: dict
+
+    .. versionadded:: 1.5.0
+    """
+    result = None
+    for partial in partials:
+        if result is None:
+            result = partial
+        else:
+            for name, aggregate in result.items():
+                aggregate.merge(partial[name])
+    return result
+
+
+def _file_statistics(filename, aggregates):
+    return collect(parse_file(filename), aggregates)
+
+
+def corpus_statistics(dir, aggregates=None, workers=None):
+    """Compute statistics of every ABC file in `dir` in one pass
+
+    Each file is parsed and summarised on a pool of processes, and only the
+    partial results are sent back, so aggregates must be picklable.
+
+    :param str dir: directory of abc files
+    :param dict aggregates: mapping of name to empty aggregate, see
+                            :func:`default_aggregates`
+    :param int workers: number of processes, defaults to the number of
+                        CPUs; 1 computes everything in this process
+    :returns: mapping of name to aggregate
+    :rtype: dict
+
+    .. seealso:: :func:`~sjkabc.parse_dir`
+    .. versionadded:: 1.5.0
+    """
+    aggregates = aggregates or default_aggregates()
+    workers = workers or os.cpu_count() or 1
+    filenames = list(find_abc_files(dir))
+
+    if workers < 2 or len(filenames) < 2:
+        partials = (_file_statistics(f, aggregates) for f in filenames)
+        return merge(partials) or collect((), aggregates)
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        partials = pool.map(_file_statistics, filenames,
+                            [aggregates] * len(filenames),
+                            chunksize=max(1, len(filenames) // (workers * 4)))
+        return merge(partials)
@@ -0,0 +1,206 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+sjkabc.wire
+
+This module provides a compact binary serialisation of :class:`~sjkabc.Tune`
+objects, suitable for shipping tunes between processes.
+
+Every distinct string is stored once in a string table, which makes header
+values such as ``4/4`` or ``reel`` almost free. The tunes themselves are
+stored as an array of string table indices, using the smallest integer type
+that fits. The expanded ABC is omitted by default since it can be recomputed
+from the body. Fields holding a single string instead of a list, as in
+``tune.title = 'Example tune'``, are stored as a list of that string.
+
+Pickled :class:`~sjkabc.Tune` objects and :class:`TuneBatch` lists use this
+format.
+
+:license: BSD, see LICENSE for more details.
+"""
+import struct
+import sys
+from array import array
+
+from sjkabc.sjkabc import HEADER_KEYS, Tune
+
+
+#: Tune attributes in the order they are serialised.
+FIELDS = tuple(sorted(HEADER_KEYS.values())) + ('abc',)
+
+MAGIC = b'SJKW'
+VERSION = 1
+
+_HEADER = struct.Struct('<4sBBIIc')
+_FLAG_EXPANDED = 1
+_FLAG_BIG_ENDIAN = 2
+
+
+class WireError(ValueError):
+
+    """Raised when data is not in the wire format."""
+
+
+def dumps(tunes, include_expanded=False):
+    """Serialise tunes
+
+    Example::
+
+        >>> data = dumps(parse_file('test.abc'))
+        >>> [t.title[0] for t in loads(data)]
+        ['Apples In Winter', 'In Memory Of Coleman']
+
+    :param tunes: iterable of :class:`~sjkabc.Tune` objects
+    :param bool include_expanded: also store already computed expanded ABC
+    :returns: serialised tunes
+    :rtype: bytes
+
+    .. seealso:: :func:`loads`, :class:`TuneBatch`
+    """
+    strings = {}
+    ints = []
+    count = 0
+
+    for tune in tunes:
+        count += 1
+        for field in FIELDS:
+            values = getattr(tune, field)
+            if isinstance(values, str):
+                values = [values]
+            ints.append(len(values))
+            for value in values:
+                ints.append(strings.setdefault(value, len(strings)))
+        if include_expanded:
+            # Store index + 1, with 0 meaning not expanded.
+            expanded = tune._expanded_abc
+            if expanded:
+                ints.append(strings.setdefault(expanded, len(strings)) + 1)
+            else:
+                ints.append(0)
+
+    typecode = _typecode(max(ints, default=0))
+    ints = array(typecode, ints)
+    lengths = array('I', [len(s) for s in strings])
+    blob = ''.join(strings).encode('utf-8')
+
+    flags = _FLAG_EXPANDED if include_expanded else 0
+    if sys.byteorder == 'big':
+        flags |= _FLAG_BIG_ENDIAN
+
+    return b''.join([
+        _HEADER.pack(MAGIC, VERSION, flags, len(strings), count,
+                     typecode.encode('ascii')),
+        struct.pack('<I', len(blob)),
+        lengths.tobytes(),
+        blob,
+        ints.tobytes(),
+    ])
+
+
+def loads(data):
+    """Deserialise tunes
+
+    :param bytes data: data created by :func:`dumps`
+    :returns: list of :class:`~sjkabc.Tune` objects
+    :rtype: list
+    :raises WireError: if `data` is not in the wire format
+
+    .. seealso:: :func:`dumps`
+    """
+    data = memoryview(data)
+    try:
+        (magic, version, flags, num_strings, count,
+         typecode) = _HEADER.unpack_from(data)
+        blob_size, = struct.unpack_from('<I', data, _HEADER.size)
+    except struct.error:
+        raise WireError('Truncated wire data')
+    if magic != MAGIC or version != VERSION:
+        raise WireError('Not sjkabc wire data')
+
+    swap = bool(flags & _FLAG_BIG_ENDIAN) != (sys.byteorder == 'big')
+    offset = _HEADER.size + 4
+
+    lengths = array('I')
+    lengths.frombytes(data[offset:offset + num_strings * lengths.itemsize])
+    offset += num_strings * lengths.itemsize
+    blob = str(data[offset:offset + blob_size], 'utf-8')
+    offset += blob_size
+    ints = array(typecode.decode('ascii'))
+    ints.frombytes(data[offset:])
+    if swap:
+        lengths.byteswap()
+        ints.byteswap()
+
+    strings = []
+    pos = 0
+    for length in lengths:
+        strings.append(blob[pos:pos + length])
+        pos += length
+
+    tunes = []
+    it = iter(ints)
+    include_expanded = flags & _FLAG_EXPANDED
+    for _ in range(count):
+        tune = Tune()
+        attrs = tune.__dict__
+        for field in FIELDS:
+            attrs[field] = [strings[next(it)] for _ in range(next(it))]
+        if include_expanded:
+            i = next(it)
+            if i:
+                attrs['_expanded_abc'] = strings[i - 1]
+        tunes.append(tune)
+
+    return tunes
+
+
+def _typecode(largest):
+    """Get the smallest unsigned array typecode that can hold `largest`"""
+    for typecode in 'BHI':
+        if largest < 1 << (8 * array(typecode).itemsize):
+            return typecode
+    return 'Q'
+
+
+def _load_tune(data, source=None):
+    tune, = loads(data)
+    if source is not None:
+        tune._set_source(source, 0, len(source))
+    return tune
+
+
+def _load_batch(data):
+    return TuneBatch(loads(data))
+
+
+class TuneBatch(list):
+
+    """
+    List of tunes that pickles itself using the wire format.
+
+    Return a `TuneBatch` from :mod:`multiprocessing` workers instead of a
+    plain list to ship the tunes in the compact format.
+
+    Example::
+
+        >>> def work(filename):
+        ...     return TuneBatch(parse_file(filename))
+        >>> with multiprocessing.Pool() as pool:
+        ...     batches = pool.map(work, filenames)
+
+    .. versionadded:: 1.5.0
+    """
+
+    def __init__(self, tunes=(), include_expanded=False):
+        """Initialise TuneBatch
+
+        :param tunes: iterable of :class:`~sjkabc.Tune` objects
+        :param bool include_expanded: include computed expanded ABC when
+            pickling
+
+        """
+        super().__init__(tunes)
+        self.include_expanded = include_expanded
+
+    def __reduce__(self):
+        return (_load_batch, (dumps(self, self.include_expanded),))
@@ -0,0 +1,168 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+sjkabc.writer
+
+This module provides functionality for writing tunebooks.
+
+:license: BSD, see LICENSE for more details.
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+
+#: Default number of characters buffered before writing to the output.
+DEFAULT_BUFFER_SIZE = 1 << 20
+
+
+class TunebookWriter:
+
+    """
+    Buffered writer of :class:`~sjkabc.Tune` objects.
+
+    Tunes that were parsed with `keep_source` and haven't been modified
+    since are copied as they were read, see :attr:`~sjkabc.Tune.source_abc`,
+    including comments and formatting. Other tunes are formatted with
+    :meth:`~sjkabc.Tune.format_abc`. The text is collected in a buffer
+    which is written out whenever it grows beyond `buffer_size` characters.
+
+    `TunebookWriter` accepts either a filename or a file-like object. Files
+    opened by the writer are closed by :meth:`close`; file-like objects are
+    flushed but left open.
+
+    Example::
+
+        >>> with TunebookWriter('export.abc') as writer:
+        ...     writer.write_all(parse_dir('/data/music/abc/'))
+
+    .. seealso:: :func:`write_tunebooks`
+    .. versionadded:: 1.5.0
+    """
+
+    def __init__(self, file, buffer_size=DEFAULT_BUFFER_SIZE,
+                 encoding='utf-8', reformat=False):
+        """Initialise TunebookWriter
+
+        :param file: filename or file-like object to write to
+        :param int buffer_size: number of characters to buffer
+        :param str encoding: encoding used when `file` is a filename
+        :param bool reformat: format every tune with
+                              :meth:`~sjkabc.Tune.format_abc`, even
+                              unmodified ones
+
+        .. versionchanged:: 1.5.0
+            Unmodified tunes are copied from their source.
+
+        """
+        if hasattr(file, 'write'):
+            self.file = file
+            self._owns_file = False
+        else:
+            self.file = open(file, 'w', encoding=encoding,
+                             buffering=buffer_size)
+            self._owns_file = True
+
+        self.buffer_size = buffer_size
+        self.reformat = reformat
+        #: Number of tunes written so far.
+        self.count = 0
+        self._buffer = []
+        self._buffered = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def write(self, tune):
+        """Write a single tune
+
+        :param tune: tune to write
+        :type tune: :class:`~sjkabc.Tune`
+
+        """
+        abc = None if self.reformat else tune.source_abc
+        if abc is None:
+            abc = tune.format_abc()
+        elif not abc.endswith(('\n', '\r')):
+            # The last tune of a file may lack a final line break.
+            abc += '\n'
+        self._buffer.append(abc)
+        self._buffered += len(abc)
+        self.count += 1
+
+        if self._buffered >= self.buffer_size:
+            self.flush()
+
+    def write_all(self, tunes):
+        """Write every tune in `tunes`
+
+        :param tunes: iterable of :class:`~sjkabc.Tune` objects
+        :returns: number of tunes written
+        :rtype: int
+
+        """
+        before = self.count
+        for tune in tunes:
+            self.write(tune)
+        return self.count - before
+
+    def flush(self):
+        """Write buffered tunes to the output"""
+        if self._buffer:
+            self.file.write(''.join(self._buffer))
+            self._buffer = []
+            self._buffered = 0
+        self.file.flush()
+
+    def close(self):
+        """Flush the buffer, and close the output if it was opened here"""
+        self.flush()
+        if self._owns_file:
+            self.file.close()
+
+
+def write_tunebook(file, tunes, **kwargs):
+    """Write `tunes` to `file`
+
+    :param file: filename or file-like object to write to
+    :param tunes: iterable of :class:`~sjkabc.Tune` objects
+    :param kwargs: passed on to :class:`TunebookWriter`
+    :returns: number of tunes written
+    :rtype: int
+
+    .. versionadded:: 1.5.0
+    """
+    with TunebookWriter(file, **kwargs) as writer:
+        return writer.write_all(tunes)
+
+
+def write_tunebooks(shards, workers=None, **kwargs):
+    """Write several tunebooks in parallel
+
+    Each shard is written by its own :class:`TunebookWriter` on a thread
+    pool. File output releases the GIL, so shards overlap their I/O.
+
+    Example::
+
+        >>> write_tunebooks({'reels.abc': reels, 'jigs.abc': jigs})
+        {'reels.abc': 412, 'jigs.abc': 288}
+
+    :param dict shards: mapping of filename to iterable of tunes
+    :param int workers: number of threads, defaults to one per shard
+    :param kwargs: passed on to :class:`TunebookWriter`
+    :returns: mapping of filename to number of tunes written
+    :rtype: dict
+
+    .. seealso:: :func:`write_tunebook`
+    .. versionadded:: 1.5.0
+    """
+    if not shards:
+        return {}
+
+    with ThreadPoolExecutor(max_workers=workers or len(shards)) as pool:
+        futures = {
+            filename: pool.submit(write_tunebook, filename, tunes, **kwargs)
+            for filename, tunes in shards.items()
+        }
+        return {filename: f.result() for filename, f in futures.items()}
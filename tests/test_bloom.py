@@ -0,0 +1,176 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+    test_bloom
+    ~~~~~~~~~~
+
+    Tests for Bloom filters of ABC files.
+
+    :license: BSD, see LICENSE for more details.
+"""
+
+
+import os
+import random
+
+import pytest
+from pytest import fixture
+
+from sjkabc.bloom import (_HEADER, BloomFilter, load_filter, may_contain,
+                          search_dir, search_files, sidecar_name,
+                          write_filter)
+from sjkabc.search import MelodyPattern
+
+
+TUNE = """X:{}
+T:{}
+K:D
+{}
+"""
+
+FILES = {
+    'reels.abc': [('Drowsy Maggie', '|:E2BE dEBE|E2BE AFDF:|'),
+                  ('Silver Spear', '|:FA (3AAA BAFA|dBAF ABde:|')],
+    'jigs.abc': [('Kesh', '|:GAG GAB|ABA ABd:|'),
+                 ('Out On The Ocean', '|:GE D2 B,D|GE D2 DE:|')],
+    'polkas.abc': [('Britches Full Of Stitches', '|:AF AF|AB/c/ dB:|')],
+}
+
+
+@fixture
+def archive(tmpdir):
+    for name, tunes in FILES.items():
+        tmpdir.join(name).write(''.join(
+            TUNE.format(x, title, body)
+            for x, (title, body) in enumerate(tunes, 1)))
+    return str(tmpdir)
+
+
+def test_filter_has_no_false_negatives():
+    items = ['{:06d}'.format(i) for i in range(2000)]
+    bloom = BloomFilter(len(items), error_rate=0.01)
+    bloom.update(items)
+    assert all(item in bloom for item in items)
+
+
+def test_filter_false_positive_rate():
+    rng = random.Random(4)
+    bloom = BloomFilter(5000, error_rate=0.01)
+    bloom.update(str(rng.random()) for _ in range(5000))
+    false = sum(str(rng.random()) + 'x' in bloom for _ in range(20000))
+    assert false / 20000 < 0.02
+
+
+def test_filter_size():
+    small = BloomFilter(1000, error_rate=0.1)
+    large = BloomFilter(1000, error_rate=0.001)
+    assert len(large) > len(small)
+    assert large.hashes > small.hashes
+    with pytest.raises(ValueError):
+        BloomFilter(10, error_rate=1)
+    with pytest.raises(ValueError):
+        BloomFilter(10, bits=b'')
+
+
+def test_write_and_load_filter(archive):
+    filename = os.path.join(archive, 'reels.abc')
+    assert load_filter(filename) is None
+
+    tunes = write_filter(filename, n=3, error_rate=0.001)
+    assert sorted(t.title[0] for t in tunes) == \
+        ['Drowsy Maggie', 'Silver Spear']
+    assert os.path.exists(sidecar_name(filename))
+
+    bloom, n = load_filter(filename)
+    assert n == 3
+    for tune in tunes:
+        assert may_contain(bloom, n, tune.expanded_abc)
+    assert not may_contain(bloom, n, 'gggggg')
+
+
+def test_stale_filter_is_ignored(archive):
+    filename = os.path.join(archive, 'reels.abc')
+    write_filter(filename)
+    with open(filename, 'a') as f:
+        f.write(TUNE.format(3, 'Added', 'gggg|'))
+    assert load_filter(filename) is None
+
+
+def test_corrupt_filter_is_ignored(archive):
+    filename = os.path.join(archive, 'reels.abc')
+    with open(sidecar_name(filename), 'wb') as f:
+        f.write(b'nonsense')
+    assert load_filter(filename) is None
+
+
+@pytest.mark.parametrize('hashes,size', [(0, None), (None, 0)])
+def test_empty_filter_is_ignored(archive, hashes, size):
+    filename = os.path.join(archive, 'reels.abc')
+    write_filter(filename)
+    with open(sidecar_name(filename), 'rb') as f:
+        header = list(_HEADER.unpack(f.read(_HEADER.size)))
+        bits = f.read()
+    if hashes is not None:
+        header[3] = hashes
+    if size is not None:
+        header[4], bits = size, b''
+    with open(sidecar_name(filename), 'wb') as f:
+        f.write(_HEADER.pack(*header) + bits)
+    assert load_filter(filename) is None
+
+
+def test_search_dir(archive):
+    stats = {}
+    found = list(search_dir(archive, 'dBAF ABde', stats=stats))
+    assert [t.title[0] for t in found] == ['Silver Spear']
+    assert stats == {'skipped': 0, 'parsed': 3, 'unwritable': 0}
+
+    stats = {}
+    found = list(search_dir(archive, 'dBAF ABde', stats=stats))
+    assert [t.title[0] for t in found] == ['Silver Spear']
+    assert stats == {'skipped': 2, 'parsed': 1, 'unwritable': 0}
+
+
+def test_search_without_build(archive):
+    stats = {}
+    found = list(search_dir(archive, 'GAG GAB', build=False, stats=stats))
+    assert [t.title[0] for t in found] == ['Kesh']
+    assert stats['parsed'] == 3
+    assert not any(f.endswith('.bloom') for f in os.listdir(archive))
+
+
+def test_search_pattern(archive):
+    files = [os.path.join(archive, f) for f in sorted(FILES)]
+    list(search_files(files, 'a'))
+
+    stats = {}
+    found = search_files(files, MelodyPattern('gagga?'), stats=stats)
+    assert [t.title[0] for t in found] == ['Kesh']
+    assert stats == {'skipped': 2, 'parsed': 1, 'unwritable': 0}
+
+
+def test_short_query_is_not_filtered(archive):
+    list(search_dir(archive, 'a'))
+    stats = {}
+    assert len(list(search_dir(archive, 'ge', stats=stats))) == 1
+    assert stats['parsed'] == 3
+
+
+def test_search_read_only_archive(archive, monkeypatch):
+    real_open = open
+
+    def read_only(path, mode='r', *args, **kwargs):
+        if path.endswith('.bloom') and 'w' in mode:
+            raise PermissionError(13, 'Permission denied', path)
+        return real_open(path, mode, *args, **kwargs)
+    monkeypatch.setattr('builtins.open', read_only)
+
+    stats = {}
+    found = list(search_dir(archive, 'dBAF ABde', stats=stats))
+    assert [t.title[0] for t in found] == ['Silver Spear']
+    assert stats == {'skipped': 0, 'parsed': 3, 'unwritable': 3}
+    assert not any(f.endswith('.bloom') for f in os.listdir(archive))
+
+
+if __name__ == "__main__":
+    pytest.main()
@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+    test_cache
+    ~~~~~~~~~~
+
+    Tests for cached search results.
+
+    :license: BSD, see LICENSE for more details.
+"""
+
+
+import pytest
+from pytest import fixture
+
+from sjkabc.cache import CachedSearch, QueryCache, normalise_query
+
+from factories import TuneFactory
+
+
+class Clock:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeCorpus(list):
+
+    version = 1
+
+
+@fixture
+def corpus():
+    return FakeCorpus(TuneFactory.build(abc=[body])
+                      for body in ('D2FA dfaf|', 'gfed cBAG|', 'dfa|'))
+
+
+def test_normalise_query():
+    assert normalise_query('|: D2 FA :|') == 'ddfaddfa'
+    assert normalise_query("D,2F'A") == normalise_query('ddfa')
+
+
+def test_lookup_computes_once():
+    cache = QueryCache()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return 'result'
+
+    assert cache.lookup('q', 1, compute) == 'result'
+    assert cache.lookup('q', 1, compute) == 'result'
+    assert len(calls) == 1
+    assert (cache.hits, cache.misses, cache.hit_rate) == (1, 1, 0.5)
+
+
+def test_lru_eviction():
+    cache = QueryCache(maxsize=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    cache.get('a')
+    cache.put('c', 3)
+    assert 'a' in cache and 'c' in cache and 'b' not in cache
+    assert cache.evictions == 1
+
+
+def test_ttl():
+    clock = Clock()
+    cache = QueryCache(ttl=10, clock=clock)
+    cache.put('a', 1)
+    clock.now = 10
+    assert cache.get('a') == 1
+    clock.now = 10.5
+    with pytest.raises(KeyError):
+        cache.get('a')
+    assert cache.expirations == 1
+
+
+def test_new_version_drops_old_entries():
+    cache = QueryCache()
+    cache.put('a', 1, version=1)
+    cache.put('b', 2, version=1)
+    with pytest.raises(KeyError):
+        cache.get('a', version=2)
+    assert len(cache) == 0
+    assert cache.expirations == 2
+
+
+def test_results_of_old_versions_are_not_stored():
+    cache = QueryCache()
+    cache.put('a', 1, version=2)
+    cache.put('b', 2, version=1)
+    assert 'b' not in cache
+    assert cache.get('a', version=2) == 1
+
+
+def test_old_versions_miss():
+    cache = QueryCache()
+    cache.put('q', 'v2', version=2)
+    with pytest.raises(KeyError):
+        cache.get('q', version=1)
+    assert cache.misses == 1
+    assert cache.lookup('q', 1, lambda: 'v1') == 'v1'
+    assert cache.get('q', version=2) == 'v2'
+
+
+def test_stats():
+    cache = QueryCache()
+    cache.lookup('a', None, lambda: 1)
+    assert cache.stats() == {'size': 1, 'hits': 0, 'misses': 1,
+                             'evictions': 0, 'expirations': 0,
+                             'hit_rate': 0.0}
+
+
+def test_cached_search(corpus):
+    search = CachedSearch(corpus)
+    assert search.search('D2 FA') == [corpus[0]]
+    assert search.search('ddfa') == [corpus[0]]
+    assert search.cache.hits == 1
+    assert search.search('dfa') == [corpus[0], corpus[2]]
+
+
+def test_cached_search_follows_corpus_version(corpus):
+    search = CachedSearch(corpus)
+    haystack = search.haystack()
+    assert search.search('dfa') == [corpus[0], corpus[2]]
+
+    corpus.append(TuneFactory.build(abc=['adfa|']))
+    corpus.version += 1
+    assert search.search('dfa') == [corpus[0], corpus[2], corpus[3]]
+    assert search.haystack() is not haystack
+    assert search.cache.hits == 0
+
+
+class SnapshotCorpus(FakeCorpus):
+
+    def __iter__(self):
+        raise AssertionError('iterated without a snapshot')
+
+    def snapshot(self):
+        return self.version, list(self[:])
+
+
+def test_cached_search_uses_corpus_snapshot(corpus):
+    corpus = SnapshotCorpus(corpus)
+    search = CachedSearch(corpus)
+    assert search.search('dfa') == [corpus[0], corpus[2]]
+
+
+def test_returned_list_is_a_copy(corpus):
+    search = CachedSearch(corpus)
+    search.search('dfa').clear()
+    assert len(search.search('dfa')) == 2
+
+
+if __name__ == "__main__":
+    pytest.main()
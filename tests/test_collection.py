@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+    test_collection
+    ~~~~~~~~~~~~~~~
+
+    Tests for the TuneCollection class.
+
+    :license: BSD, see LICENSE for more details.
+"""
+
+
+import gzip
+import os
+
+import pytest
+from pytest import fixture, raises
+
+from sjkabc import Parser, TuneCollection
+
+
+@fixture
+def abc():
+    path = os.path.join(os.path.dirname(__file__), '..', 'test.abc')
+    with open(path) as f:
+        return '% leading comment\n\n' + f.read()
+
+
+@fixture
+def collection(abc):
+    return TuneCollection(abc)
+
+
+def test_len(collection):
+    assert len(collection) == 2
+
+
+def test_iterates_in_file_order(collection):
+    assert [t.index for t in collection] == [['77'], ['37']]
+
+
+def test_can_iterate_twice(collection):
+    assert len(list(collection)) == len(list(collection)) == 2
+
+
+def test_negative_index(collection):
+    assert collection[-1].index == ['37']
+
+
+def test_index_out_of_range(collection):
+    with raises(IndexError):
+        collection[2]
+
+
+def test_slice(collection):
+    assert [t.index for t in collection[1:]] == [['37']]
+    assert collection[5:10] == []
+
+
+def test_tune_identity_is_kept_while_referenced(collection):
+    tune = collection[0]
+    assert collection[0] is tune
+
+
+def test_tunes_match_parser(abc, collection):
+    parsed = Parser(abc, keep_source=True).tunes
+    for a, b in zip(parsed, collection):
+        assert a.source_abc == b.source_abc
+        a._source = b._source = None
+        assert a.__dict__ == b.__dict__
+
+
+def test_source(collection):
+    assert collection.source(1).startswith('X: 37')
+
+
+def test_from_file(tmpdir, abc):
+    f = tmpdir.join('tunes.abc')
+    f.write(abc)
+    assert len(TuneCollection.from_file(str(f))) == 2
+
+
+def test_from_compressed_file(tmpdir, abc):
+    filename = str(tmpdir.join('tunes.abc.gz'))
+    with gzip.open(filename, 'wt') as f:
+        f.write(abc)
+    assert len(TuneCollection.from_file(filename)) == 2
+
+
+def test_empty_collection():
+    assert len(TuneCollection()) == 0
+
+
+if __name__ == "__main__":
+    pytest.main()
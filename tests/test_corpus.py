@@ -0,0 +1,176 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+    test_corpus
+    ~~~~~~~~~~~
+
+    Tests for the Corpus class.
+
+    :license: BSD, see LICENSE for more details.
+"""
+
+
+import gzip
+import threading
+import time
+
+import pytest
+from pytest import fixture
+
+from sjkabc import Corpus
+
+TUNE = """X:{}
+T:Tune {}
+K:D
+abc def|
+"""
+
+
+def tunes(*indexes):
+    return ''.join(TUNE.format(i, i) for i in indexes)
+
+
+@fixture
+def tunedir(tmpdir):
+    d = tmpdir.mkdir('tunes')
+    d.join('a.abc').write(tunes(1, 2))
+    d.mkdir('sub').join('b.abc').write(tunes(3))
+    d.join('ignored.txt').write(tunes(4))
+    return d
+
+
+def indexes(corpus):
+    return sorted(t.index[0] for t in corpus)
+
+
+def test_initial_parse(tunedir):
+    corpus = Corpus(str(tunedir))
+    assert len(corpus) == 3
+    assert indexes(corpus) == ['1', '2', '3']
+
+
+def test_snapshot(tunedir):
+    corpus = Corpus(str(tunedir))
+    version, tunes = corpus.snapshot()
+    assert version == corpus.version
+    assert indexes(tunes) == indexes(corpus)
+
+
+def test_refresh_without_changes(tunedir):
+    corpus = Corpus(str(tunedir))
+    version = corpus.version
+    assert not any(corpus.refresh())
+    assert corpus.version == version
+
+
+def test_refresh_picks_up_changes(tunedir):
+    corpus = Corpus(str(tunedir))
+
+    tunedir.join('a.abc').write(tunes(1, 2, 5))
+    tunedir.join('c.abc').write(tunes(6))
+    tunedir.join('sub', 'b.abc').remove()
+
+    changes = corpus.refresh()
+    assert changes.added == [str(tunedir.join('c.abc'))]
+    assert changes.changed == [str(tunedir.join('a.abc'))]
+    assert changes.removed == [str(tunedir.join('sub', 'b.abc'))]
+    assert indexes(corpus) == ['1', '2', '5', '6']
+
+
+def test_refresh_only_parses_changed_files(tunedir):
+    corpus = Corpus(str(tunedir))
+    before = corpus.files[str(tunedir.join('sub', 'b.abc'))]
+
+    tunedir.join('a.abc').write(tunes(7))
+    corpus.refresh()
+
+    assert corpus.files[str(tunedir.join('sub', 'b.abc'))] is before
+
+
+def test_watch(tunedir):
+    corpus = Corpus(str(tunedir))
+    stop = threading.Event()
+    seen = []
+
+    def callback(changes):
+        seen.append(changes)
+        stop.set()
+
+    thread = threading.Thread(target=corpus.watch,
+                              kwargs={'interval': 0.01, 'callback': callback,
+                                      'stop': stop})
+    thread.start()
+    tunedir.join('d.abc').write(tunes(8))
+    thread.join(5)
+
+    assert not thread.is_alive()
+    assert seen[0].added == [str(tunedir.join('d.abc'))]
+
+
+def test_symlinked_directories_are_not_followed(tunedir):
+    tunedir.join('sub', 'loop').mksymlinkto(tunedir)
+    tunedir.join('again').mksymlinkto(tunedir.join('sub'))
+    corpus = Corpus(str(tunedir))
+    assert indexes(corpus) == ['1', '2', '3']
+    assert not any(corpus.refresh())
+
+
+def test_unreadable_files_are_reported(tunedir):
+    corpus = Corpus(str(tunedir))
+    bad = tunedir.join('bad.abc.gz')
+    bad.write('not gzip')
+
+    changes = corpus.refresh()
+    assert changes.added == []
+    assert list(changes.errors) == [str(bad)]
+    assert isinstance(changes.errors[str(bad)], OSError)
+    assert indexes(corpus) == ['1', '2', '3']
+    assert not any(corpus.refresh())
+
+    tunedir.join('bad.abc.gz').remove()
+    with gzip.open(str(bad), 'wt') as f:
+        f.write(tunes(9))
+    changes = corpus.refresh()
+    assert changes.changed == [str(bad)]
+    assert changes.errors == {}
+    assert indexes(corpus) == ['1', '2', '3', '9']
+
+
+def test_watch_survives_unreadable_files(tunedir):
+    corpus = Corpus(str(tunedir))
+    stop = threading.Event()
+    seen = []
+
+    def callback(changes):
+        seen.append(changes)
+        if changes.added:
+            stop.set()
+
+    thread = threading.Thread(target=corpus.watch,
+                              kwargs={'interval': 0.01, 'callback': callback,
+                                      'stop': stop})
+    thread.start()
+    tunedir.join('bad.abc.zip').write('not a zip')
+    while not seen and thread.is_alive():
+        time.sleep(0.01)
+    tunedir.join('d.abc').write(tunes(8))
+    thread.join(5)
+
+    assert not thread.is_alive()
+    assert list(seen[0].errors) == [str(tunedir.join('bad.abc.zip'))]
+    assert seen[-1].added == [str(tunedir.join('d.abc'))]
+
+
+def test_string_pool_holds_only_repeating_fields(tunedir):
+    corpus = Corpus(str(tunedir))
+    size = len(corpus.strings)
+    for i in range(10, 20):
+        tunedir.join('a.abc').write(tunes(i))
+        corpus.refresh()
+    assert len(corpus.strings) == size
+    assert 'Tune 15' not in corpus.strings
+    assert '15' not in corpus.strings
+
+
+if __name__ == "__main__":
+    pytest.main()
@@ -17,7 +17,8 @@
 import pytest
 import re
 
-from sjkabc.sjkabc import expand_notes, expand_parts, expand_abc
+from sjkabc.sjkabc import expand_notes, expand_parts, expand_abc, \
+    ExpansionError
 
 
 def test_expand_notes():
@@ -145,5 +146,80 @@ def test_expanded_string_should_only_contain_lowercase_letters_a_to_g_and_z():
     expanded = expand_abc(abc)
     assert TUNE_BODY_REGEXP.match(expanded)
 
+
+@pytest.mark.parametrize('abc,expected', [
+    ('"G"(3abc d2', 'abcdd'),
+    ('(3"G"abc d2', 'abcdd'),
+    # Chords are stripped before triplets, so these are tuplets.
+    ('a("G"2b(', 'ab'),
+    ('d,| d("G"_2', 'dd'),
+])
+def test_expand_abc_chords_and_triplets(abc, expected):
+    assert expand_abc(abc) == expected
+
+
+def test_expand_notes_max_length():
+    assert expand_notes('a9', max_length=9) == 'a' * 9
+    with pytest.raises(ExpansionError) as e:
+        expand_notes('a9b9', max_length=10)
+    assert e.value.partial == 'a' * 9 + 'b' * 9
+
+
+def test_expand_parts_max_repeats():
+    abc = '|:abc:||:def:||:gab:|'
+    assert expand_parts(abc, max_repeats=3) == expand_parts(abc)
+    with pytest.raises(ExpansionError) as e:
+        expand_parts(abc, max_repeats=2)
+    assert e.value.partial == 'abc|abc|def|def|gab|'
+
+
+def test_expand_parts_max_length():
+    with pytest.raises(ExpansionError):
+        expand_parts('abc:|' * 10, max_length=100)
+
+
+def test_expand_parts_max_steps():
+    with pytest.raises(ExpansionError):
+        expand_parts('ab:|' * 1000, max_steps=100000)
+
+
+def test_expand_abc_without_reaching_limits():
+    abc = '|:G3 EGD|G2G BGB:|'
+    assert expand_abc(abc, max_length=100, max_repeats=10,
+                      max_steps=1000) == expand_abc(abc)
+
+
+@pytest.mark.parametrize('limits', [
+    dict(max_length=1000),
+    dict(max_repeats=10),
+    dict(max_steps=10 ** 6),
+])
+def test_expand_abc_fails_fast(limits):
+    # Every unbalanced end repeat doubles what came before it.
+    with pytest.raises(ExpansionError):
+        expand_abc('ab:|' * 5000, **limits)
+
+
+def test_expand_abc_max_steps_includes_every_stage():
+    with pytest.raises(ExpansionError):
+        expand_abc('abc' * 1000, max_steps=3000)
+
+
+@pytest.mark.parametrize('abc,limits,expected', [
+    ('a9b9c9', dict(max_length=10), 'a' * 9 + 'b'),
+    ('|:abc:|' * 3, dict(max_repeats=2), 'abc' * 5),
+    ('"G"abc', dict(max_steps=1), 'abc'),
+    ('|:a9b9:|c', dict(max_length=10), 'a' * 9),
+    ('a9b/2c>d', dict(max_steps=1), 'abcd'),
+    ('|:ab:|c', dict(max_steps=5), 'abc'),
+    ('|:ab|1c:|2d|]', dict(max_steps=5), 'abcd'),
+    ('ab:|' * 5000, dict(max_steps=10 ** 6), None),
+])
+def test_expand_abc_truncate(abc, limits, expected):
+    expanded = expand_abc(abc, truncate=True, **limits)
+    assert re.match(r'^[a-gz]*$', expanded)
+    if expected is not None:
+        assert expanded == expected
+
 if __name__ == "__main__":
     pytest.main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+    test_features
+    ~~~~~~~~~~~~~
+
+    Tests for tune feature vectors.
+
+    :license: BSD, see LICENSE for more details.
+"""
+
+
+import math
+
+import pytest
+from pytest import fixture
+
+from sjkabc.features import (FEATURE_SIZE, MAX_INTERVAL, FeatureIndex,
+                             features, parse_mode)
+
+from factories import TuneFactory
+
+
+BODIES = [
+    ('D', 'd2fd Adfd|d2fd e2fe|'),
+    ('G', 'g2bg dgbg|g2bg a2ba|'),    # the first tune a fourth up
+    ('Ador', 'A2cA EAcA|G2BG DGBG|'),
+    ('D', 'd4 f4|A8|'),
+]
+
+
+@fixture
+def tunes():
+    return [TuneFactory.build(key=[key], abc=[body]) for key, body in BODIES]
+
+
+@pytest.mark.parametrize('key,expected', [
+    ('D', (2, 'maj')),
+    ('F#m', (6, 'min')),
+    ('Bb', (10, 'maj')),
+    ('Ador', (9, 'dor')),
+    ('G Mixolydian', (7, 'mix')),
+    ('Eaeolian', (4, 'min')),
+    ('HP', (0, 'maj')),
+    (None, (0, 'maj')),
+])
+def test_parse_mode(key, expected):
+    assert parse_mode(key) == expected
+
+
+def test_features_are_normalised(tunes):
+    for tune in tunes:
+        vector = features(tune)
+        assert len(vector) == FEATURE_SIZE
+        assert math.sqrt(sum(v * v for v in vector)) == pytest.approx(1)
+
+
+def test_features_are_transposition_invariant(tunes):
+    assert list(features(tunes[0])) == pytest.approx(list(features(tunes[1])))
+
+
+def test_features_blocks():
+    tune = TuneFactory.build(key=['C'], abc=['C2 D2 C2 z2|'])
+    vector = features(tune)
+    classes = vector[:12]
+    intervals = vector[12:12 + 2 * MAX_INTERVAL + 1]
+    # C held for twice as long as D
+    assert classes[0] == pytest.approx(2 * classes[2])
+    # one step up, one down
+    assert intervals[MAX_INTERVAL + 2] == intervals[MAX_INTERVAL - 2] > 0
+
+
+@pytest.mark.parametrize('use_numpy', [True, False])
+def test_similar(tunes, use_numpy):
+    index = FeatureIndex(tunes, use_numpy=use_numpy)
+    found = index.similar(tunes[0], k=2)
+    assert len(found) == 2
+    assert found[0][1] is tunes[1]
+    assert found[0][0] == pytest.approx(1)
+    assert found[0][0] >= found[1][0]
+
+
+def test_numpy_and_fallback_agree(tunes):
+    a = FeatureIndex(tunes)
+    b = FeatureIndex(tunes, use_numpy=False)
+    vectors = [features(t) for t in tunes]
+    for x, y in zip(a.nearest(vectors, k=3), b.nearest(vectors, k=3)):
+        assert [s for s, i in x] == pytest.approx([s for s, i in y])
+        assert {i for s, i in x} == {i for s, i in y}
+
+
+def test_query(tunes):
+    index = FeatureIndex(tunes[1:])
+    score, tune = index.query(tunes[0], k=1)[0]
+    assert tune is tunes[1]
+
+
+def test_vector(tunes):
+    index = FeatureIndex(tunes, use_numpy=False)
+    assert list(index.vector(2)) == list(features(tunes[2]))
+
+
+def test_empty_index():
+    assert FeatureIndex([]).nearest([[0] * FEATURE_SIZE]) == [[]]
+
+
+if __name__ == "__main__":
+    pytest.main()
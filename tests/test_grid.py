@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+    test_grid
+    ~~~~~~~~~
+
+    Tests for rendering tunes onto a rhythmic grid.
+
+    :license: BSD, see LICENSE for more details.
+"""
+
+
+from fractions import Fraction
+
+import pytest
+
+from sjkabc.grid import (REST, PitchGrid, bar_similarity, default_note_length,
+                         parse_fraction, parse_key, pitch_class, render,
+                         similarity, split_key)
+
+from factories import TuneFactory
+
+
+def pitches(abc, **kwargs):
+    return list(render(abc, **kwargs).pitches)
+
+
+def test_note_lengths():
+    assert pitches('C2 D/ E/2 F3/2') == [60] * 4 + [62, 64] + [65] * 3
+
+
+def test_unit_note_length():
+    assert pitches('C D', note_length=Fraction(1, 4)) == [60] * 4 + [62] * 4
+
+
+def test_broken_rhythm():
+    assert pitches('C>D E<F') == [60] * 3 + [62, 64] + [65] * 3
+
+
+def test_triplet():
+    grid = render('(3CDE F', step=Fraction(1, 48))
+    assert list(grid.pitches) == [60] * 4 + [62] * 4 + [64] * 4 + [65] * 6
+
+
+def test_octaves_and_rests():
+    assert pitches("C, c c' z") == [48, 48, 72, 72, 84, 84, REST, REST]
+
+
+def test_key_signature_and_accidentals():
+    assert pitches('F c', key='D') == [66, 66, 73, 73]
+    assert pitches('=F F|F', key='D') == [65, 65, 65, 65, 66, 66]
+    assert pitches('^C c', key='C') == [61, 61, 72, 72]
+
+
+def test_chords_guitar_chords_and_decorations():
+    assert pitches('"G"[GBd]2 ~A {g}B') == [67] * 4 + [69, 69, 71, 71]
+
+
+def test_repeats_are_expanded():
+    assert pitches('|:C D:|') == [60, 60, 62, 62] * 2
+
+
+def test_bars():
+    grid = render('CD EF|G2 A2|B4|]')
+    assert grid.bars == [0, 8, 16]
+    assert list(grid.bar(2)) == [71] * 8
+
+
+@pytest.mark.parametrize('key,expected', [
+    ('D', {'F': 1, 'C': 1}),
+    ('Gm', {'B': -1, 'E': -1}),
+    ('Ador', {'F': 1}),
+    ('Bb', {'B': -1, 'E': -1}),
+    ('Emin', {'F': 1}),
+    ('none', {}),
+])
+def test_parse_key(key, expected):
+    assert parse_key(key) == expected
+
+
+@pytest.mark.parametrize('key,expected', [
+    ('D', ('D', '')),
+    ('F#m', ('F#', 'm')),
+    (' Bb Mixolydian', ('Bb', 'mix')),
+    ('Aminor', ('A', 'min')),
+    ('HP', None),
+    (None, None),
+])
+def test_split_key(key, expected):
+    assert split_key(key) == expected
+
+
+@pytest.mark.parametrize('name,expected', [
+    ('C', 0), ('F#', 6), ('Bb', 10), ('Cb', 11), ('B#', 0),
+])
+def test_pitch_class(name, expected):
+    assert pitch_class(name) == expected
+
+
+def test_parse_fraction():
+    assert parse_fraction('1/8') == Fraction(1, 8)
+    assert parse_fraction('C|') == Fraction(2, 2)
+    assert parse_fraction('none', 5) == 5
+
+
+def test_default_note_length():
+    assert default_note_length('2/4') == Fraction(1, 16)
+    assert default_note_length('6/8') == Fraction(1, 8)
+    assert default_note_length(None) == Fraction(1, 8)
+
+
+def test_from_tune_uses_header_fields():
+    tune = TuneFactory.build(abc=['F2 c2|'], key=['D'], note_length=['1/4'])
+    assert list(PitchGrid.from_tune(tune).pitches) == [66] * 8 + [73] * 8
+
+
+def test_similarity():
+    a = render('CDEF|GABc|')
+    b = render('CDEF|GABd|')
+    assert similarity(a, a) == 1.0
+    assert similarity(a, b) == pytest.approx(14 / 16)
+    assert bar_similarity(a, b) == [1.0, 0.75]
+
+
+def test_similarity_of_empty_grid():
+    assert similarity(render(''), render('CDEF')) == 0.0
+
+
+if __name__ == "__main__":
+    pytest.main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+    test_harmony
+    ~~~~~~~~~~~~
+
+    Tests for chord progressions.
+
+    :license: BSD, see LICENSE for more details.
+"""
+
+
+import pytest
+from pytest import fixture
+
+from sjkabc.harmony import (ChordIndex, degree, parse_chord,
+                            parse_progression, progression)
+
+from factories import TuneFactory
+
+
+@fixture
+def tunes():
+    return [
+        TuneFactory.build(key=['G'], abc=[
+            '|:"G" GABc|"C" c2 "D" d2:|"Em" e4|"Am" a2 "D" d2|"G" g4|]']),
+        TuneFactory.build(key=['D'], abc=['"D" d4|"G" g4|"A" a4|"D" d4|']),
+        TuneFactory.build(key=['Ador'], abc=['"Am" A4|"G" G4|"D" D4|']),
+        TuneFactory.build(key=['C'], abc=['cdef|gabc|']),
+    ]
+
+
+@fixture
+def index(tunes):
+    return ChordIndex(tunes)
+
+
+@pytest.mark.parametrize('chord,key,expected', [
+    ('G', None, (7, '')),
+    ('F#m7', None, (6, 'm')),
+    ('Bbmaj7', None, (10, '')),
+    ('Bdim', None, (11, 'dim')),
+    ('C+', None, (0, 'aug')),
+    ('G/B', None, (7, '')),
+    ('[GBd]', None, (7, '')),
+    ('[FAd]', None, (2, 'm')),
+    ('[FAd]', 'D', (2, '')),
+    ('[=FAd]', 'D', (2, 'm')),
+    ('[CD]', None, None),
+    ('^fine', None, None),
+])
+def test_parse_chord(chord, key, expected):
+    assert parse_chord(chord, key) == expected
+
+
+@pytest.mark.parametrize('chord,key,expected', [
+    ('Em', 'G', 'vi'),
+    ('F', 'Gmix', 'bVII'),
+    ('G7', None, 'V'),
+    ('Bdim', 'C', 'viio'),
+    ('C', 'Am', 'bIII'),
+    ('^fine', 'C', None),
+])
+def test_degree(chord, key, expected):
+    assert degree(chord, key) == expected
+
+
+def test_progression(tunes):
+    assert progression(tunes[0]) == [['I', 'IV', 'V'],
+                                     ['vi', 'ii', 'V', 'I']]
+    assert progression(tunes[3]) == [[]]
+
+
+@pytest.mark.parametrize('query', ['I IV V', 'I-IV-V', 'I – IV – V',
+                                   ['I', 'IV', 'V']])
+def test_parse_progression(query):
+    assert parse_progression(query) == ('I', 'IV', 'V')
+
+
+def test_query(index):
+    assert index.query('I-IV-V') == [0, 1]
+    assert index.query('V') == [0, 1]
+    assert index.query('i bVII IV') == [2]
+    assert index.query('V-I') == [0, 1]
+    assert index.query('') == []
+    assert index.query('VII') == []
+
+
+def test_query_part(index):
+    assert index.query('I-IV-V', part=0) == [0, 1]
+    assert index.query('V-I', part=0) == [1]
+    assert index.query('V-I', part=1) == [0]
+
+
+def test_query_longer_than_n(index):
+    assert index.query('I IV V I') == [1]
+    assert index.query('vi ii V I') == [0]
+    assert index.query('vi ii V I', part=0) == []
+    assert index.query('I IV V vi') == []
+
+
+def test_search(tunes, index):
+    assert index.search('i-bVII') == [tunes[2]]
+
+
+if __name__ == "__main__":
+    pytest.main()
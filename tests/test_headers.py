@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+    test_headers
+    ~~~~~~~~~~~~
+
+    Tests for parsed header fields and the header index.
+
+    :license: BSD, see LICENSE for more details.
+"""
+
+
+from fractions import Fraction
+
+import pytest
+from pytest import fixture
+
+from sjkabc.headers import (HeaderIndex, Metre, Tempo, header_values,
+                            parse_metre, parse_note_length, parse_tempo)
+
+from factories import TuneFactory
+
+
+@pytest.mark.parametrize('value,expected', [
+    ('6/8', Metre(6, 8)),
+    (' 3/4 ', Metre(3, 4)),
+    ('C', Metre(4, 4)),
+    ('C|', Metre(2, 2)),
+    ('2+3+2/8', Metre(7, 8)),
+    ('none', None),
+    ('', None),
+    (None, None),
+])
+def test_parse_metre(value, expected):
+    assert parse_metre(value) == expected
+
+
+def test_compound_metre():
+    assert parse_metre('6/8').compound
+    assert parse_metre('12/8').compound
+    assert not parse_metre('3/4').compound
+    assert not parse_metre('2/4').compound
+    assert not parse_metre('3/8').compound
+    assert parse_metre('9/8').compound
+    assert parse_metre('9/8').value == Fraction(9, 8)
+
+
+@pytest.mark.parametrize('value,expected', [
+    ('1/4=120', Tempo(Fraction(1, 4), 120)),
+    ('3/8=80', Tempo(Fraction(3, 8), 80)),
+    ('"Allegro" 1/4=132', Tempo(Fraction(1, 4), 132)),
+    ('1/4 1/8=40', Tempo(Fraction(3, 8), 40)),
+    ('1/2=60.5 "slowly"', Tempo(Fraction(1, 2), 60.5)),
+    ('100', Tempo(None, 100)),
+    ('"Lively"', None),
+    (None, None),
+])
+def test_parse_tempo(value, expected):
+    assert parse_tempo(value) == expected
+
+
+def test_parse_note_length():
+    assert parse_note_length('1/8') == Fraction(1, 8)
+    assert parse_note_length(None, '2/4') == Fraction(1, 16)
+    assert parse_note_length(None, '6/8') == Fraction(1, 8)
+    assert parse_note_length(None) == Fraction(1, 8)
+
+
+def test_header_values():
+    tune = TuneFactory.build(metre=['6/8'], tempo=['3/8=120'],
+                             note_length=['1/8'])
+    assert header_values(tune) == {
+        'tempo': 180, 'metre': Fraction(3, 4), 'beats': 6, 'beat_unit': 8,
+        'compound': True, 'note_length': Fraction(1, 8),
+    }
+
+
+def test_header_values_missing_fields():
+    tune = TuneFactory.build(metre=[], tempo=['120'], note_length=[])
+    values = header_values(tune)
+    assert values['metre'] is None
+    assert values['beats'] is None
+    assert values['compound'] is None
+    assert values['note_length'] == Fraction(1, 8)
+    assert values['tempo'] == 60
+
+
+@fixture
+def index():
+    headers = [
+        ('6/8', '3/8=120', '1/8'),     # 0: 180 quarters per minute
+        ('C|', '1/2=60', '1/8'),       # 1: 120
+        ('3/4', '1/4=100', '1/8'),     # 2
+        ('6/8', None, '1/8'),          # 3
+        ('2/4', '1/4=110', '1/16'),    # 4
+        (None, '1/4=120', None),       # 5
+    ]
+    tunes = [TuneFactory.build(metre=[m] if m else [],
+                               tempo=[q] if q else [],
+                               note_length=[l] if l else [])
+             for m, q, l in headers]
+    return HeaderIndex(tunes)
+
+
+def test_range(index):
+    assert index.range('tempo', 100, 120) == [1, 2, 4, 5]
+    assert index.range('tempo', 101, 119) == [4]
+    assert index.range('tempo', low=150) == [0]
+    assert index.range('tempo', high=100) == [2]
+    assert index.range('tempo') == [0, 1, 2, 4, 5]
+    assert index.range('metre', Fraction(1, 2), Fraction(3, 4)) == \
+        [0, 2, 3, 4]
+
+
+def test_equal(index):
+    assert index.equal('beats', 6) == [0, 3]
+    assert index.equal('metre', 1) == [1]
+    assert index.equal('note_length', Fraction(1, 16)) == [4]
+    assert index.equal('beat_unit', 3) == []
+    assert index.equal('compound', True) == [0, 3]
+    assert index.equal('compound', False) == [1, 2, 4]
+
+
+def test_query(index):
+    assert index.query(beats=6, tempo=(None, 200)) == [0]
+    assert index.query(note_length=Fraction(1, 8), tempo=(100, 120)) == \
+        [1, 2, 5]
+    assert index.query() == list(range(6))
+    assert index.search(beats=2) == [index.tunes[1], index.tunes[4]]
+
+
+def test_unknown_field(index):
+    with pytest.raises(KeyError):
+        index.range('key', 1, 2)
+
+
+if __name__ == "__main__":
+    pytest.main()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+    test_parallel
+    ~~~~~~~~~~~~~
+
+    Tests for parallel parsing and expansion, and for using tunes and parsers
+    from several threads.
+
+    :license: BSD, see LICENSE for more details.
+"""
+
+
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from pytest import fixture
+
+from sjkabc import Parser, TuneCollection
+from sjkabc.parallel import (expand_all, expand_tunes, free_threaded,
+                             parse_files)
+from sjkabc.sjkabc import ExpansionError, ExpansionLimits, expand_abc
+
+from factories import TuneFactory
+
+TUNE = """X:{}
+T:Tune {}
+K:D
+|:abc d2e:|
+"""
+
+
+@fixture
+def filenames(tmpdir):
+    names = []
+    for i in range(6):
+        f = tmpdir.join('{}.abc'.format(i))
+        f.write(TUNE.format(2 * i, i) + TUNE.format(2 * i + 1, i))
+        names.append(str(f))
+    return names
+
+
+def test_free_threaded_returns_bool():
+    assert free_threaded() in (True, False)
+
+
+def test_parse_files_keeps_file_order(filenames):
+    tunes = list(parse_files(filenames, workers=3))
+    assert [t.index[0] for t in tunes] == [str(i) for i in range(12)]
+
+
+def test_expand_tunes(filenames):
+    tunes = list(parse_files(filenames))
+    expanded = list(expand_tunes(tunes, workers=4, chunk_size=5))
+
+    assert expanded == tunes
+    for tune in tunes:
+        assert tune._expanded_abc == expand_abc(''.join(tune.abc))
+
+
+def test_expanded_abc_from_many_threads():
+    tune = TuneFactory.build()
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = set(pool.map(lambda _: tune.expanded_abc, range(100)))
+    assert results == {'aaabbbcccaaabbbccc'}
+
+
+def test_shared_parser_from_many_threads():
+    parser = Parser()
+    abc = ''.join(TUNE.format(i, i) for i in range(10))
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(parser.parse, [abc] * 20))
+    assert len(parser.tunes) == 200
+
+
+def test_shared_collection_from_many_threads():
+    tunes = TuneCollection(''.join(TUNE.format(i, i) for i in range(50)))
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        indexes = list(pool.map(lambda i: tunes[i % 50].index[0], range(500)))
+    assert indexes == [str(i % 50) for i in range(500)]
+
+
+def test_expand_all_in_processes():
+    tunes = [TuneFactory.build(abc=['|:abc d{}e:|'.format(i % 9 + 1)])
+             for i in range(50)]
+    tunes[3]._expanded_abc = 'cached'
+
+    result = list(expand_all(iter(tunes), workers=2, chunk_size=4))
+
+    assert result == tunes
+    assert tunes[3]._expanded_abc == 'cached'
+    for tune in tunes[4:]:
+        assert tune._expanded_abc == expand_abc(''.join(tune.abc))
+
+
+def test_expand_all_small_input_runs_in_process():
+    tunes = TuneFactory.build_batch(3)
+    assert list(expand_all(tunes, workers=4)) == tunes
+    assert all(t._expanded_abc for t in tunes)
+
+
+BAD_BODY = 'ab:|' * 5000
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_expand_all_skips_and_reports_bad_tunes(workers):
+    tunes = [TuneFactory.build(abc=[BAD_BODY if i % 7 == 3 else 'abc|'])
+             for i in range(40)]
+    errors = []
+    result = list(expand_all(tunes, workers=workers, chunk_size=4,
+                             limits=ExpansionLimits(max_length=10000),
+                             on_error=lambda t, e: errors.append((t, e))))
+
+    bad = [t for i, t in enumerate(tunes) if i % 7 == 3]
+    assert result == [t for t in tunes if t not in bad]
+    assert [t for t, e in errors] == bad
+    assert all(isinstance(e, ExpansionError) for t, e in errors)
+    assert all(t._expanded_abc == 'abc' for t in result)
+
+
+def test_expand_tunes_skips_bad_tunes():
+    tunes = [TuneFactory.build(abc=[BAD_BODY]), TuneFactory.build()]
+    errors = []
+    result = list(expand_tunes(tunes, workers=2, chunk_size=1,
+                               limits=ExpansionLimits(max_steps=10 ** 6),
+                               on_error=lambda t, e: errors.append(t)))
+    assert result == tunes[1:]
+    assert errors == tunes[:1]
+
+
+if __name__ == "__main__":
+    pytest.main()
@@ -11,10 +11,18 @@
 """
 
 
+import bz2
+import gzip
+import lzma
+import os
+import pathlib
+import zipfile
+
 import pytest
 from pytest import fixture
 
-from sjkabc import Parser, parse_dir, parse_file
+from sjkabc import Parser, StringPool, parse_dir, parse_file
+from sjkabc.sjkabc import find_abc_files
 
 @fixture
 def tune1():
@@ -178,5 +186,183 @@ def test_parse_dir(tmpdir, tune1, tune2):
     assert ['37'] in indexes
 
 
+@pytest.mark.parametrize('ext,opener', [
+    ('.abc.gz', gzip.open),
+    ('.abc.bz2', bz2.open),
+    ('.abc.xz', lzma.open),
+])
+def test_parse_compressed_file(tmpdir, two_abc_tunes, ext, opener):
+    filename = str(tmpdir.join('tunes' + ext))
+    with opener(filename, 'wt') as f:
+        f.write(two_abc_tunes)
+
+    indexes = sorted(t.index for t in parse_file(filename))
+    assert indexes == [['1'], ['37']]
+
+
+def test_parse_zip_file(tmpdir, tune1, tune2):
+    filename = str(tmpdir.join('tunes.zip'))
+    with zipfile.ZipFile(filename, 'w') as archive:
+        archive.writestr('a/tune1.abc', tune1)
+        archive.writestr('tune2.abc', tune2)
+        archive.writestr('README.txt', 'X:99')
+
+    indexes = sorted(t.index for t in parse_file(filename))
+    assert indexes == [['1'], ['37']]
+
+
+@pytest.mark.parametrize('name', ['tunes.abc', 'tunes.abc.gz', 'tunes.zip'])
+def test_parse_path_objects(tmpdir, two_abc_tunes, name):
+    path = pathlib.Path(str(tmpdir), name)
+    if name.endswith('.zip'):
+        with zipfile.ZipFile(str(path), 'w') as archive:
+            archive.writestr('tunes.abc', two_abc_tunes)
+    elif name.endswith('.gz'):
+        with gzip.open(str(path), 'wt') as f:
+            f.write(two_abc_tunes)
+    else:
+        path.write_text(two_abc_tunes)
+
+    indexes = sorted(t.index for t in parse_file(path))
+    assert indexes == [['1'], ['37']]
+
+
+def test_parse_dir_includes_compressed_files(tmpdir, tune1, tune2):
+    d = tmpdir.mkdir('tunes')
+    d.join('tune1.abc').write(tune1)
+    d.join('notes.txt').write(tune1)
+    with gzip.open(str(d.join('tune2.abc.gz')), 'wt') as f:
+        f.write(tune2)
+
+    indexes = sorted(t.index for t in parse_dir(str(d)))
+    assert indexes == [['1'], ['37']]
+
+
+def test_find_abc_files(tmpdir):
+    d = tmpdir.mkdir('tunes')
+    for name in ['b.abc', 'a.abc.gz', 'notes.txt']:
+        d.join(name).write('')
+    for name in ['z', 'c']:
+        d.mkdir(name).join('tune.abc').write('')
+
+    found = [os.path.relpath(f, str(d)) for f in find_abc_files(str(d))]
+    assert found == ['a.abc.gz', 'b.abc', os.path.join('c', 'tune.abc'),
+                     os.path.join('z', 'tune.abc')]
+
+
+def test_parse_file_keeps_file_order(tmpdir, two_abc_tunes):
+    f = tmpdir.join('tunes.abc')
+    f.write(two_abc_tunes)
+    assert [t.index for t in parse_file(str(f))] == [['1'], ['37']]
+
+
+def test_parse_dir_with_workers(tmpdir, tune1, tune2):
+    d = tmpdir.mkdir('tunes')
+    for i in range(10):
+        d.join('tune{}.abc'.format(i)).write(tune1 + tune2)
+
+    tunes = list(parse_dir(str(d), workers=3))
+    assert len(tunes) == 20
+
+
+def test_parser_interns_header_values(tune2):
+    parser = Parser(tune2 + tune2, strings=True)
+    first, second = parser.tunes
+
+    assert first.metre[0] is second.metre[0]
+    assert first.rhythm[0] is second.rhythm[0]
+    assert parser.strings.stats()['hits'] > 0
+    assert parser.strings.stats()['bytes_saved'] > 0
+
+
+def test_string_pool_shared_between_parsers(tune1, tune2):
+    strings = StringPool()
+    a = Parser(tune1, strings).tunes[0]
+    b = Parser(tune2, strings).tunes[0]
+
+    assert a.note_length[0] is b.note_length[0]
+    assert strings.intern('Reel') is a.rhythm[0]
+    assert a.history[0] not in strings
+    assert a.title[0] not in strings
+    assert a.index[0] not in strings
+
+
+@pytest.mark.parametrize('size', [3, 4096])
+def test_string_pool_holds_only_final_continued_values(size):
+    abc = 'X:1\nT:Test\nC:Trad\n+:arr. Smith\nK:D\nabc|\n'
+    parser = Parser(strings=True)
+    for i in range(0, len(abc), size):
+        parser.feed(abc[i:i + size])
+    parser.close()
+
+    assert parser.tunes[0].composer == ['Trad arr. Smith']
+    assert 'Trad arr. Smith' in parser.strings
+    assert 'Trad' not in parser.strings
+
+
+def test_parser_without_string_pool(tune2):
+    parser = Parser(tune2 + tune2)
+    assert parser.strings is None
+
+
+def test_parse_dir_with_string_pool(tmpdir, tune1, tune2):
+    d = tmpdir.mkdir('tunes')
+    d.join('tune1.abc').write(tune1)
+    d.join('tune2.abc').write(tune2)
+
+    strings = StringPool()
+    tunes = list(parse_dir(str(d), strings=strings))
+    assert tunes[0].note_length[0] is tunes[1].note_length[0]
+
+
+def fields(tune):
+    return (tune.index, tune.title, tune.history, tune.key, tune.abc)
+
+
+@pytest.mark.parametrize('size', [1, 2, 3, 7, 64, 4096])
+def test_feed_matches_parse(two_abc_tunes, size):
+    abc = two_abc_tunes.replace('\n', '\r\n')
+    found = []
+    parser = Parser(callback=found.append)
+    for i in range(0, len(abc), size):
+        parser.feed(abc[i:i + size])
+    parser.close()
+    assert [fields(t) for t in found] == \
+        [fields(t) for t in Parser(two_abc_tunes).tunes]
+    assert parser.tunes == []
+
+
+def test_feed_emits_tunes_when_complete(tune1, tune2):
+    found = []
+    parser = Parser(callback=found.append)
+    parser.feed(tune1)
+    assert found == []
+    parser.feed(tune2[:5])
+    assert [t.index for t in found] == [['1']]
+    parser.feed(tune2[5:])
+    parser.close()
+    assert [t.index for t in found] == [['1'], ['37']]
+
+
+def test_feed_continuation_split_across_chunks(tune1):
+    found = []
+    parser = Parser(callback=found.append)
+    head, sep, tail = tune1.partition('+: cont')
+    parser.feed(head + '+')
+    parser.feed(': cont' + tail)
+    parser.close()
+    assert found[0].history[0] == (
+        "So here's the story. And it continues on this line.")
+
+
+def test_feed_without_callback(tune1, tune2):
+    parser = Parser()
+    parser.feed(tune1 + tune2.rstrip('\n'))
+    parser.close()
+    assert [t.index for t in parser.tunes] == [['1'], ['37']]
+    assert parser.tunes[1].abc[-1].endswith('|2FED E3|]')
+    assert [t.index for t in parser] == [['37'], ['1']]
+
+
 if __name__ == "__main__":
     pytest.main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+    test_profiling
+    ~~~~~~~~~~~~~~
+
+    Tests for the profiling hooks.
+
+    :license: BSD, see LICENSE for more details.
+"""
+
+import threading
+
+import pytest
+from pytest import fixture
+
+from sjkabc import parse_dir
+from sjkabc.parallel import parse_files
+from sjkabc.profiling import Profiler, active_profiler
+from sjkabc.sjkabc import EXPAND_STAGES, expand_abc
+
+TUNE = """X:1
+T:Test
+K:D
+|:abc abc|d2e fga:|
+"""
+
+
+@fixture
+def tunedir(tmpdir):
+    d = tmpdir.mkdir('tunes')
+    d.join('a.abc').write(TUNE + TUNE)
+    d.join('b.abc').write(TUNE)
+    return str(d)
+
+
+def test_profiler_is_disabled_by_default():
+    assert active_profiler() is None
+
+
+def test_profiler_records_stages(tunedir):
+    with Profiler() as prof:
+        for tune in parse_dir(tunedir):
+            tune.expanded_abc
+
+    stats = prof.as_dict()
+    assert stats['parse_file.read']['calls'] == 2
+    assert stats['Parser.parse']['items'] == 3
+    for f in EXPAND_STAGES:
+        assert stats['expand_abc.' + f.__name__]['calls'] == 3
+
+    parts = stats['expand_abc.expand_parts']
+    assert parts['bytes_out'] > parts['bytes_in']
+    assert active_profiler() is None
+
+
+def test_profiled_expand_abc_gives_same_result():
+    abc = '|:abc abc|d2e fga:|'
+    with Profiler():
+        profiled = expand_abc(abc)
+    assert profiled == expand_abc(abc)
+
+
+def test_nested_profilers():
+    with Profiler() as outer:
+        with Profiler() as inner:
+            expand_abc('abc')
+        assert active_profiler() is outer
+    assert inner.as_dict() and not outer.as_dict()
+
+
+def test_profilers_are_thread_local():
+    entered, done = threading.Event(), threading.Event()
+
+    def profile():
+        with Profiler():
+            entered.set()
+            done.wait()
+
+    thread = threading.Thread(target=profile)
+    thread.start()
+    entered.wait()
+    try:
+        assert active_profiler() is None
+        with Profiler() as prof:
+            expand_abc('abc')
+    finally:
+        done.set()
+        thread.join()
+    assert prof.as_dict()
+    assert active_profiler() is None
+
+
+def test_worker_threads_record_to_callers_profiler(tunedir):
+    files = [tunedir + '/a.abc', tunedir + '/b.abc']
+    with Profiler() as prof:
+        assert len(list(parse_files(files, workers=2))) == 3
+    assert prof.as_dict()['Parser.parse']['items'] == 3
+
+
+def test_parse_dir_progress(tunedir):
+    reports = []
+    list(parse_dir(tunedir, progress=reports.append))
+
+    assert [r['files'] for r in reports] == [1, 2]
+    assert reports[-1]['tunes'] == 3
+    assert reports[-1]['tunes_per_sec'] >= 0
+
+
+if __name__ == "__main__":
+    pytest.main()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+    test_search
+    ~~~~~~~~~~~
+
+    Tests for searching expanded ABC and melody patterns.
+
+    :license: BSD, see LICENSE for more details.
+"""
+
+
+import re
+
+import pytest
+from pytest import fixture
+
+from sjkabc.search import Haystack, MelodyPattern, expand_with_bars
+
+from factories import TuneFactory
+
+
+BODIES = ['abc def|', 'gfe dcb|', '|:abc abc:|', 'dcb dcb|', 'gfe abc|']
+
+
+@fixture
+def tunes():
+    return [TuneFactory.build(abc=[body]) for body in BODIES]
+
+
+@fixture
+def haystack(tunes):
+    return Haystack(tunes)
+
+
+def naive(tunes, query):
+    return [i for i, t in enumerate(tunes) if query in t.expanded_abc]
+
+
+@pytest.mark.parametrize('query', ['abc', 'cd', 'gfe', 'abcabcabc', 'x', ''])
+def test_find_matches_naive_search(tunes, haystack, query):
+    assert haystack.find(query) == naive(tunes, query)
+
+
+@pytest.mark.parametrize('workers', [2, 3, 10])
+def test_find_with_workers(tunes, haystack, workers):
+    assert haystack.find('abc', workers=workers) == naive(tunes, 'abc')
+
+
+def test_matches_do_not_span_tunes(haystack):
+    assert haystack.find('dcbgfe') == []
+    assert haystack.finditer('dcb.gfe') == []
+
+
+def test_search_returns_tunes(tunes, haystack):
+    assert haystack.search('dcbdcb') == [tunes[3]]
+
+
+def test_finditer(haystack):
+    assert haystack.finditer('a.c') == [0, 2, 4]
+    assert haystack.finditer(re.compile('^gfe')) == [1, 4]
+    assert haystack.finditer('abc$', workers=2) == [2, 4]
+
+
+def test_empty_haystack():
+    assert Haystack([]).find('abc') == []
+
+
+def test_expand_with_bars():
+    assert expand_with_bars('|:G2 AB|c4:|') == 'ggab|cccc|ggab|cccc|'
+
+
+def indexes(pattern, tunes):
+    return [tunes.index(t) for t in MelodyPattern(pattern).search(tunes)]
+
+
+@pytest.mark.parametrize('pattern,expected', [
+    ('d?f', [0]),
+    ('D E F', [0]),
+    ('[ad]bc', [0, 2, 4]),
+    ('[^a]cb', [1, 3]),
+    ('[^d]cb', []),
+    ('c*d', [0, 3]),
+    ('g*c', [1, 4]),
+    ('e*a', [4]),
+    ('a*a', [2]),
+])
+def test_pattern_search(tunes, pattern, expected):
+    assert indexes(pattern, tunes) == expected
+
+
+def test_star_stays_within_bar():
+    tunes = [TuneFactory.build(abc=['abc|def|'])]
+    assert indexes('cd', tunes) == [0]
+    assert indexes('c?e', tunes) == [0]
+    assert indexes('c*d', tunes) == []
+    assert indexes('a*c|d*f', tunes) == [0]
+
+
+def test_pattern_literal():
+    assert MelodyPattern('d?fa*[ab]gab').literal == 'gab'
+    assert MelodyPattern('???').literal == ''
+
+
+@pytest.mark.parametrize('pattern', ['d?f', '[ad]bc', 'g*c', 'a*a'])
+def test_pattern_find_in_haystack(tunes, haystack, pattern):
+    assert (MelodyPattern(pattern).find(haystack) ==
+            indexes(pattern, tunes))
+
+
+@pytest.mark.parametrize('pattern', ['', '  |', 'dxf', '[ce', '[q]', '[]'])
+def test_invalid_pattern(pattern):
+    with pytest.raises(ValueError):
+        MelodyPattern(pattern)
+
+
+if __name__ == "__main__":
+    pytest.main()
@@ -0,0 +1,169 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+    test_shard
+    ~~~~~~~~~~
+
+    Tests for sharding tunebooks.
+
+    :license: BSD, see LICENSE for more details.
+"""
+
+
+import gzip
+import os
+import zipfile
+
+import pytest
+from pytest import fixture
+
+from sjkabc import parse_file
+from sjkabc.shard import (MANIFEST, load_manifest, read_tune, shard_dir,
+                          shard_filenames, shard_files, unshard)
+
+TUNE = """X:{}
+T:Tune {}
+K:D
+% a comment
+|:abc d2e:|
+
+"""
+
+
+def tunebook(first, count):
+    return ''.join(TUNE.format(x, x) for x in range(first, first + count))
+
+
+@fixture
+def corpus(tmpdir):
+    src = tmpdir.mkdir('src')
+    src.join('big.abc').write(tunebook(1, 20))
+    for i in range(5):
+        src.join('small{}.abc'.format(i)).write(tunebook(100 + i, 1))
+    sub = src.mkdir('sub')
+    with gzip.open(str(sub.join('packed.abc.gz')), 'wt') as f:
+        f.write('% file header\n' + tunebook(200, 3).rstrip('\n'))
+    return str(src)
+
+
+def test_shard_by_tunes(corpus, tmpdir):
+    manifest = shard_dir(corpus, str(tmpdir.join('out')), shard_tunes=8)
+    counts = [len(s['tunes']) for s in manifest['shards']]
+    assert counts == [8, 8, 8, 4]
+    assert sum(len(list(parse_file(f)))
+               for f in shard_filenames(manifest)) == 28
+
+
+def test_shard_by_bytes(corpus, tmpdir):
+    size = len(TUNE.format(1, 1))
+    manifest = shard_dir(corpus, str(tmpdir.join('out')),
+                         shard_bytes=5 * size + 1)
+    shards = manifest['shards']
+    assert all(s['bytes'] <= 5 * size + 1 for s in shards)
+    for shard, following in zip(shards, shards[1:]):
+        assert shard['bytes'] + following['tunes'][0]['length'] > \
+            5 * size + 1
+    for path, shard in zip(shard_filenames(manifest), shards):
+        assert os.path.getsize(path) == shard['bytes']
+
+
+def test_oversized_tune_gets_own_shard(corpus, tmpdir):
+    manifest = shard_dir(corpus, str(tmpdir.join('out')), shard_bytes=1)
+    assert [len(s['tunes']) for s in manifest['shards']] == [1] * 28
+
+
+def test_manifest_maps_tunes_to_sources(corpus, tmpdir):
+    out = str(tmpdir.join('out'))
+    shard_dir(corpus, out, shard_tunes=8)
+    manifest = load_manifest(out)
+    tunes = [t for s in manifest['shards'] for t in s['tunes']]
+
+    assert [os.path.basename(t['source']) for t in tunes] == \
+        ['big.abc'] * 20 + ['small{}.abc'.format(i) for i in range(5)] + \
+        ['packed.abc.gz'] * 3
+    assert [t['x'] for t in tunes[18:23]] == ['19', '20', '100', '101', '102']
+    assert read_tune(manifest, 2, 5) == TUNE.format(101, 101)
+    assert read_tune(manifest, 3, 3) == TUNE.format(202, 202).rstrip('\n') \
+        + '\n'
+
+
+def test_unshard_restores_files(corpus, tmpdir):
+    out = str(tmpdir.join('out'))
+    manifest = shard_dir(corpus, out, shard_tunes=3)
+    restored = str(tmpdir.join('restored'))
+    written = unshard(manifest, restored)
+
+    assert len(written) == 7
+    with open(os.path.join(restored, 'big.abc')) as f:
+        assert f.read() == tunebook(1, 20)
+    with open(os.path.join(restored, 'sub', 'packed.abc')) as f:
+        assert f.read() == tunebook(200, 3).rstrip('\n') + '\n'
+
+
+def test_zip_members(tmpdir):
+    archive = str(tmpdir.join('book.zip'))
+    with zipfile.ZipFile(archive, 'w') as z:
+        z.writestr('reels.abc', tunebook(1, 2))
+        z.writestr('jigs/all.abc', tunebook(1, 3))
+    out = str(tmpdir.join('out'))
+    manifest = shard_files([archive], out)
+
+    tunes = manifest['shards'][0]['tunes']
+    assert [(t['source'], t['member'], t['x']) for t in tunes] == \
+        [(archive, 'reels.abc', '1'), (archive, 'reels.abc', '2')] + \
+        [(archive, 'jigs/all.abc', str(x)) for x in range(1, 4)]
+    assert load_manifest(out)['shards'][0]['tunes'][0]['member'] == \
+        'reels.abc'
+
+    restored = str(tmpdir.join('restored'))
+    unshard(manifest, restored)
+    with open(os.path.join(restored, 'book', 'reels.abc')) as f:
+        assert f.read() == tunebook(1, 2)
+    with open(os.path.join(restored, 'book', 'jigs', 'all.abc')) as f:
+        assert f.read() == tunebook(1, 3)
+
+
+@pytest.mark.parametrize('names', [
+    ['reels.abc', 'reels.abc.gz'],
+    ['book.zip', 'book/reels.abc'],
+    ['book.abc.zip', 'book.abc'],
+])
+def test_unshard_refuses_colliding_sources(tmpdir, names):
+    src = tmpdir.mkdir('src')
+    files = []
+    for i, name in enumerate(names):
+        path = str(src.join(name))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if name.endswith('.zip'):
+            with zipfile.ZipFile(path, 'w') as z:
+                z.writestr('reels.abc', tunebook(i * 10, 2))
+        elif name.endswith('.gz'):
+            with gzip.open(path, 'wt') as f:
+                f.write(tunebook(i * 10, 2))
+        else:
+            src.join(name).write(tunebook(i * 10, 2))
+        files.append(path)
+    manifest = shard_files(files, str(tmpdir.join('out')))
+
+    restored = tmpdir.join('restored')
+    with pytest.raises(ValueError):
+        unshard(manifest, str(restored))
+    assert not restored.check()
+
+
+def test_plain_files_have_no_member(corpus, tmpdir):
+    manifest = shard_dir(corpus, str(tmpdir.join('out')))
+    assert all(t['member'] is None
+               for s in manifest['shards'] for t in s['tunes'])
+
+
+def test_empty_input(tmpdir):
+    out = str(tmpdir.join('out'))
+    manifest = shard_files([], out)
+    assert manifest['shards'] == []
+    assert os.path.exists(os.path.join(out, MANIFEST))
+    assert unshard(manifest, str(tmpdir.join('restored'))) == []
+
+
+if __name__ == "__main__":
+    pytest.main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+    test_shared
+    ~~~~~~~~~~~
+
+    Tests for the shared memory corpus.
+
+    :license: BSD, see LICENSE for more details.
+"""
+
+
+import multiprocessing
+
+import pytest
+from pytest import fixture, raises
+
+from sjkabc.shared import SharedCorpus
+
+from factories import TuneFactory
+
+
+@fixture
+def tunes():
+    tunes = TuneFactory.build_batch(3, key=['D'])
+    tunes[1].title = ['Tåg', 'Second title']
+    tunes[1].abc = ['abc def|', 'd2e fga|']
+    return tunes
+
+
+@fixture
+def corpus(tunes):
+    corpus = SharedCorpus.create(tunes)
+    yield corpus
+    corpus.close()
+    corpus.unlink()
+
+
+def test_len(corpus):
+    assert len(corpus) == 3
+
+
+def test_views_match_tunes(corpus, tunes):
+    for view, tune in zip(corpus, tunes):
+        assert view.title == tune.title
+        assert view.instruction == tune.instruction
+        assert view.abc == tune.abc
+        assert view.expanded_abc == tune.expanded_abc
+
+
+def test_unknown_attribute(corpus):
+    with raises(AttributeError):
+        corpus[0].something_incorrect
+
+
+def test_expanded_bytes(corpus):
+    view = corpus[1].expanded_bytes
+    assert bytes(view) == b'abcdefddefga'
+    view.release()
+
+
+def test_to_tune(corpus, tunes):
+    tune = corpus[1].to_tune()
+    assert tune.format_abc() == tunes[1].format_abc()
+
+
+def test_index_out_of_range(corpus):
+    with raises(IndexError):
+        corpus[3]
+
+
+def _titles(name):
+    with SharedCorpus(name) as corpus:
+        return [t.title[0] for t in corpus]
+
+
+def test_attach_from_other_process(corpus):
+    ctx = multiprocessing.get_context('spawn')
+    with ctx.Pool(1) as pool:
+        titles = pool.apply(_titles, (corpus.name,))
+    assert titles == ['Test tune', 'Tåg', 'Test tune']
+
+
+def test_empty_corpus():
+    corpus = SharedCorpus.create([])
+    assert len(corpus) == 0
+    corpus.close()
+    corpus.unlink()
+
+
+if __name__ == "__main__":
+    pytest.main()
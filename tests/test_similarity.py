@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+    test_similarity
+    ~~~~~~~~~~~~~~~
+
+    Tests for ranked similarity search.
+
+    :license: BSD, see LICENSE for more details.
+"""
+
+
+import pytest
+from pytest import fixture
+
+from sjkabc.similarity import SimilarityIndex, ngrams
+
+from factories import TuneFactory
+
+
+BODIES = [
+    'DGBd cBGF|DFF2 GFDF|GABc dgga|bgaf dgga|',
+    'DGBd cBGF|DFF2 GFDF|GABc dgga|bgaf dggb|',
+    'BEE BEE|Bdf edB|BAF FEF|DFA BAF|',
+    'e2f gfe|eae edB|BAF FEF|DFA BAF|',
+    'ceec defd|ceaf ecAB|ceec defd|ceBe cAAB|',
+]
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+needs_numpy = pytest.mark.skipif(numpy is None, reason='NumPy not installed')
+with_numpy = pytest.param(True, marks=needs_numpy)
+
+
+@fixture
+def tunes():
+    return [TuneFactory.build(abc=[body]) for body in BODIES]
+
+
+def test_ngrams():
+    assert ngrams('abcab', 2) == {'ab': 2, 'bc': 1, 'ca': 1}
+    assert ngrams('ab', 3) == {}
+
+
+@pytest.mark.parametrize('use_numpy', [False, with_numpy])
+def test_query_ranks_most_similar_first(tunes, use_numpy):
+    index = SimilarityIndex(tunes, use_numpy=use_numpy)
+    results = index.query(BODIES[0], k=3)
+
+    assert [t for s, t in results][:2] == [tunes[0], tunes[1]]
+    assert results[0][0] == pytest.approx(1.0)
+    assert results[0][0] >= results[1][0] >= results[-1][0]
+
+
+@pytest.mark.parametrize('use_numpy', [False, with_numpy])
+def test_similar_leaves_out_tune(tunes, use_numpy):
+    index = SimilarityIndex(tunes, use_numpy=use_numpy)
+    results = index.similar(tunes[2], k=1)
+    assert [t for s, t in results] == [tunes[3]]
+
+
+@needs_numpy
+def test_numpy_and_python_agree(tunes):
+    a = SimilarityIndex(tunes, use_numpy=False).query(BODIES[3], k=5)
+    b = SimilarityIndex(tunes, use_numpy=True).query(BODIES[3], k=5)
+    assert [t for s, t in a] == [t for s, t in b]
+    assert [s for s, t in a] == pytest.approx([s for s, t in b])
+
+
+def test_unknown_query_has_no_results(tunes):
+    index = SimilarityIndex(tunes, use_numpy=False)
+    assert index.query('zzzz zzzz') == []
+
+
+def test_empty_index():
+    assert SimilarityIndex([]).query('abcd efga') == []
+
+
+if __name__ == "__main__":
+    pytest.main()
@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+    test_sqlite
+    ~~~~~~~~~~~
+
+    Tests for the SQLite exporter.
+
+    :license: BSD, see LICENSE for more details.
+"""
+
+
+import sqlite3
+
+import pytest
+from pytest import fixture
+
+from sjkabc.sqlite import SQLiteExporter, export_dir
+
+from factories import TuneFactory
+
+
+@fixture
+def tunes():
+    tunes = TuneFactory.build_batch(3, key=['D'])
+    for i, tune in enumerate(tunes):
+        tune.index = [str(i + 1)]
+    tunes[1].title = ['The Silver Spear', 'Silver Spire']
+    tunes[2].abc = ['|:gfe dcb:|']
+    return tunes
+
+
+@fixture
+def db(tmpdir):
+    return str(tmpdir.join('tunes.db'))
+
+
+def query(db, sql, *args):
+    with sqlite3.connect(db) as c:
+        return c.execute(sql, args).fetchall()
+
+
+def test_write(db, tunes):
+    with SQLiteExporter(db, batch_size=2) as exporter:
+        assert exporter.write(tunes, file='a.abc') == 3
+
+    assert query(db, 'SELECT id, file, x FROM tunes') == [
+        (1, 'a.abc', '1'), (2, 'a.abc', '2'), (3, 'a.abc', '3')]
+    assert query(db, "SELECT value FROM headers "
+                     "WHERE tune_id = 2 AND field = 'T' ORDER BY position") \
+        == [('The Silver Spear',), ('Silver Spire',)]
+
+
+def test_title_full_text_search(db, tunes):
+    with SQLiteExporter(db) as exporter:
+        exporter.write(tunes)
+
+    assert query(db, "SELECT rowid FROM titles WHERE titles MATCH 'spire'") \
+        == [(2,)]
+
+
+def test_melody_trigram_search(db, tunes):
+    with SQLiteExporter(db) as exporter:
+        exporter.write(tunes)
+
+    assert query(db, "SELECT rowid FROM melodies "
+                     "WHERE melodies MATCH 'dcbgfe'") == [(3,)]
+
+
+def test_indexes_are_created(db, tunes):
+    with SQLiteExporter(db) as exporter:
+        exporter.write(tunes)
+
+    indexes = {row[0] for row in query(
+        db, "SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert {'tunes_file_x', 'headers_tune'} <= indexes
+
+
+def test_upsert_replaces_tunes(db, tunes):
+    with SQLiteExporter(db) as exporter:
+        exporter.write(tunes, file='a.abc')
+
+    tunes[0].title = ['Changed title']
+    with SQLiteExporter(db) as exporter:
+        exporter.upsert(tunes[:1], file='a.abc')
+
+    assert query(db, 'SELECT COUNT(*) FROM tunes') == [(3,)]
+    assert query(db, "SELECT rowid FROM titles "
+                     "WHERE titles MATCH 'changed'") == [(4,)]
+    assert query(db, "SELECT COUNT(*) FROM headers WHERE tune_id = 1") \
+        == [(0,)]
+
+
+def test_delete_file(db, tunes):
+    with SQLiteExporter(db) as exporter:
+        exporter.write(tunes[:2], file='a.abc')
+        exporter.write(tunes[2:], file='b.abc')
+        exporter.delete_file('a.abc')
+
+    assert query(db, 'SELECT file FROM tunes') == [('b.abc',)]
+
+
+def test_export_dir(tmpdir, db):
+    d = tmpdir.mkdir('tunes')
+    d.join('a.abc').write('X:1\nT:One\nK:D\nabc|\nX:2\nT:Two\nK:D\ndef|\n')
+    d.join('b.abc').write('X:1\nT:Three\nK:D\nabc|\n')
+
+    assert export_dir(str(d), db) == 3
+    assert query(db, 'SELECT COUNT(DISTINCT file) FROM tunes') == [(2,)]
+
+
+def test_connection_is_left_open(tunes):
+    connection = sqlite3.connect(':memory:')
+    with SQLiteExporter(connection) as exporter:
+        exporter.write(tunes)
+    assert connection.execute('SELECT COUNT(*) FROM tunes').fetchone() \
+        == (3,)
+
+
+def test_duplicate_x_numbers(tunes):
+    connection = sqlite3.connect(':memory:')
+    for tune in tunes:
+        tune.index = ['1']
+    with SQLiteExporter(connection) as exporter:
+        exporter.write(tunes, file='a.abc')
+    assert connection.execute('SELECT COUNT(*) FROM tunes').fetchone() \
+        == (3,)
+
+    with SQLiteExporter(connection) as exporter:
+        exporter.upsert(tunes[:2], file='a.abc')
+    assert connection.execute('SELECT COUNT(*) FROM tunes').fetchone() \
+        == (2,)
+
+
+def test_pragmas_are_restored_if_finish_fails(monkeypatch, tunes):
+    connection = sqlite3.connect(':memory:')
+    synchronous = connection.execute('PRAGMA synchronous').fetchone()
+    monkeypatch.setattr('sjkabc.sqlite.INDEXES',
+                        ('CREATE INDEX broken ON missing(x)',))
+
+    with pytest.raises(sqlite3.OperationalError):
+        with SQLiteExporter(connection) as exporter:
+            exporter.write(tunes)
+
+    assert not connection.in_transaction
+    assert connection.execute('PRAGMA synchronous').fetchone() == synchronous
+
+
+if __name__ == "__main__":
+    pytest.main()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+    test_stats
+    ~~~~~~~~~~
+
+    Tests for corpus statistics.
+
+    :license: BSD, see LICENSE for more details.
+"""
+
+
+import random
+
+import pytest
+from pytest import fixture
+
+from sjkabc.stats import (BodyLength, FieldCounter, NoteCounter,
+                          QuantileSketch, collect, corpus_statistics,
+                          default_aggregates, merge)
+
+from factories import TuneFactory
+
+TUNE = """X:{}
+T:Tune {}
+C:Composer {}
+R:{}
+M:{}
+K:{}
+|:abc d2e:|
+"""
+
+
+@fixture
+def corpus(tmpdir):
+    for i in range(6):
+        f = tmpdir.join('{}.abc'.format(i))
+        f.write(TUNE.format(2 * i, i, i % 2, 'reel', '4/4', 'D') +
+                TUNE.format(2 * i + 1, i, i % 3, 'jig', '6/8', 'G'))
+    tmpdir.mkdir('empty')
+    return str(tmpdir)
+
+
+def test_field_counter():
+    counter = collect([TuneFactory.build(key=['D']),
+                       TuneFactory.build(key=['G']),
+                       TuneFactory.build(key=['D'])],
+                      {'key': FieldCounter('key')})['key']
+    assert counter.most_common() == [('D', 2), ('G', 1)]
+
+
+def test_note_counter():
+    notes = collect([TuneFactory.build(abc=['abc|b2:|'])],
+                    {'notes': NoteCounter()})['notes']
+    assert notes.counts == {'a': 2, 'b': 6, 'c': 2}
+
+
+def test_collect_does_not_modify_aggregates():
+    aggregates = {'length': BodyLength()}
+    collect([TuneFactory.build()], aggregates)
+    assert aggregates['length'].count == 0
+
+
+@pytest.mark.parametrize('q', [0.01, 0.1, 0.25, 0.5, 0.9, 0.99])
+def test_quantile_sketch_accuracy(q):
+    rng = random.Random(q)
+    values = sorted(rng.lognormvariate(5, 1) for i in range(5000))
+    sketch = QuantileSketch(relative_accuracy=0.02)
+    for value in values:
+        sketch.add_value(value)
+    exact = values[int(q * (len(values) - 1))]
+    assert sketch.quantile(q) == pytest.approx(exact, rel=0.05)
+
+
+def test_quantile_sketch_merge():
+    a, b, whole = QuantileSketch(), QuantileSketch(), QuantileSketch()
+    for x in range(100):
+        (a if x % 2 else b).add_value(x)
+        whole.add_value(x)
+    a.merge(b)
+    assert a.buckets == whole.buckets
+    assert (a.count, a.zeros, a.total, a.min, a.max) == \
+        (100, 1, 4950, 0, 99)
+    assert a.quantile(0.5) == whole.quantile(0.5)
+    assert a.mean == 49.5
+
+
+def test_quantile_sketch_errors():
+    with pytest.raises(ValueError):
+        QuantileSketch(relative_accuracy=0)
+    with pytest.raises(ValueError):
+        QuantileSketch().add_value(-1)
+    with pytest.raises(ValueError):
+        QuantileSketch().merge(QuantileSketch(relative_accuracy=0.1))
+    with pytest.raises(ValueError):
+        QuantileSketch().quantile(2)
+    assert QuantileSketch().quantile(0.5) is None
+
+
+def test_merge():
+    tunes = TuneFactory.build_batch(4)
+    parts = [collect(tunes[:1]), collect(tunes[1:])]
+    merged, whole = merge(parts), collect(tunes)
+    for name in default_aggregates():
+        assert vars(merged[name]) == vars(whole[name])
+    assert merge([]) is None
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_corpus_statistics(corpus, workers):
+    stats = corpus_statistics(corpus, workers=workers)
+    assert stats['rhythm'].most_common() == [('reel', 6), ('jig', 6)]
+    assert dict(stats['metre'].counts) == {'4/4': 6, '6/8': 6}
+    assert stats['composer'].counts['Composer 0'] == 5
+    assert stats['length'].count == 12
+    assert stats['length'].min == stats['length'].max == 12
+    assert stats['notes'].counts['d'] == 48
+
+
+def test_corpus_statistics_of_empty_dir(tmpdir):
+    stats = corpus_statistics(str(tmpdir))
+    assert stats['key'].most_common() == []
+
+
+if __name__ == "__main__":
+    pytest.main()
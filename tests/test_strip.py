@@ -15,7 +15,8 @@ import pytest
 
 from sjkabc.sjkabc import strip_whitespace, strip_accidentals, strip_octave, \
     strip_bar_dividers, strip_triplets, strip_chords, strip_extra_chars, \
-    strip_gracenotes, strip_decorations, strip_ornaments, strip_slurs
+    strip_gracenotes, strip_decorations, strip_ornaments, strip_slurs, \
+    split_chords
 
 
 def test_strip_whitespace():
@@ -90,6 +91,21 @@ def test_strip_chords():
     assert strip_chords(abc) == should_be
 
 
+@pytest.mark.parametrize('abc,parts', [
+    ('"Gm" GABd|[C,c]def', [[['Gm'], ['[C,c]']]]),
+    ('|:"G" ab "D" cd|"G" B2:|"Em" e4|', [[['G', 'D'], ['G']], [['Em']]]),
+    ('|:"D"abc|1"A"d:|2"D"e|]"G"[K:G]g||"C"c|',
+     [[['D'], ['A'], ['D']], [['G']], [['C']]]),
+    ('"G"ab::"D"cd|', [[['G']], [['D']]]),
+    ('abc|def', [[[], []]]),
+    ('', []),
+])
+def test_split_chords(abc, parts):
+    stripped, found = split_chords(abc)
+    assert stripped == strip_chords(abc)
+    assert found == parts
+
+
 def test_strip_extra_chards():
     abc = 'A/B/c e<cd>|cBAF ABce\\|dBGA BdcB'
     should_be = 'ABc ecd|cBAF ABce|dBGA BdcB'
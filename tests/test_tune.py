@@ -10,10 +10,12 @@
     :license: BSD, see LICENSE for more details.
 """
 
+import pickle
 import re
+import textwrap
 import pytest
 from pytest import fixture, raises
-from sjkabc import Tune
+from sjkabc import Parser, Tune
 from sjkabc.sjkabc import HEADER_KEYS, wrap_line
 
 from factories import TuneFactory
@@ -26,6 +28,59 @@ def test_expanded_abc_returns_expanded_abc(tune_object):
     assert tune_object.expanded_abc == 'aaabbbcccaaabbbccc'
 
 
+def test_chords():
+    tune = Tune(abc=['|:"G" GABc|"C" c2 "D" d2:|', '"Em" e4|]'])
+    assert tune.chords == [[['G'], ['C', 'D']], [['Em']]]
+    assert tune.chords is tune.chords
+
+
+def test_chords_are_collected_while_expanding(monkeypatch):
+    tune = Tune(abc=['|:"G" GABc|"C" c2 [^FAc] c:|'])
+    assert tune.expanded_abc == 'gabccccgabcccc'
+
+    def fail(abc):
+        raise AssertionError('chords split twice')
+    monkeypatch.setattr('sjkabc.sjkabc.split_chords', fail)
+    assert tune.chords == [[['G'], ['C', '[^FAc]']]]
+
+
+@pytest.mark.parametrize('change', [
+    lambda t: t.title.append('New title'),
+    lambda t: t.title.__setitem__(0, 'New title'),
+    lambda t: setattr(t, 'title', ['New title']),
+    lambda t: t.abc.pop(),
+    lambda t: setattr(t, 'rhythm', ['reel']),
+])
+def test_modified_tune_is_dirty(change):
+    abc = 'X:1\nT:Title\n%comment\nK:D\nabc|\ndef|\n\n'
+    tune = Parser(abc, keep_source=True).tunes[0]
+    assert not tune.dirty
+    assert tune.source_abc == abc
+    change(tune)
+    assert tune.dirty
+    assert tune.source_abc is None
+
+
+def test_source_is_only_kept_on_request():
+    tune = Parser('X:1\nK:D\nabc|\n').tunes[0]
+    assert tune._source is None
+    assert tune.source_abc is None
+    assert tune.dirty
+
+
+def test_unparsed_tune_is_dirty(tune_object):
+    assert tune_object.dirty
+    assert tune_object.source_abc is None
+
+
+def test_pickled_tune_keeps_only_its_source():
+    tune = Parser('X:1\nK:D\nabc|\nX:2\nK:G\ndef|\n',
+                  keep_source=True).tunes[1]
+    copy = pickle.loads(pickle.dumps(tune))
+    assert copy.source_abc == 'X:2\nK:G\ndef|\n'
+    assert copy._source[0] == copy.source_abc
+
+
 def test_tune_string_representation(tune_object):
     assert str(tune_object) == 'Test tune'
 
@@ -64,6 +119,13 @@ def test_wrap_line_prefix():
     assert wrap_line(line, 'I', max_length=20, prefix='$')
 
 
+def test_wrap_line_short_line_matches_textwrap():
+    for line in ['Short line', 'Trailing space ', 'Tab\there', '  Leading']:
+        w = textwrap.TextWrapper(width=78, initial_indent='N:',
+                                 subsequent_indent='+:')
+        assert wrap_line(line, 'N') == '\n'.join(w.wrap(line))
+
+
 def test_tune_initialises_empty_lists():
     t = Tune()
     for key in HEADER_KEYS:
@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+    test_wire
+    ~~~~~~~~~
+
+    Tests for the wire serialisation of tunes.
+
+    :license: BSD, see LICENSE for more details.
+"""
+
+
+import pickle
+
+import pytest
+from pytest import fixture, raises
+
+from sjkabc.wire import MAGIC, TuneBatch, WireError, dumps, loads
+
+from factories import TuneFactory
+
+
+@fixture
+def tunes():
+    tunes = TuneFactory.build_batch(3, key=['D'])
+    tunes[1].title = ['Tåg', 'Second title']
+    tunes[2].abc = []
+    return tunes
+
+
+def fields(tune):
+    return {k: v for k, v in vars(tune).items()
+            if k not in ('_expanded_abc', '_chords')}
+
+
+def test_round_trip(tunes):
+    loaded = loads(dumps(tunes))
+    assert [fields(t) for t in loaded] == [fields(t) for t in tunes]
+
+
+def test_expanded_abc_is_omitted_by_default(tunes):
+    tunes[0].expanded_abc
+    assert loads(dumps(tunes))[0]._expanded_abc == []
+
+
+def test_include_expanded(tunes):
+    tunes[0].expanded_abc
+    loaded = loads(dumps(tunes, include_expanded=True))
+    assert loaded[0]._expanded_abc == 'aaabbbcccaaabbbccc'
+    assert loaded[1]._expanded_abc == []
+
+
+def test_smaller_than_pickle():
+    tunes = TuneFactory.build_batch(30, key=['D'])
+    assert len(dumps(tunes)) < len(pickle.dumps(tunes))
+
+
+def test_empty(tunes):
+    assert loads(dumps([])) == []
+
+
+def test_invalid_data():
+    with raises(WireError):
+        loads(b'not wire data')
+
+
+def test_string_fields_are_stored_as_lists(tunes):
+    tunes[0].title = 'Single title'
+    tunes[0].abc = '|:abc abc:|'
+    loaded = loads(dumps(tunes))[0]
+    assert loaded.title == ['Single title']
+    assert loaded.abc == ['|:abc abc:|']
+
+
+def test_tune_pickles_in_wire_format(tunes):
+    tunes[0].expanded_abc
+    data = pickle.dumps(tunes[0])
+    assert MAGIC in data
+    assert len(data) < len(pickle.dumps(vars(tunes[0])))
+
+    loaded = pickle.loads(data)
+    assert fields(loaded) == fields(tunes[0])
+    assert loaded.expanded_abc == tunes[0].expanded_abc
+
+
+def test_tune_batch_pickles_compactly():
+    batch = TuneBatch(TuneFactory.build_batch(50, key=['D']))
+    data = pickle.dumps(batch)
+    assert len(data) < len(pickle.dumps(list(batch)))
+
+    loaded = pickle.loads(data)
+    assert isinstance(loaded, TuneBatch)
+    assert [fields(t) for t in loaded] == [fields(t) for t in batch]
+
+
+if __name__ == "__main__":
+    pytest.main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+    test_writer
+    ~~~~~~~~~~~
+
+    Tests for the tunebook writer.
+
+    :license: BSD, see LICENSE for more details.
+"""
+
+
+import io
+
+import pytest
+from pytest import fixture
+
+from sjkabc import Parser, TunebookWriter, write_tunebook, write_tunebooks
+
+from factories import TuneFactory
+
+
+@fixture
+def tunes():
+    tunes = TuneFactory.build_batch(5)
+    tunes[0].notes = [(
+        'This is a very long note line, well over eighty characters. It '
+        'should be wrapped to two lines.'
+    )]
+    return tunes
+
+
+def test_output_matches_format_abc(tunes):
+    out = io.StringIO()
+    write_tunebook(out, tunes)
+    assert out.getvalue() == ''.join(t.format_abc() for t in tunes)
+
+
+def test_small_buffer_output_matches_format_abc(tunes):
+    out = io.StringIO()
+    with TunebookWriter(out, buffer_size=10) as writer:
+        writer.write_all(tunes)
+    assert out.getvalue() == ''.join(t.format_abc() for t in tunes)
+
+
+def test_file_like_object_is_left_open(tunes):
+    out = io.StringIO()
+    write_tunebook(out, tunes)
+    assert not out.closed
+
+
+def test_write_to_filename_round_trips(tmpdir, tunes):
+    f = tmpdir.join('out.abc')
+    assert write_tunebook(str(f), tunes) == 5
+    assert len(Parser(f.read()).tunes) == 5
+
+
+def test_write_tunebooks(tmpdir, tunes):
+    shards = {str(tmpdir.join('a.abc')): tunes[:2],
+              str(tmpdir.join('b.abc')): tunes[2:]}
+    counts = write_tunebooks(shards, workers=2)
+    assert sorted(counts.values()) == [2, 3]
+    assert tmpdir.join('b.abc').read() == \
+        ''.join(t.format_abc() for t in tunes[2:])
+
+
+SOURCE = """% tunebook header
+X:1
+T:First
+K:D
+% comment kept in the source
+|:abc   def:|
+
+X:2
+T:Second
+K:G
+gfe dcb|"""
+
+
+def test_unmodified_tunes_are_copied():
+    out = io.StringIO()
+    write_tunebook(out, Parser(SOURCE, keep_source=True).tunes)
+    assert out.getvalue() == SOURCE[SOURCE.index('X:1'):] + '\n'
+
+
+def test_modified_tunes_are_reformatted():
+    tunes = Parser(SOURCE, keep_source=True).tunes
+    tunes[1].title.append('Another title')
+    out = io.StringIO()
+    write_tunebook(out, tunes)
+    assert out.getvalue() == tunes[0].source_abc + tunes[1].format_abc()
+
+
+def test_reformat():
+    tunes = Parser(SOURCE, keep_source=True).tunes
+    out = io.StringIO()
+    write_tunebook(out, tunes, reformat=True)
+    assert out.getvalue() == ''.join(t.format_abc() for t in tunes)
+
+
+if __name__ == "__main__":
+    pytest.main()